@@ -1,4 +1,41 @@
-from copy import deepcopy
+import numpy as np
+
+
+def power_graph_matrices(adj_table, gamma_hop):
+
+    """Works out which nodes can reach each other within gamma_hop jumps and how many jumps it takes
+
+    Parameters
+    -------------
+
+    adj_table - The adjacency graph.  Any non zero entry is an edge from the row node to the column node
+
+    gamma_hop - The largest number of jumps allowed
+
+    Returns
+    --------
+    The reachability mask, an (n, n) bool array which is True where the column node is at most gamma_hop jumps from the
+    row node, and the hop-delay matrix, an (n, n) int array of the number of jumps on the shortest path between the
+    nodes or 0 where they are not reachable.  A node does not reach itself"""
+
+    edges = (np.asarray(adj_table) != 0).astype(np.float32)
+    num_of_nodes = len(edges)
+    hops = np.zeros((num_of_nodes, num_of_nodes), dtype=int)
+
+    # A breadth first search from every node at once.  The frontier is the nodes first reached on the last jump, and
+    # one matrix product moves every frontier on by a jump.  Counts stay well inside the exact range of float32.
+    reached = np.eye(num_of_nodes, dtype=bool)
+    frontier = reached
+    for hop in range(1, gamma_hop+1):
+        frontier = ((frontier.astype(np.float32) @ edges) > 0) & ~reached
+        if not frontier.any():
+            break
+        hops[frontier] = hop
+        reached |= frontier
+
+    reachable = reached & ~np.eye(num_of_nodes, dtype=bool)
+    return reachable, hops
+
 
 def convert_adj_to_power_graph(adj_table, gamma_hop, connection_slow=False):
 
@@ -11,44 +48,14 @@ def convert_adj_to_power_graph(adj_table, gamma_hop, connection_slow=False):
 
     gamma_hop - the amount the graph is allowed to change by
 
-    connection_slow - False means the amount of jumps is factored in (so if the node is 2 jumps away its set to 2)
+    connection_slow - True means the amount of jumps is factored in (so if the node is 2 jumps away its set to 2)
 
     Returns
     --------
     adjacency table of the power graph"""
 
     # If Gamma hop = 0 there is no communication. So [[0,0], [0,0]] for 2 agents
-    if gamma_hop == 0:
-        for i in range(len(adj_table)):
-            for j in range(len(adj_table[i])):
-                adj_table[i][j] = 0
-        return adj_table
-    
-    # Goes through adj_table and adds to own dictionary the neighbours for each node
-    neighbours = {z: [] for z in range(len(adj_table))}
-    for i, row in enumerate(adj_table):
-        for j, col in enumerate(row):
-            if col != 0:
-                i_neighbours = neighbours[i]
-                i_neighbours.append((j, col))
-   
-    # Updates the adjacency table to be power graph.
-    for k in range(gamma_hop-1):                 
-        new_table = deepcopy(adj_table)
-
-        # Goes over each agent
-        for i, row in enumerate(adj_table):
-            # Goes for every distance for node i to node j
-            for j, col in enumerate(row):
-                if col != 0:
-                    neighbours_of_j = neighbours[j]
-                    for neighbour, dis in neighbours_of_j:
-                        if adj_table[i][neighbour] == 0 and i != neighbour:
-                            if connection_slow:
-                                speed_of_others = adj_table[i][j]
-                                new_table[i][neighbour] = dis+speed_of_others
-                            else:
-                                new_table[i][neighbour] = 1
-        adj_table = new_table
-
-    return adj_table
+    reachable, hops = power_graph_matrices(adj_table, gamma_hop)
+    if connection_slow:
+        return hops.tolist()
+    return reachable.astype(int).tolist()
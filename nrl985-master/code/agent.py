@@ -3,6 +3,7 @@ import random
 from collections import defaultdict
 
 from hyperparameters import iql_hyperparameters
+from utils import STATE_ENCODING_VERSION
 
 
 class Agent:
@@ -19,6 +20,9 @@ class Agent:
 
         self._agent_name = agent_name
 
+        # Which utils.encode_state version the agent's tables are keyed by
+        self.state_encoding = STATE_ENCODING_VERSION
+
     def policy(self, state, *args):
 
         """
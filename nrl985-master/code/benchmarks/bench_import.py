@@ -0,0 +1,52 @@
+"""Times how long the modules a pipeline worker loads take to import.
+
+Run from the code directory with `python benchmarks/bench_import.py`.  Every import is timed in a new interpreter, as
+it is in a worker process, and the heavy libraries each import pulls in are listed so it is clear when one of them
+starts loading at import time again.
+"""
+import json
+import os
+import subprocess
+import sys
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('hyperparameters', 'twelve_experiments')
+HEAVY_MODULES = ('numpy', 'scipy', 'matplotlib', 'networkx', 'pandas', 'seaborn')
+REPEATS = 5
+
+# Run in the new interpreter.  Prints the seconds the import took and the heavy libraries which were loaded
+_TIMER = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [name for name in {heavy!r} if name in sys.modules]]))
+'''
+
+
+def time_import(module):
+
+    """
+    Imports a module in a new interpreter
+
+    module - The module name
+
+    Return
+    (seconds, list of the heavy libraries which were loaded)
+    """
+
+    env = dict(os.environ, MPLBACKEND='Agg')
+    env['PYTHONPATH'] = os.pathsep.join([CODE_DIR, os.path.join(CODE_DIR, 'pettingZoo', 'PettingZoo'), env.get('PYTHONPATH', '')])
+    output = subprocess.run([sys.executable, '-c', _TIMER.format(module=module, heavy=HEAVY_MODULES)], cwd=CODE_DIR,
+                            env=env, capture_output=True, text=True, check=True).stdout
+    seconds, loaded = json.loads(output.strip().splitlines()[-1])
+    return seconds, loaded
+
+
+if __name__ == '__main__':
+    print(f'{"module":>20} {"best (ms)":>10} {"median (ms)":>12}  heavy libraries loaded')
+    for module in MODULES:
+        results = [time_import(module) for _ in range(REPEATS)]
+        times = sorted(seconds for seconds, _ in results)
+        print(f'{module:>20} {times[0]*1e3:>10.1f} {times[len(times)//2]*1e3:>12.1f}  {", ".join(results[0][1]) or "-"}')
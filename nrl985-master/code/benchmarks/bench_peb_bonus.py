@@ -0,0 +1,140 @@
+"""Times the PB exploration bonus as the number of visited states grows.
+
+Run from the code directory with `python benchmarks/bench_peb_bonus.py`.  Both the old per-pair loop from
+EB_MARL_Comm.update_values and the PEBBonusEngine are timed on the same visits and their bonuses are compared.
+The second table times a stream of updates (one visit then its bonus, as update_values does) in the full and
+incremental modes of the engine.
+"""
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exploration_bonus import PEBBonusEngine
+
+TIME_STEP = 1
+NUM_OF_QUERIES = 5
+NUM_OF_UPDATES = 2000
+
+
+def _loop_bonus(n_table, real_state_map, state_hash):
+
+    """
+    The bonus sum as it was written in EB_MARL_Comm.update_values
+
+    n_table - nTables[time_step]
+
+    real_state_map - Map from state hash to real state
+
+    state_hash - The state the bonus is for
+
+    Return
+    The distance weighted visit count
+    """
+
+    b = 0
+    real_state = real_state_map[state_hash]
+    for other_state_hash in n_table.keys():
+        other_real_state = real_state_map[other_state_hash]
+        distance = math.sqrt(sum([(s - o)**2 for s, o in zip(real_state, other_real_state)]))
+        for other_action in n_table[other_state_hash].keys():
+            b += n_table[other_state_hash][other_action] * distance
+    return b
+
+
+def run(num_of_states, rng):
+
+    """
+    Times one table size
+
+    num_of_states - The number of visited states at the timestep
+
+    rng - The numpy generator used to make the visits
+
+    Return
+    (seconds per loop query, seconds per engine query, largest relative difference)
+    """
+
+    grid = np.arange(-2, 2, 0.4, dtype=np.float32)
+    n_table = defaultdict(lambda: defaultdict(lambda: 0))
+    real_state_map = {}
+    engine = PEBBonusEngine(1)
+
+    for state_hash in range(num_of_states):
+        real_state = rng.choice(grid, 4)
+        real_state_map[state_hash] = real_state
+        engine.set_state_vector(state_hash, real_state)
+        for action in rng.choice(5, rng.integers(1, 6), replace=False):
+            for _ in range(rng.integers(1, 4)):
+                n_table[state_hash][int(action)] += 1
+                engine.record_visit(TIME_STEP, state_hash)
+
+    queries = rng.choice(num_of_states, NUM_OF_QUERIES, replace=False)
+
+    start = time.perf_counter()
+    loop_bonuses = [_loop_bonus(n_table, real_state_map, int(query)) for query in queries]
+    loop_time = (time.perf_counter() - start) / NUM_OF_QUERIES
+
+    start = time.perf_counter()
+    engine_bonuses = [engine.distance_weighted_visits(TIME_STEP, int(query)) for query in queries]
+    engine_time = (time.perf_counter() - start) / NUM_OF_QUERIES
+
+    difference = max(abs(a - b) / max(abs(a), 1e-12) for a, b in zip(loop_bonuses, engine_bonuses))
+    return loop_time, engine_time, difference
+
+
+def run_stream(num_of_states, rng):
+
+    """
+    Times a stream of updates on a table which already holds num_of_states visited states.  Most visits go to a
+    small set of states like they do in training.
+
+    num_of_states - The number of visited states at the timestep before the stream starts
+
+    rng - The numpy generator used to make the visits
+
+    Return
+    (seconds per full update, seconds per incremental update, largest relative difference)
+    """
+
+    grid = np.arange(-2, 2, 0.4, dtype=np.float32)
+    engines = [PEBBonusEngine(1), PEBBonusEngine(1, incremental=True)]
+    for state_hash in range(num_of_states):
+        real_state = rng.choice(grid, 4)
+        for engine in engines:
+            engine.set_state_vector(state_hash, real_state)
+            engine.record_visit(TIME_STEP, state_hash)
+
+    stream = np.minimum(rng.zipf(1.5, NUM_OF_UPDATES), num_of_states) - 1
+    times = []
+    bonuses = []
+    for engine in engines:
+        engine_bonuses = []
+        start = time.perf_counter()
+        for state_hash in stream:
+            engine.record_visit(TIME_STEP, int(state_hash))
+            engine_bonuses.append(engine.distance_weighted_visits(TIME_STEP, int(state_hash)))
+        times.append((time.perf_counter() - start) / NUM_OF_UPDATES)
+        bonuses.append(engine_bonuses)
+
+    difference = max(abs(a - b) / max(abs(a), 1e-12) for a, b in zip(*bonuses))
+    return times[0], times[1], difference
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f'{"states":>8} {"loop (ms)":>12} {"engine (ms)":>12} {"speedup":>10} {"max rel diff":>14}')
+    for exponent in range(2, 6):
+        loop_time, engine_time, difference = run(10**exponent, rng)
+        print(f'{10**exponent:>8} {loop_time*1e3:>12.3f} {engine_time*1e3:>12.3f} {loop_time/engine_time:>10.1f} {difference:>14.2e}')
+
+    print()
+    print(f'{"states":>8} {"full (us)":>12} {"incr. (us)":>12} {"speedup":>10} {"max rel diff":>14}')
+    for exponent in range(2, 6):
+        full_time, incremental_time, difference = run_stream(10**exponent, rng)
+        print(f'{10**exponent:>8} {full_time*1e6:>12.1f} {incremental_time*1e6:>12.1f} {full_time/incremental_time:>10.1f} {difference:>14.2e}')
@@ -0,0 +1,516 @@
+"""Times the hot paths of training and whole training episodes, and compares them against a stored baseline.
+
+Run from the code directory with `python benchmarks/bench_suite.py`.  Every benchmark is seeded and run in a new
+interpreter, so the peak RSS of one does not hide another's.  The results are written as JSON to saved_data/benchmarks
+and compared against benchmarks/baseline.json.  Anything more than --tolerance worse than the baseline is reported as a
+regression and the exit code is 1.  `--save-baseline` replaces the baseline with the new results, `--only` picks the
+benchmarks whose names contain any of the given strings and `--quick` runs fewer episodes and repeats.
+
+The micro benchmarks are timed per call: encode_state, World.step, GridQuantizer.snap (which replaced
+convert_values), MARL_Comm.update_values and EB_MARL_Comm.update_values (timed on the calls made while training),
+convert_adj_to_power_graph and Oracle.calculate_statistics.  The macro benchmarks train UCB and PEB agents on a star
+graph for 4, 8 and 12 agents and report the environment steps per second and the percentiles of the episode times.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import timeit
+from functools import partial
+
+import numpy as np
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIR)
+sys.path.insert(1, os.path.join(CODE_DIR, 'pettingZoo', 'PettingZoo'))
+
+BENCHMARK_FORMAT_VERSION = 1
+BASELINE_PATH = os.path.join(CODE_DIR, 'benchmarks', 'baseline.json')
+RESULTS_DIR_NAME = 'saved_data/benchmarks'
+SEED = 0
+
+# How many times a micro benchmark is timed, and how long each timing lasts at least
+REPEATS = 7
+MIN_TIME = 0.2
+# The training episodes which update_values and calculate_statistics are timed on, and which the macro benchmarks run
+TRAINING_EPISODES = 30
+MACRO_EPISODES = 40
+QUICK_DIVISOR = 4
+
+# The figure each benchmark is compared on, and whether more of it is better
+MICRO_METRIC = ('median_us', False)
+MACRO_METRICS = (('steps_per_sec', True), ('p50_episode_ms', False), ('peak_rss_mb', False))
+
+
+def _experiment(agent_type, num_agents):
+
+    """
+    Makes the experiment dict of a macro benchmark
+
+    agent_type - The AgentType of the agents
+
+    num_agents - The number of agents
+
+    Return
+    The experiment dict, with agent_0 at the centre of a star graph and gamma_hop 2
+    """
+
+    from hyperparameters import star_graph
+
+    return {
+        'graph': star_graph(num_agents, 0),
+        'connection_slow': True,
+        'gamma_hop': 2,
+        'experiment_name': f'{agent_type.name} M = {num_agents}',
+        'num_agents': num_agents,
+        'agent_type': agent_type,
+    }
+
+
+def _set_up(agent_type, num_agents):
+
+    """
+    Makes the seeded environment and agents of an experiment, without printing the power graph
+
+    agent_type - The AgentType of the agents
+
+    num_agents - The number of agents
+
+    Return
+    (the parallel environment, the dictionary of agents)
+    """
+
+    import twelve_experiments
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, env, agents = twelve_experiments._set_up(_experiment(agent_type, num_agents), np.random.SeedSequence(SEED))
+    return env, agents
+
+
+def _train(env, agents, num_of_episodes, oracle=None):
+
+    """
+    Trains the agents
+
+    env - The parallel environment
+
+    agents - The dictionary of agents
+
+    num_of_episodes - The number of episodes
+
+    oracle - The Oracle to tell about the training, if any
+
+    Return
+    A list of the seconds each episode took
+    """
+
+    from learner import MultiAgentLearner
+
+    learner = MultiAgentLearner(agents)
+    episode_times = []
+    for episode_num in range(num_of_episodes):
+        start = time.perf_counter()
+        learner.run_episode(env, episode_num, oracle)
+        episode_times.append(time.perf_counter() - start)
+    return episode_times
+
+
+def _call_times(fn, repeats):
+
+    """
+    Times a function which can be called over and over
+
+    fn - The function, called with no arguments
+
+    repeats - The number of timings
+
+    Return
+    A list of the seconds per call of each timing
+    """
+
+    timer = timeit.Timer(fn)
+    number, seconds = timer.autorange()
+    number = max(1, int(number * MIN_TIME / max(seconds, 1e-9)))
+    return [seconds / number for seconds in timer.repeat(repeat=repeats, number=number)]
+
+
+def _sampled_times(agent, method_name, env, agents, num_of_episodes):
+
+    """
+    Times every call of a method of an agent while the agents train
+
+    agent - The agent whose calls are timed
+
+    method_name - The name of the method
+
+    env - The parallel environment
+
+    agents - The dictionary of agents
+
+    num_of_episodes - The number of training episodes
+
+    Return
+    A list of the seconds each call took
+    """
+
+    method = getattr(agent, method_name)
+    times = []
+
+    def timed(*args):
+        start = time.perf_counter()
+        result = method(*args)
+        times.append(time.perf_counter() - start)
+        return result
+
+    setattr(agent, method_name, timed)
+    try:
+        _train(env, agents, num_of_episodes)
+    finally:
+        delattr(agent, method_name)
+    return times
+
+
+def _micro_result(times):
+
+    """
+    Summarises the times of a micro benchmark
+
+    times - The seconds per call of each timing or each call
+
+    Return
+    A dict of the median and best microseconds per call and the calls per second
+    """
+
+    times = np.asarray(times)
+    return {
+        'median_us': float(np.median(times) * 1e6),
+        'best_us': float(times.min() * 1e6),
+        'calls_per_sec': float(1 / np.median(times)),
+        'samples': len(times),
+    }
+
+
+def bench_encode_state(quick):
+
+    """Times encoding one observation of a 4 agent environment"""
+
+    from hyperparameters import AgentType
+    from utils import encode_state
+
+    env, _ = _set_up(AgentType.ORIGINAL, 4)
+    observation = env.reset()['agent_0']
+    return _micro_result(_call_times(partial(encode_state, observation, 4), _repeats(quick)))
+
+
+def bench_world_step(quick):
+
+    """Times one step of the physics of a 4 agent world"""
+
+    from hyperparameters import AgentType
+
+    env, agents = _set_up(AgentType.ORIGINAL, 4)
+    env.reset()
+    # One step through the environment sets the actions of the agents, which the world then keeps applying
+    env.step({agent_name: 1 for agent_name in agents})
+    return _micro_result(_call_times(env.unwrapped.world.step, _repeats(quick)))
+
+
+def bench_grid_snap(quick):
+
+    """Times snapping the positions and velocities of 4 agents to the grid, as convert_values did"""
+
+    from hyperparameters import AgentType
+
+    env, _ = _set_up(AgentType.ORIGINAL, 4)
+    env.reset()
+    world = env.unwrapped.world
+    values = np.random.default_rng(SEED).uniform(-2, 2, (2 * len(world.agents), world.dim_p))
+    return _micro_result(_call_times(partial(world.quantizer.snap, values), _repeats(quick)))
+
+
+def bench_ucb_update_values(quick):
+
+    """Times the calls of MARL_Comm.update_values made by agent_0 while 4 agents train"""
+
+    from hyperparameters import AgentType
+
+    env, agents = _set_up(AgentType.ORIGINAL, 4)
+    return _micro_result(_sampled_times(agents['agent_0'], 'update_values', env, agents, _episodes(TRAINING_EPISODES, quick)))
+
+
+def bench_peb_update_values(quick):
+
+    """Times the calls of EB_MARL_Comm.update_values made by agent_0 while 4 agents train"""
+
+    from hyperparameters import AgentType
+
+    env, agents = _set_up(AgentType.EB_Lidard, 4)
+    return _micro_result(_sampled_times(agents['agent_0'], 'update_values', env, agents, _episodes(TRAINING_EPISODES, quick)))
+
+
+def bench_power_graph(quick):
+
+    """Times the gamma_hop 3 power graph of a 12 agent ring"""
+
+    from adjacency import convert_adj_to_power_graph
+    from hyperparameters import ring_graph
+
+    adj_table = ring_graph(12, 2)
+    return _micro_result(_call_times(partial(convert_adj_to_power_graph, adj_table, 3, True), _repeats(quick)))
+
+
+def bench_oracle_statistics(quick):
+
+    """Times the statistics of an Oracle which watched 4 UCB agents train"""
+
+    from hyperparameters import AgentType
+    from observer import Oracle
+
+    env, agents = _set_up(AgentType.ORIGINAL, 4)
+    oracle = Oracle()
+    _train(env, agents, _episodes(TRAINING_EPISODES, quick), oracle)
+    return _micro_result(_call_times(oracle.calculate_statistics, _repeats(quick)))
+
+
+def bench_episodes(agent_type_name, num_agents, quick):
+
+    """
+    Times whole training episodes
+
+    agent_type_name - The name of the AgentType of the agents
+
+    num_agents - The number of agents
+
+    quick - Whether to run fewer episodes
+
+    Return
+    A dict of the environment steps per second and the percentiles of the episode times
+    """
+
+    from hyperparameters import AgentType
+    from twelve_experiments import NUM_OF_CYCLES
+
+    env, agents = _set_up(AgentType[agent_type_name], num_agents)
+    episode_times = np.asarray(_train(env, agents, _episodes(MACRO_EPISODES, quick)))
+    return {
+        'steps_per_sec': float(len(episode_times) * NUM_OF_CYCLES / episode_times.sum()),
+        'p50_episode_ms': float(np.percentile(episode_times, 50) * 1e3),
+        'p90_episode_ms': float(np.percentile(episode_times, 90) * 1e3),
+        'p99_episode_ms': float(np.percentile(episode_times, 99) * 1e3),
+        'episodes': len(episode_times),
+    }
+
+
+def _repeats(quick):
+
+    """Return the number of timings of a micro benchmark"""
+
+    return max(1, REPEATS // 2) if quick else REPEATS
+
+
+def _episodes(num_of_episodes, quick):
+
+    """Return the number of episodes to train for"""
+
+    return max(1, num_of_episodes // QUICK_DIVISOR) if quick else num_of_episodes
+
+
+MICRO_BENCHMARKS = {
+    'encode_state': bench_encode_state,
+    'world_step': bench_world_step,
+    'grid_snap': bench_grid_snap,
+    'ucb_update_values': bench_ucb_update_values,
+    'peb_update_values': bench_peb_update_values,
+    'power_graph': bench_power_graph,
+    'oracle_statistics': bench_oracle_statistics,
+}
+
+MACRO_BENCHMARKS = {
+    f'episodes_{label}_{num_agents}': partial(bench_episodes, agent_type_name, num_agents)
+    for label, agent_type_name in (('ucb', 'ORIGINAL'), ('peb', 'EB_Lidard'))
+    for num_agents in (4, 8, 12)
+}
+
+
+def run_single(name, quick):
+
+    """
+    Runs one benchmark in this process
+
+    name - The name of the benchmark
+
+    quick - Whether to run fewer episodes and repeats
+
+    Return
+    The dict of its results, with the kind of benchmark and the peak RSS of the process
+    """
+
+    if name in MICRO_BENCHMARKS:
+        result = dict(MICRO_BENCHMARKS[name](quick), kind='micro')
+    else:
+        result = dict(MACRO_BENCHMARKS[name](quick), kind='macro')
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = peak_rss / (2**20 if sys.platform == 'darwin' else 2**10)
+    return result
+
+
+def run_in_subprocess(name, quick):
+
+    """
+    Runs one benchmark in a new interpreter
+
+    name - The name of the benchmark
+
+    quick - Whether to run fewer episodes and repeats
+
+    Return
+    The dict of its results
+    """
+
+    command = [sys.executable, os.path.abspath(__file__), '--single', name] + (['--quick'] if quick else [])
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONHASHSEED='0')
+    output = subprocess.run(command, cwd=CODE_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _environment():
+
+    """Return a description of the machine and libraries, so results from different machines are not mixed up"""
+
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance):
+
+    """
+    Compares results against a baseline
+
+    results - The benchmarks dict of the new results
+
+    baseline - The benchmarks dict of the baseline
+
+    tolerance - How much worse than the baseline a figure can be before it counts as a regression, as a fraction
+
+    Return
+    A list of (benchmark name, metric, baseline value, new value, change as a fraction, whether it is a regression).
+    A positive change is an improvement
+    """
+
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        metrics = (MICRO_METRIC,) if result['kind'] == 'micro' else MACRO_METRICS
+        for metric, higher_is_better in metrics:
+            old, new = baseline[name].get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old if higher_is_better else (old - new) / old
+            rows.append((name, metric, old, new, change, change < -tolerance))
+    return rows
+
+
+def _print_results(results):
+
+    """Prints a table of the results"""
+
+    print(f'{"benchmark":<22} {"median (us)":>12} {"calls/s":>12} {"steps/s":>10} {"p50 (ms)":>9} '
+          f'{"p90 (ms)":>9} {"p99 (ms)":>9} {"peak RSS (MB)":>14}')
+    for name, result in results.items():
+        if result['kind'] == 'micro':
+            print(f'{name:<22} {result["median_us"]:>12.1f} {result["calls_per_sec"]:>12.0f} {"":>10} {"":>9} '
+                  f'{"":>9} {"":>9} {result["peak_rss_mb"]:>14.1f}')
+        else:
+            print(f'{name:<22} {"":>12} {"":>12} {result["steps_per_sec"]:>10.1f} {result["p50_episode_ms"]:>9.1f} '
+                  f'{result["p90_episode_ms"]:>9.1f} {result["p99_episode_ms"]:>9.1f} {result["peak_rss_mb"]:>14.1f}')
+
+
+def _print_comparison(rows, tolerance):
+
+    """Prints the comparison against the baseline"""
+
+    print(f'\n{"benchmark":<22} {"metric":<15} {"baseline":>12} {"now":>12} {"change":>8}')
+    for name, metric, old, new, change, regression in rows:
+        flag = '  REGRESSION' if regression else ''
+        print(f'{name:<22} {metric:<15} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{flag}')
+    regressions = sum(row[-1] for row in rows)
+    print(f'{regressions} regressions beyond {tolerance:.0%}' if regressions else f'No regressions beyond {tolerance:.0%}')
+
+
+def main():
+
+    """Runs the benchmarks picked on the command line, writes their results and compares them against the baseline"""
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', help='Only run the benchmarks whose names contain one of these')
+    parser.add_argument('--quick', action='store_true', help='Run fewer episodes and repeats')
+    parser.add_argument('--output', help='Where to write the JSON results.  Defaults to a new file in '
+                                         f'{RESULTS_DIR_NAME}')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='The JSON results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results to the baseline as well')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='How much worse than the baseline a figure can be before it is a regression')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(args.single, args.quick)))
+        return 0
+
+    names = [name for name in list(MICRO_BENCHMARKS) + list(MACRO_BENCHMARKS)
+             if not args.only or any(part in name for part in args.only)]
+    results = {}
+    for name in names:
+        print(f'Running {name}', file=sys.stderr)
+        results[name] = run_in_subprocess(name, args.quick)
+
+    report = {
+        'version': BENCHMARK_FORMAT_VERSION,
+        'seed': SEED,
+        'quick': args.quick,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': _environment(),
+        'benchmarks': results,
+    }
+    output = args.output or os.path.join(CODE_DIR, RESULTS_DIR_NAME, time.strftime('results_%Y%m%d-%H%M%S.json'))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    _print_results(results)
+    print(f'\nResults written to {output}')
+
+    regressions = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['environment'] != report['environment'] or baseline['quick'] != args.quick:
+            print('The baseline was made on a different machine or with a different --quick, so the comparison is rough')
+        rows = compare(results, baseline['benchmarks'], args.tolerance)
+        _print_comparison(rows, args.tolerance)
+        regressions = sum(row[-1] for row in rows)
+    else:
+        print(f'No baseline at {args.baseline}')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
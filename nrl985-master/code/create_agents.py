@@ -2,11 +2,14 @@ from adjacency import convert_adj_to_power_graph
 from agent import Agent, IndependentQLearning
 from ucb_marl_agent import MARL_Comm
 from eb_marl_agent import EB_MARL_Comm
+from message_bus import MessageBus
+from state_store import StateVectorStore
+from utils import spawn_generators
 
 from hyperparameters import graph_hyperparameters, dynamic_hyperparameters, AgentType
 
 
-def create_agents(num_of_agents, agent_type, num_of_episodes=0, length_of_episode=0):
+def create_agents(num_of_agents, agent_type, num_of_episodes=0, length_of_episode=0, seed_sequence=None):
 
     """Creates the agents
 
@@ -18,6 +21,8 @@ def create_agents(num_of_agents, agent_type, num_of_episodes=0, length_of_episod
 
     length_of_episode - The length of the episode
 
+    seed_sequence - The numpy SeedSequence the Generators of the MARL agents are spawned from.  None seeds them randomly
+
     Returns
     A dictionary of agents of correct type
     """
@@ -27,16 +32,16 @@ def create_agents(num_of_agents, agent_type, num_of_episodes=0, length_of_episod
     elif agent_type == AgentType.ORIGINAL:
         adj_table =  graph_hyperparameters['graph']
         return create_marl_agents(num_of_agents, num_of_episodes, length_of_episode, 
-        graph_hyperparameters['gamma_hop'], adj_table, graph_hyperparameters['connection_slow'])
+        graph_hyperparameters['gamma_hop'], adj_table, graph_hyperparameters['connection_slow'], seed_sequence)
     elif agent_type == AgentType.EB_Lidard:
         adj_table =  graph_hyperparameters['graph']
         return create_eb_agents(num_of_agents, num_of_episodes, length_of_episode, 
-        graph_hyperparameters['gamma_hop'], adj_table, graph_hyperparameters['connection_slow'])
+        graph_hyperparameters['gamma_hop'], adj_table, graph_hyperparameters['connection_slow'], seed_sequence)
     else:
         return {f'agent_{i}': Agent(f'agent_{i}') for i in range(num_of_agents)}
 
 
-def create_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow):
+def create_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow, seed_sequence=None):
 
     """
     Creates the MARL agents
@@ -53,11 +58,19 @@ def create_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_
 
     connection_slow - Whether we want the connections to be instantaneous or whether a time delay should be incurred
 
+    seed_sequence - The numpy SeedSequence each agent's Generator is spawned from.  None seeds them randomly
+
     """
 
-    agents = {f'agent_{i}': MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop) for i in range(num_of_agents)}
+    rngs = spawn_generators(seed_sequence, num_of_agents)
+    agents = {f'agent_{i}': MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop, rngs[i]) for i in range(num_of_agents)}
 
     
+    # The agents share one bus which holds their messages until they arrive.  update_neighbour sets its routes
+    message_bus = MessageBus(agents.keys(), length_of_episode)
+    for agent_obj in agents.values():
+        agent_obj.message_bus = message_bus
+
     power_graph = convert_adj_to_power_graph(adjacency_table, gamma_hop, connection_slow)
     if dynamic_hyperparameters['dynamic']:
         return agents
@@ -72,12 +85,20 @@ def create_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_
     return agents
 
 
-def create_eb_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow):
+def create_eb_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow, seed_sequence=None):
 
 
-    agents = {f'agent_{i}': EB_MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop) for i in range(num_of_agents)}
+    # The real states are the same for every agent so one store is shared
+    state_store = StateVectorStore()
+    rngs = spawn_generators(seed_sequence, num_of_agents)
+    agents = {f'agent_{i}': EB_MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop, state_store, rngs[i]) for i in range(num_of_agents)}
 
     
+    # The agents share one bus which holds their messages until they arrive.  update_neighbour sets its routes
+    message_bus = MessageBus(agents.keys(), length_of_episode)
+    for agent_obj in agents.values():
+        agent_obj.message_bus = message_bus
+
     power_graph = convert_adj_to_power_graph(adjacency_table, gamma_hop, connection_slow)
     if dynamic_hyperparameters['dynamic']:
         return agents
@@ -1,33 +1,39 @@
-from collections import defaultdict
 import math
 import random
+import numpy as np
 from agent import Agent
-from hyperparameters import eb_marl_hyperparameters, agent_hyperparameters
+from exploration_bonus import PEBBonusEngine
+from hyperparameters import eb_marl_hyperparameters, agent_hyperparameters, table_hyperparameters
+from tables import create_tables, upgrade_legacy_state
+from episode_window import EpisodeWindow, empty_transitions
+from message_bus import Transition
+from state_store import StateVectorStore
 
 ## THIS FILE CONTAINS THE PB Exploration Algorithm applied to Multi Agent Q Learning, as described in algorithm 2 of the thesis.  
 
 class EB_MARL_Comm(Agent):
 
 
-    def __init__(self, agent_name, num_of_agents, num_of_episodes, length_of_episode, gamma_hop):
+    def __init__(self, agent_name, num_of_agents, num_of_episodes, length_of_episode, gamma_hop, state_store=None, rng=None):
         self.exploration_bonuses_detailed = {}  # New attribute for detailed tracking
-        self.real_state_map = {}  # Map to store the real state for each hash
+        # Map to store the real state for each hash.  Shared by all the agents which talk to each other
+        self.real_state_map = state_store if state_store is not None else StateVectorStore()
         self.exploration_bonuses = [] # Stores exploration bonuses for visualization. 
 
 
-        # The set of H number of Q-Tables.
-        self.qTables = {i+1: defaultdict(lambda: defaultdict(lambda: length_of_episode)) for i in range(length_of_episode)}
+        # The u set (episode number is indexed from 0 whilst the timestep is indexed from 1).  Only the current episode
+        # is ever used.
+        self.uSet = EpisodeWindow(1, length_of_episode+gamma_hop+1)
 
-        # This will contain the number of times each state action has been seen for each timestep
-        self.nTables = {i+1: defaultdict(lambda: defaultdict(lambda: 0)) for i in range(length_of_episode)}
+        # The v set (episode number is indexed from 0 whilst the timestep is indexed from 1).  update_values only goes
+        # over the previous and current episode so only those are kept.
+        self.vSet = EpisodeWindow(2, length_of_episode+gamma_hop+1)
 
-        # The u set (episode number is indexed from 0 whilst the timestep is indexed from 1)
-        self.uSet = {i: {i+1: defaultdict(lambda: defaultdict(lambda: set())) for i in range(length_of_episode +gamma_hop+1)} for i in range(num_of_episodes)} 
+        # The (episode, timestep) buckets of the vSet which have had transitions added since update_values last ran
+        self._dirty = set()
 
-        # The v set (episode number is indexed from 0 whilst the timestep is indexed from 1)
-        self.vSet = {i: {i+1: defaultdict(lambda: defaultdict(lambda: set())) for i in range(length_of_episode+gamma_hop+1)} for i in range(-length_of_episode-1, num_of_episodes+round(gamma_hop%length_of_episode)+1)}
-
-        self.next_add = set()
+        # The bus carrying messages between the agents.  Shared by all the agents and set when they are created
+        self.message_bus = None
 
         # Of form agent_name, distance = 0 if no connection
         self._neighbours = {f'agent_{i}': 0 for i in range(num_of_agents)}   
@@ -53,11 +59,28 @@ class EB_MARL_Comm(Agent):
         self.probability = eb_marl_hyperparameters['probability']
         self.log_term = math.log((num_of_states * num_of_actions * T * num_of_agents)/self.probability)  
         
-        # The v-table values.  Set to H as this corresponds to the q tables currently.
-        self.vTable = {j+1: defaultdict(lambda: self.H) for j in range(length_of_episode+1)}
-        
+        # The Q, N and V tables.  Unseen Q and V values default to H.
+        self.tables = create_tables(length_of_episode, table_hyperparameters['backend'])
+
+        # Breaks ties between actions with the same Q value
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+        # Keeps the real states and visit totals as arrays so the bonus is a single reduction.  In incremental mode the
+        # sum for each state is patched with the visits since it was last used instead of recomputed.
+        self.bonus_engine = PEBBonusEngine(length_of_episode, self.real_state_map, incremental=eb_marl_hyperparameters['bonus_mode'] == 'incremental')
+
+
+    def __setstate__(self, state):
+
+        """
+        Restores a pickled agent.  Agents pickled before the table backends are moved onto DictTables
+
+        state - The pickled __dict__
+        """
+
+        self.__dict__.update(upgrade_legacy_state(state))
+
 
-    
     def exponential_decay(self, t):
         """
         Calculate the exponential decay factor based on the time step.
@@ -72,7 +95,7 @@ class EB_MARL_Comm(Agent):
     
     def update_real_state_map(self, hash_value, real_state):
         """Store the mapping from state hash to its original real state."""
-        self.real_state_map[hash_value] = real_state
+        self.real_state_map.set(hash_value, real_state)
 
     def update_neighbour(self, agent_to_update, connection_quality):
 
@@ -90,6 +113,8 @@ class EB_MARL_Comm(Agent):
             self._num_neighbours -= 1
 
         self._neighbours[agent_to_update] = connection_quality
+        if self.message_bus is not None:
+            self.message_bus.set_route(self.agent_name(), agent_to_update, connection_quality)
 
     def policy(self, state, time_step):
 
@@ -104,20 +129,11 @@ class EB_MARL_Comm(Agent):
         The action to be taken
         """
 
-        # Choose the largest value
-        max_value = float('-inf')
-        move = -1
-        q_table = self.qTables[time_step]
-        values = [0,1,2,3,4]
-        random.shuffle(values) # Shuffled to get randomness at start
-        for i in values:        
-            if q_table[state][i] > max_value:
-                max_value = q_table[state][i]
-                move = i 
-        return move
+        # Choose the largest value, ties broken at random
+        return self.tables.greedy_action(time_step, state, self.rng)
 
     
-    def play_normal(self, state, time_step, *args):
+    def play_normal(self, state, time_step, *args, rng=None):
 
         """
         Plays the episode for showing.  Plays the best action in the q-table
@@ -128,20 +144,14 @@ class EB_MARL_Comm(Agent):
 
         *args - Spare arguments.
 
+        rng - The numpy Generator to break ties with instead of the agent's own, so playing does not use up the
+        agent's draws
+
         Return 
         The action to be taken
         """
 
-        q_table = self.qTables[time_step]
-        max_value = float('-inf')
-        move = -1
-        values = [0,1,2,3,4]
-        random.shuffle(values)
-        for i in values:        
-            if q_table[state][i] > max_value:
-                max_value = q_table[state][i]
-                move = i 
-        return move
+        return self.tables.greedy_action(time_step, state, self.rng if rng is None else rng)
 
 
     def choose_smallest_value(self, state, time_step):
@@ -157,13 +167,7 @@ class EB_MARL_Comm(Agent):
         The smaller value
         """
 
-        max_value = float('-inf')
-        values = [0,1,2,3,4]
-        random.shuffle(values)
-        for i in values:
-            if self.qTables[time_step][state][i] > max_value:
-                max_value = self.qTables[time_step][state][i]
-        return min(self.H, max_value)
+        return min(self.H, self.tables.best_value(time_step, state))
 
 
     def message_passing(self, episode_num, time_step, old_state, old_real_state, action, current_state, current_real_state, reward, agents_dict):
@@ -173,17 +177,20 @@ class EB_MARL_Comm(Agent):
         episode_num - The episode number the agent is in
         time_step - The time step the agent is in
         old_state - The hashed state the agent was in
+        old_real_state - The real state of old_state
         action - The action taken
         current_state - The hashed state after the agent has taken
+        current_real_state - The real state of current_state
         reward - The reward for the agents move
-        agents_dict - The agents dictionary
+        agents_dict - The agents dictionary.  Not needed as the message bus knows who the agent can communicate to
         """
 
-        for agent in self._neighbours.keys():
-            if self._neighbours[agent] != 0:
-                agent_obj = agents_dict[agent]
+        # The real states go in the store shared with the other agents, so the message only needs the encoded states
+        self.update_real_state_map(old_state, old_real_state)
+        self.update_real_state_map(current_state, current_real_state)
 
-                self.send_message(episode_num, time_step, old_state, old_real_state, action, current_state, current_real_state, reward, agent_obj, self._neighbours[agent])
+        message = Transition(time_step, episode_num, self.agent_name(), old_state, action, current_state, reward)
+        self.message_bus.send(self.agent_name(), episode_num, time_step, message)
 
     def update(self, episode_num, time_step, old_state, current_state, action, reward):
 
@@ -208,121 +215,86 @@ class EB_MARL_Comm(Agent):
         old_set.add((reward, current_state))
         self.uSet[episode_num][time_step][old_state][action] = old_set
 
-        new_set = set()
-        
-        # Add the new data from other agents into vSet.  Only added in the vSet when it 'reaches' the agent (dis == 0).  Added into the vset at the episode and timestep of when the message was sent
-        for message_data in self.next_add:
-            time_step_other, episode_num_other, agent_name_other, current_state_other, action_other, next_state_other, reward_other, dis = message_data
-            
-            if dis == 0:
-
-                old_set = self.vSet[episode_num_other][time_step_other][current_state_other][action_other]
-                old_set.add((reward_other, next_state_other))
-                self.vSet[episode_num_other][time_step_other][current_state_other][action_other] = old_set
-            else:
-                dis -= 1
-                new_set.add(tuple([time_step_other, episode_num_other, agent_name_other, current_state_other, action_other, next_state_other, reward_other, dis]))
-
-        self.next_add = new_set
+        # Add the new data from other agents into vSet.  Only added in the vSet when it 'reaches' the agent.  Added into the vset at the episode and timestep of when the message was sent
+        for message in self.message_bus.collect(self.agent_name(), episode_num, time_step):
+            self._add_transition(message.episode_num, message.time_step, message.state, message.action, message.reward, message.next_state)
         
         # Add everything into the vSet for the current episode and timestep
         for state in self.uSet[episode_num][time_step]:
             for act in self.uSet[episode_num][time_step][state]:
                 for element in self.uSet[episode_num][time_step][state][act]:
                         reward_new, next_state = element
-                        self.vSet[episode_num][time_step][state][action].add((reward_new, next_state))
+                        self._add_transition(episode_num, time_step, state, action, reward_new, next_state)
 
         
         
-    def receive_message(self, message, dis):
+    def _add_transition(self, episode_num, time_step, state, action, reward, next_state):
+
         """
-        This is how the agent should receive a message
+        Adds a transition to the vSet and marks its bucket so update_values goes through it
 
-        message - The tuple containing the message
+        episode_num - The episode the transition was made in
 
-        dis - How far away the agent sending the message is
-        """
-        # Extracting information from the received message
-        time_step, episode_num, sender_agent_name, old_state, old_real_state, action, new_state, new_real_state, reward = message
+        time_step - The time step the transition was made at
 
-        # Update the real state map with both old and new real states
-        self.update_real_state_map(old_state, old_real_state)
-        self.update_real_state_map(new_state, new_real_state)
+        state - The state the transition was made from
 
-        # Modify the message to exclude the real states
-        modified_message = (time_step, episode_num, sender_agent_name, old_state, action, new_state, reward, dis)
-        self.next_add.add(modified_message)
+        action - The action taken
 
-    def send_message(self, episode_num, time_step, current_state, current_real_state, action, next_state, next_real_state, reward, agent_obj, distance):
-        """
-        How an agent sends a message
+        reward - The reward gained
 
-        [current parameters...]
-        current_real_state - The real state corresponding to current_state
-        next_real_state - The real state corresponding to next_state
+        next_state - The state the transition went to
         """
 
-        message_tuple = (time_step, episode_num, self.agent_name(), current_state, current_real_state, action, next_state, next_real_state, reward)
-        agent_obj.receive_message(message_tuple, distance)
+        self.vSet[episode_num][time_step][state][action].add((reward, next_state))
+        self._dirty.add((episode_num, time_step))
 
 
 # ## HERE IS THE PB EXPLORATION ALGO!!!!
 
     def update_values(self, episode_num_max, time_step_max):
         
-        # Initialize a default state value vector based on the size of the state space.
-        default_value = [0 for i in range(agent_hyperparameters['size_of_state_space'])]
-        
-        # Iterate over episodes from the second-to-last to the last.
-        for episode_num in range(episode_num_max-1, episode_num_max+1):
-            # Iterate through each time step within the given horizon.
-            for time_step in range(1, self.H+1):
-                # Iterate over all state hashes encountered at this episode and time step.
-                for state_hash in self.vSet[episode_num][time_step].keys():
-                    # Iterate over all actions taken from those states.
-                    for action in self.vSet[episode_num][time_step][state_hash].keys():
-                        # Iterate over all rewards and subsequent states resulting from those actions.
-                        for reward, next_state_hash in self.vSet[episode_num][time_step][state_hash][action]:
-                            # Increment the counter for how many times a given state-action pair has been visited.
-                            self.nTables[time_step][state_hash][action] += 1
-                            
-                            # Retrieve the updated visitation count for the current state-action pair.
-                            t = self.nTables[time_step][state_hash][action]
-                            
-                            # Calculate the current decay factor based on the time step.
-                            current_decay_factor = self.exponential_decay(time_step)
-                            # Initialize the bonus for exploration to zero.
-                            b = 0
-                            
-                            # Retrieve the real state vector for the current state hash, defaulting if not found.
-                            real_state = self.real_state_map.get(state_hash, default_value)
-                            # Iterate over all other state hashes at the current time step.
-                            for other_state_hash in self.nTables[time_step].keys():
-                                # Retrieve the real state vector for the other state hash.
-                                other_real_state = self.real_state_map.get(other_state_hash, default_value)
-                                # Calculate the Euclidean distance between the current and other state.
-                                distance = math.sqrt(sum([(s - o)**2 for s, o in zip(real_state, other_real_state)]))
-                                # For each action available from the other state, accumulate the bonus.
-                                for other_action in self.nTables[time_step][other_state_hash].keys():
-                                    b += self.scaling_factor * self.nTables[time_step][other_state_hash][other_action] * distance
-                            # Adjust the bonus based on the decay factor and a logarithmic term.
-                            b *= current_decay_factor * self.log_term
-                            
-                            # Record the calculated bonus.
-                            self.exploration_bonuses.append(b)
-
-                            # Calculate the learning rate alpha, dependent on the visitation count.
-                            alpha = (self.H + 1) / (self.H + t)
-                            # Calculate the weighted current Q-value estimate.
-                            initial = (1 - alpha) * self.qTables[time_step][state_hash][action]
-                            # Calculate the updated Q-value incorporating the reward, estimated future value, and bonus.
-                            expected_future = alpha * (reward + self.vTable[time_step + 1][next_state_hash] + b)
-                            # Combine the current and future estimates to form the new Q-value.
-                            new_score = initial + expected_future
-                            # Update the Q-table with the new Q-value for the current state-action pair.
-                            self.qTables[time_step][state_hash][action] = new_score
-                            # Update the value table for the current state based on the smallest Q-value across all actions.
-                            self.vTable[time_step][state_hash] = self.choose_smallest_value(state_hash, time_step)
-
-                # Reset the visited state-action pairs for the next episode and time step to ensure fresh calculations.
-                self.vSet[episode_num][time_step] = defaultdict(lambda: defaultdict(lambda: set()))
+        # Iterate over the buckets from the second-to-last episode to the last which have had transitions added since
+        # the last call, in order of episode and time step.
+        for episode_num, time_step in sorted(self._dirty):
+            if episode_num < episode_num_max-1 or time_step > self.H:
+                continue
+            # Iterate over all state hashes encountered at this episode and time step.
+            for state_hash in self.vSet[episode_num][time_step].keys():
+                # Iterate over all actions taken from those states.
+                for action in self.vSet[episode_num][time_step][state_hash].keys():
+                    # Iterate over all rewards and subsequent states resulting from those actions.
+                    for reward, next_state_hash in self.vSet[episode_num][time_step][state_hash][action]:
+                        # Increment the counter for how many times a given state-action pair has been visited and
+                        # retrieve the updated count.
+                        t = self.tables.visit(time_step, state_hash, action)
+                        self.bonus_engine.record_visit(time_step, state_hash)
+                        
+                        # Calculate the current decay factor based on the time step.
+                        current_decay_factor = self.exponential_decay(time_step)
+                        
+                        # Sum the visits of every state-action pair at this time step weighted by the Euclidean
+                        # distance of its real state from the current one.  Unknown real states are at the origin.
+                        b = self.scaling_factor * self.bonus_engine.distance_weighted_visits(time_step, state_hash)
+                        # Adjust the bonus based on the decay factor and a logarithmic term.
+                        b *= current_decay_factor * self.log_term
+                        
+                        # Record the calculated bonus.
+                        self.exploration_bonuses.append(b)
+
+                        # Calculate the learning rate alpha, dependent on the visitation count.
+                        alpha = (self.H + 1) / (self.H + t)
+                        # Calculate the weighted current Q-value estimate.
+                        initial = (1 - alpha) * self.tables.q_value(time_step, state_hash, action)
+                        # Calculate the updated Q-value incorporating the reward, estimated future value, and bonus.
+                        expected_future = alpha * (reward + self.tables.v_value(time_step + 1, next_state_hash) + b)
+                        # Combine the current and future estimates to form the new Q-value.
+                        new_score = initial + expected_future
+                        # Update the Q-table with the new Q-value for the current state-action pair.
+                        self.tables.set_q_value(time_step, state_hash, action, new_score)
+                        # Update the value table for the current state based on the smallest Q-value across all actions.
+                        self.tables.set_v_value(time_step, state_hash, self.choose_smallest_value(state_hash, time_step))
+
+            # Reset the visited state-action pairs for the next episode and time step to ensure fresh calculations.
+            self.vSet[episode_num][time_step] = empty_transitions()
+        self._dirty.clear()
@@ -19,3 +19,19 @@ def create_env(num_of_agent=3, num_of_cycles=25, local_ratio=0.5, multiple=False
     if multiple:
         return simple_spread_v2.parallel_env(render_mode=render_mode,N=num_of_agent, max_cycles=num_of_cycles, local_ratio=local_ratio)
     return simple_spread_v2.env(render_mode=render_mode,N=num_of_agent, max_cycles=num_of_cycles, local_ratio=local_ratio)
+
+
+def create_vector_env(num_of_agent=3, num_of_cycles=25, num_of_envs=1):
+    """
+    Creates a batch of environments which are stepped together
+
+    num_of_agent = 3 - The number of agents in each environment.  Default is default for Simple Spread
+
+    num_of_cycles = 25 - The number of frames (step for each agent).  Default is default for Simple Spread
+
+    num_of_envs = 1 - How many copies of the environment to step at once
+
+    Return
+    The VectorSimpleSpread
+    """
+    return simple_spread_v2.VectorSimpleSpread(num_of_envs, N=num_of_agent, max_cycles=num_of_cycles)
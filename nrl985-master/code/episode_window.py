@@ -0,0 +1,69 @@
+"""Contains the ring buffer which holds the u and v sets of the episodes still in use"""
+from collections import defaultdict
+from functools import partial
+
+
+def empty_transitions():
+
+    """
+    Returns an empty set of transitions for one timestep, of form state -> action -> {(reward, next_state)}
+
+    Return
+    The empty transitions
+    """
+
+    return defaultdict(partial(defaultdict, set))
+
+
+class EpisodeWindow:
+
+    """
+    Indexed like the old episode -> timestep -> state -> action -> set dictionaries, but only the last span episodes are
+    kept.  Moving on to a new episode reuses the slot of the oldest one, so memory does not grow with the number of
+    episodes.  Episodes which have dropped out of the window read as empty and anything written to them is thrown away,
+    which is what happened before as they were never read again.
+    """
+
+    def __init__(self, span, num_of_time_steps):
+
+        """
+        Creates the window
+
+        span - How many of the most recent episodes to keep
+
+        num_of_time_steps - The number of timesteps held for each episode, indexed from 1
+        """
+
+        self._span = span
+        self._num_of_time_steps = num_of_time_steps
+        self._episodes = [None] * span
+        self._slots = [None] * span
+        self._newest = None
+
+    def _new_episode(self):
+
+        """Return the empty timesteps of one episode"""
+
+        return {i+1: empty_transitions() for i in range(self._num_of_time_steps)}
+
+    def __getitem__(self, episode_num):
+
+        """
+        Returns the timesteps of an episode, starting it if it is new
+
+        episode_num - The episode number
+
+        Return
+        A dictionary of timestep -> transitions
+        """
+
+        slot = episode_num % self._span
+        if self._episodes[slot] != episode_num:
+            if self._newest is not None and episode_num <= self._newest - self._span:
+                # Too old to be kept
+                return self._new_episode()
+            self._episodes[slot] = episode_num
+            self._slots[slot] = self._new_episode()
+            if self._newest is None or episode_num > self._newest:
+                self._newest = episode_num
+        return self._slots[slot]
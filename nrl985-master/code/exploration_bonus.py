@@ -0,0 +1,189 @@
+"""Contains the array backed engine for the PB exploration bonus"""
+import numpy as np
+
+from state_store import StateVectorStore
+
+
+class PEBBonusEngine:
+
+    """
+    Keeps the visitation counts of an agent's n-tables next to the real state vectors so the distance weighted
+    bonus sum_s' sum_a' n(s',a') * ||s - s'|| can be taken as one NumPy reduction instead of a Python loop.
+    """
+
+    def __init__(self, length_of_episode, state_store=None, incremental=False, initial_capacity=64):
+
+        """
+        Creates the engine
+
+        length_of_episode - The length of an episode (H).  One set of counts is kept per timestep
+
+        state_store - The StateVectorStore holding the real states.  May be shared with other engines.  A new one is
+        made if not given
+
+        incremental - If True the sum for each state is cached and patched with the visits made since it was last
+        asked for, rather than recomputed over every visited state
+
+        initial_capacity - The number of states to allocate room for before the arrays have to grow
+        """
+
+        self.H = length_of_episode
+        self.incremental = incremental
+
+        # Every state hash which has a real state or a visit gets a row in the store's vector matrix.  Observations
+        # come out of the environment as float32 and the distances have always been taken at that precision.
+        self._store = state_store if state_store is not None else StateVectorStore(initial_capacity)
+        self._store_version = self._store.version
+
+        # For each timestep, the rows visited at that timestep and the visits summed over every action.
+        # This mirrors the keys of nTables[time_step].
+        self._visited_rows = {i+1: np.zeros(initial_capacity, dtype=np.int64) for i in range(length_of_episode)}
+        self._visit_totals = {i+1: np.zeros(initial_capacity, dtype=np.int64) for i in range(length_of_episode)}
+        self._slots = {i+1: {} for i in range(length_of_episode)}
+
+        # Incremental mode.  Every visit at a timestep is appended to its journal.  A cached sum is valid up to the
+        # journal length stored with it, so bringing it up to date only needs the visits made after that point.
+        self._journal = {i+1: np.zeros(initial_capacity, dtype=np.int64) for i in range(length_of_episode)}
+        self._journal_length = {i+1: 0 for i in range(length_of_episode)}
+        self._cached_sums = {i+1: np.zeros(initial_capacity) for i in range(length_of_episode)}
+        self._cached_upto = {i+1: np.full(initial_capacity, -1, dtype=np.int64) for i in range(length_of_episode)}
+
+    def set_state_vector(self, state_hash, real_state):
+
+        """
+        Stores the real state vector of a state hash
+
+        state_hash - The hashed state
+
+        real_state - The observation the hash was made from
+        """
+
+        self._store.set(state_hash, real_state)
+
+    def _invalidate_cache(self):
+
+        """Forces every cached sum to be recomputed in full the next time it is asked for"""
+
+        for cached_upto in self._cached_upto.values():
+            cached_upto.fill(-1)
+
+    def record_visit(self, time_step, state_hash):
+
+        """
+        Adds one visit to a state at a timestep.  Should be called whenever nTables[time_step][state_hash][action] goes up
+
+        time_step - The time step of the visit
+
+        state_hash - The hashed state which was visited
+        """
+
+        row = self._store.row(state_hash)
+        slots = self._slots[time_step]
+        slot = slots.get(row)
+        if slot is None:
+            slot = len(slots)
+            rows = self._visited_rows[time_step]
+            if slot == rows.shape[0]:
+                self._visited_rows[time_step] = np.concatenate([rows, np.zeros_like(rows)])
+                self._visit_totals[time_step] = np.concatenate([self._visit_totals[time_step], np.zeros_like(rows)])
+                self._cached_sums[time_step] = np.concatenate([self._cached_sums[time_step], np.zeros(rows.shape[0])])
+                self._cached_upto[time_step] = np.concatenate([self._cached_upto[time_step], np.full(rows.shape[0], -1)])
+            self._visited_rows[time_step][slot] = row
+            slots[row] = slot
+        self._visit_totals[time_step][slot] += 1
+
+        if self.incremental:
+            if self._journal_length[time_step] == self._journal[time_step].shape[0]:
+                self._compact_journal(time_step)
+            position = self._journal_length[time_step]
+            journal = self._journal[time_step]
+            if position == journal.shape[0]:
+                journal = self._journal[time_step] = np.concatenate([journal, np.zeros_like(journal)])
+            journal[position] = row
+            self._journal_length[time_step] = position + 1
+
+    def _compact_journal(self, time_step):
+
+        """
+        Drops the start of a full journal.  A cache which is more than num_visited visits behind is always recomputed
+        in full, so visits older than that are never replayed and the journal stays around twice the visited states.
+
+        time_step - The time step whose journal is full
+        """
+
+        cutoff = self._journal_length[time_step] - len(self._slots[time_step])
+        if cutoff <= 0:
+            return
+        journal = self._journal[time_step]
+        remaining = self._journal_length[time_step] - cutoff
+        journal[:remaining] = journal[cutoff:cutoff+remaining]
+        self._journal_length[time_step] = remaining
+
+        cached_upto = self._cached_upto[time_step]
+        cached_upto -= cutoff
+        cached_upto[cached_upto < 0] = -1
+
+    def _distances(self, rows, row):
+
+        """
+        The Euclidean distances from one row to many rows
+
+        rows - The rows to measure to
+
+        row - The row to measure from
+
+        Return
+        An array of distances
+        """
+
+        vectors = self._store.vectors
+        difference = vectors[rows] - vectors[row]
+        # The differences are float32 and they are squared and summed in float64, one component at a time.  That is
+        # what the old per-pair loop did under the pinned numpy 1.26, where (s - o)**2 promotes to float64.  Under
+        # numpy 2 the old loop stayed in float32, so the two then differ by about 1e-15 relative
+        squared = np.zeros(len(rows))
+        for column in difference.T.astype(np.float64):
+            squared += column * column
+        return np.sqrt(squared)
+
+    def distance_weighted_visits(self, time_step, state_hash):
+
+        """
+        Calculates sum_s' sum_a' n(s',a') * ||s - s'|| over every state visited at the timestep
+
+        time_step - The time step to sum over
+
+        state_hash - The hashed state s
+
+        Return
+        The distance weighted visit count
+        """
+
+        num_visited = len(self._slots[time_step])
+        if num_visited == 0:
+            return 0.0
+        row = self._store.row(state_hash)
+        slot = self._slots[time_step].get(row)
+
+        if self._store_version != self._store.version:
+            # A state moved, so every cached sum which has seen it is wrong
+            self._invalidate_cache()
+            self._store_version = self._store.version
+
+        if self.incremental and slot is not None:
+            cached_upto = self._cached_upto[time_step][slot]
+            journal_length = self._journal_length[time_step]
+            # Only patch the cache if that is cheaper than recomputing it over every visited state
+            if cached_upto >= 0 and journal_length - cached_upto <= num_visited:
+                new_visits = self._journal[time_step][cached_upto:journal_length]
+                self._cached_sums[time_step][slot] += self._distances(new_visits, row).sum()
+                self._cached_upto[time_step][slot] = journal_length
+                return float(self._cached_sums[time_step][slot])
+
+        rows = self._visited_rows[time_step][:num_visited]
+        total = float(self._visit_totals[time_step][:num_visited] @ self._distances(rows, row))
+
+        if self.incremental and slot is not None:
+            self._cached_sums[time_step][slot] = total
+            self._cached_upto[time_step][slot] = self._journal_length[time_step]
+        return total
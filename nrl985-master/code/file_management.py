@@ -3,6 +3,8 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 
+from policy_archive import POLICY_SUFFIX, can_archive, load_policies, save_policies
+
 DIR_NAME = 'saved_data'
 
 ## THIS IS LEGACY CODE. IF YOU ARE USING THE EXPERIMENT PIPELINE, YOU CAN SAFELY IGNORE THIS FILE. IT IS NOT USED IN THE PIPELINE. 
@@ -79,13 +81,20 @@ def save_fig(episodes, reward, filename, title):
 def save_agents(agents, filename):
     
     """
-    This saves the agent onto local machine.  The filename is saved in form agent_type_num_of_agents_num_of_cycles_num_of_episodes_local_ratio_copies.pkl
+    This saves the agent onto local machine.  The filename is saved in form agent_type_num_of_agents_num_of_cycles_num_of_episodes_local_ratio_copies.npz
+    Agents with Q, N and V tables are saved as a policy archive (see policy_archive.py), any others are pickled to a .pkl
 
     agents - The dictionary of agents to be saved
 
     filename - The filename
     """
 
+    if can_archive(agents):
+        save_policies(f'{DIR_NAME}/trained_agents/'+filename+POLICY_SUFFIX, agents)
+        print('\n')
+        print(f'Saved file as {filename}{POLICY_SUFFIX}')
+        return
+
     with open(f'{DIR_NAME}/trained_agents/'+filename+'.pkl', 'wb') as output:
         dill.dump(agents, output, dill.HIGHEST_PROTOCOL)
 
@@ -296,16 +305,20 @@ def save(agents, episodes, reward, agent_type, num_of_agents, num_of_cycles, num
 #     save_rewards(episodes, reward, filename)
 
 
-def load(filename):
+def load(filename, seed=None):
 
     """
-    Loads the pickled file
+    Loads the saved agents.  Policy archives are opened as memory mapped greedy policies, older .pkl files are unpickled
 
     filename - The file to be loaded
 
-    returns - Dict of agents which was in the pickled file"""
+    seed - The seed the tie-breaking Generators of policy archive agents are spawned from.  None seeds them randomly
+
+    returns - Dict of agents which was in the file"""
 
     print('Loading Agents')
+    if filename.endswith(POLICY_SUFFIX):
+        return load_policies(f'{DIR_NAME}/trained_agents/'+filename, frozen=True, seed=seed)
     return [agent for agent in _pickle_loader(f'{DIR_NAME}/trained_agents/'+filename)][0]
 
 
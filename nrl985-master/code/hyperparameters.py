@@ -1,8 +1,6 @@
 from enum import Enum
+from functools import partial
 import random
-import networkx as nx
-import matplotlib.pyplot as plt
-import numpy as np
 import os
 
 class AgentType(Enum):
@@ -91,7 +89,8 @@ def watts_strogatz(num_of_agents, k, p):
     p - The probability of rewiring each edge.
 
     Returns an adjacency table representing a Watts-Strogatz graph.
-    
+
+    Nothing is plotted.  Pass the table to plot_graph to save a figure of it.
     """
     if k % 2 != 0 or k >= num_of_agents:
         raise ValueError("k must be even and less than num_of_agents")
@@ -108,9 +107,7 @@ def watts_strogatz(num_of_agents, k, p):
             adj[right_neighbor][i] = 1  # Ensure symmetry
             adj[i][left_neighbor] = 1
             adj[left_neighbor][i] = 1  # Ensure symmetry
-    
 
-    plot_graph(adj, num_of_agents, 'wattsstrogatz_prewiring.png', k)
 
     # Rewire edges with probability p
     for i in range(num_of_agents):
@@ -128,13 +125,16 @@ def watts_strogatz(num_of_agents, k, p):
                     # Add new rewired connection
                     adj[i][new_neighbor] = 1
                     adj[new_neighbor][i] = 1
-    
-    plot_graph(adj, num_of_agents, 'wattsstrogatz_postwiring.png', k)
 
 
     return adj
 
 def plot_graph(adj, num_of_agents, fig_name, k):
+    # Only needed for the figures, so they are not imported with the hyperparameters
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    import numpy as np
+
     G = nx.Graph()
     for i in range(num_of_agents):
         for j in range(num_of_agents):
@@ -239,12 +239,12 @@ def fully_connected(num_of_agents):
 #Legacy code. You do not need to use it if you're using the experiment pipeline, which is far more optimized, functional, and easier to use. 
 multiple_graph_parameters = [
     {   # Fully Connected
-        'graph': fully_connected(4),
+        'graph': partial(fully_connected, 4),
         'connection_slow': False,
         'gamma_hop': 1
     },
     {   # Line Graph with gamma = 3
-        'graph': line_graph(12),
+        'graph': partial(line_graph, 12),
         'connection_slow': True,
         'gamma_hop': 1
     },
@@ -254,17 +254,17 @@ multiple_graph_parameters = [
         'gamma_hop': 0
     },
     {   # Bipatrite K6,6 ## DO NOT USE THIS ONE
-        'graph': create_bipatrite([0,1,2,3,4,5], [6,7,8,9,10,11]),
+        'graph': partial(create_bipatrite, [0,1,2,3,4,5], [6,7,8,9,10,11]),
         'connection_slow': True,
         'gamma_hop': 1,
     },
     {   # Star centred on Agent 2
-        'graph': star_graph(4, 2),
+        'graph': partial(star_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 1
     },
     {   # Ring with 10 connections
-        'graph': ring_graph(12, 2),
+        'graph': partial(ring_graph, 12, 2),
         'connection_slow': True,
         'gamma_hop': 2
     },
@@ -347,6 +347,18 @@ eb_marl_multiple_parameters = [
         'decay_rate': 0.25, # generally should be lower the faster communication is, unless it is not full. 
         'scaling_factor': .0001, # generally should be lower the more agents you have. 
         'probability': .1, #Keep at .1.
+        'bonus_mode': 'incremental', # 'incremental' patches cached bonus sums after each visit, 'full' recomputes them over every visited state. Same bonuses either way.
+    }
+]
+
+# The backend used for the Q, N and V tables of the UCB and PB agents.
+# 'dense' keeps them as NumPy arrays, 'dict' as the original nested dictionaries.
+table_multiple_parameters = [
+    {
+        'backend': 'dense',
+    },
+    {
+        'backend': 'dict',
     }
 ]
 
@@ -362,6 +374,20 @@ evaluation_multiple_parameters = [
     }
 ]
 
+# PIPELINE
+# MAX_WORKERS
+# SEED
+# RUN_DIR
+# CHECKPOINT_INTERVAL
+pipeline_multiple_parameters = [
+    {
+        'max_workers': None, # How many trials to run at once.  None uses every core
+        'seed': None, # Each trial's seed is spawned from this.  None picks a new one, which is printed so the run can be repeated
+        'run_dir': None, # Where the trial results are written.  None makes a new directory, an existing one is resumed
+        'checkpoint_interval': 500, # How many episodes between the checkpoints of a trial.  None turns them off
+    }
+]
+
 # REWARD
 # Reward 'function' to use
 # Keep it on mean reward unless you know what you're doing. 
@@ -421,6 +447,8 @@ dynamic_parameters = [
 
 
 
+#### The graphs are given as functions (use partial for their arguments), or as an adjacency table, so nothing is built
+#### until an experiment is picked.  build_experiments makes the tables.
 #### Define experiments in exactly this format (a list of dictionaries where each dictionary corresponds to a sub-experiment within the larger experiment.) 
 ### Do not include more the 4 or the final performance graph will look hideous.
 ### You can mix the number of agents in experiments, but please make sure that they first occupy the same state space and that their average euclidean distance from the goal state is about the same. Otherwise, you will get ugly charts. 
@@ -428,7 +456,7 @@ dynamic_parameters = [
 
 experiment_1 = [
     {   
-        'graph': star_graph(4, 2),
+        'graph': partial(star_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Star, M = 4, γ = 2',
@@ -436,7 +464,7 @@ experiment_1 = [
         'agent_type': AgentType.EB_Lidard
     },
     {   
-        'graph': star_graph(4, 2),
+        'graph': partial(star_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Star, M = 4, γ = 2',
@@ -448,7 +476,7 @@ experiment_1 = [
 experiment_2 = [
 
     {   
-        'graph': star_graph(8, 2),
+        'graph': partial(star_graph, 8, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Star, M = 8, γ = 2',
@@ -456,7 +484,7 @@ experiment_2 = [
         'agent_type': AgentType.EB_Lidard
     },
     {   
-        'graph': star_graph(8, 2),
+        'graph': partial(star_graph, 8, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Star, M = 8, γ = 2',
@@ -467,7 +495,7 @@ experiment_2 = [
 
 experiment_3 = [
     {   
-        'graph': star_graph(4, 2),
+        'graph': partial(star_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Star, M = 4, γ = 1',
@@ -476,7 +504,7 @@ experiment_3 = [
     },
 
     {   
-        'graph': star_graph(4, 2),
+        'graph': partial(star_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Star, M = 4, γ = 1',
@@ -489,7 +517,7 @@ experiment_3 = [
 experiment_4 = [
 
     {   
-        'graph': star_graph(8, 2),
+        'graph': partial(star_graph, 8, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Star, M = 8, γ = 1',
@@ -498,7 +526,7 @@ experiment_4 = [
     },
 
     {   
-        'graph': star_graph(8, 2),
+        'graph': partial(star_graph, 8, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Star, M = 8, γ = 1',
@@ -511,7 +539,7 @@ experiment_4 = [
 
 experiment_5 = [
     {   
-        'graph': fully_connected(4),
+        'graph': partial(fully_connected, 4),
         'connection_slow': False,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Complete Graph, M = 4, γ = 1',
@@ -520,7 +548,7 @@ experiment_5 = [
     },
 
     {  
-        'graph': fully_connected(4),
+        'graph': partial(fully_connected, 4),
         'connection_slow': False,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Complete Graph, M = 4, γ = 1',
@@ -533,7 +561,7 @@ experiment_5 = [
 experiment_6 = [
 
     {   
-        'graph': fully_connected(8),
+        'graph': partial(fully_connected, 8),
         'connection_slow': False,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Complete Graph, M = 8, γ = 1',
@@ -542,7 +570,7 @@ experiment_6 = [
     },
 
     {   
-        'graph': fully_connected(8),
+        'graph': partial(fully_connected, 8),
         'connection_slow': False,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Complete Graph, M = 8, γ = 1',
@@ -553,7 +581,7 @@ experiment_6 = [
 
 experiment_7 = [    
     {  
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 3,
         'experiment_name': 'PEB - Line, M = 4, γ = 3',
@@ -562,7 +590,7 @@ experiment_7 = [
     },
 
     {   
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 3,
         'experiment_name': 'UCB - Line, M = 4, γ = 3',
@@ -576,7 +604,7 @@ experiment_7 = [
 experiment_8 = [    
 
     {   
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 4,
         'experiment_name': 'PEB - Line, M = 8, γ = 4',
@@ -585,7 +613,7 @@ experiment_8 = [
     },
 
     {  
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 4,
         'experiment_name': 'UCB - Line, M = 8, γ = 4',
@@ -596,7 +624,7 @@ experiment_8 = [
 
 experiment_9 = [    
     {  
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Line, M = 4, γ = 2',
@@ -605,7 +633,7 @@ experiment_9 = [
     },
     
     {   
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Line, M = 4, γ = 2',
@@ -618,7 +646,7 @@ experiment_9 = [
 experiment_10 = [    
 
     {   
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 7,
         'experiment_name': 'PEB - Line, M = 8, γ = 7',
@@ -627,7 +655,7 @@ experiment_10 = [
     },
 
     {   
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 7,
         'experiment_name': 'UCB - Line, M = 8, γ = 7',
@@ -638,7 +666,7 @@ experiment_10 = [
 
 experiment_11 = [    
     {   
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Line, M = 4, γ = 1',
@@ -647,7 +675,7 @@ experiment_11 = [
     },
 
     {   
-        'graph': line_graph(4),
+        'graph': partial(line_graph, 4),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Line, M = 4, γ = 1',
@@ -660,7 +688,7 @@ experiment_11 = [
 experiment_12 = [    
 
     {   
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Line, M = 8, γ = 1',
@@ -669,7 +697,7 @@ experiment_12 = [
     },
  
     {   
-        'graph': line_graph(8),
+        'graph': partial(line_graph, 8),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Line, M = 8, γ = 1',
@@ -679,7 +707,7 @@ experiment_12 = [
 ]
 experiment_13 = [
     {   
-        'graph': ring_graph(4, 2),
+        'graph': partial(ring_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Lattice, M = 4, γ = 2, K = 2',
@@ -688,7 +716,7 @@ experiment_13 = [
     },
 
     {   
-        'graph': ring_graph(4, 2),
+        'graph': partial(ring_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Lattice, M = 4, γ = 2, K = 2',
@@ -701,7 +729,7 @@ experiment_13 = [
 experiment_14 = [
 
     {   
-        'graph': ring_graph(8, 4),
+        'graph': partial(ring_graph, 8, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Lattice, M = 8, γ = 2, K = 4',
@@ -710,7 +738,7 @@ experiment_14 = [
     },   
  
     {   
-        'graph': ring_graph(8, 4),
+        'graph': partial(ring_graph, 8, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Lattice, M = 8, γ = 2, K = 4',
@@ -721,7 +749,7 @@ experiment_14 = [
 
 experiment_15 = [
     {   
-        'graph': ring_graph(4, 2),
+        'graph': partial(ring_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Lattice, M = 4, γ = 1, K = 2',
@@ -730,7 +758,7 @@ experiment_15 = [
     },
 
     {   
-        'graph': ring_graph(4, 2),
+        'graph': partial(ring_graph, 4, 2),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Lattice, M = 4, γ = 1, K = 2',
@@ -744,7 +772,7 @@ experiment_15 = [
 experiment_16 = [
 
     {   
-        'graph': ring_graph(8, 4),
+        'graph': partial(ring_graph, 8, 4),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'PEB - Lattice, M = 8, γ = 1, K = 4',
@@ -752,7 +780,7 @@ experiment_16 = [
         'agent_type': AgentType.EB_Lidard
     },  
     {   
-        'graph': ring_graph(8, 4),
+        'graph': partial(ring_graph, 8, 4),
         'connection_slow': True,
         'gamma_hop': 1,
         'experiment_name': 'UCB - Lattice, M = 8, γ = 1, K = 4',
@@ -764,7 +792,7 @@ experiment_16 = [
 
 experiment_17 = [
     { 
-         'graph': watts_strogatz_deterministic(), 
+         'graph': watts_strogatz_deterministic, 
          'connection_slow': True, 
          'gamma_hop': 2, 
          'experiment_name': 'PEB - Watts-Strogatz, γ = 2, K = 4, P = 0.5',
@@ -772,7 +800,7 @@ experiment_17 = [
         'agent_type': AgentType.EB_Lidard
     },
     {   
-        'graph': ring_graph(12, 4),
+        'graph': partial(ring_graph, 12, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'PEB - Lattice, γ = 2, K = 4',
@@ -780,7 +808,7 @@ experiment_17 = [
         'agent_type': AgentType.EB_Lidard
     },
     { 
-         'graph': watts_strogatz_deterministic(), 
+         'graph': watts_strogatz_deterministic, 
          'connection_slow': True, 
          'gamma_hop': 2, 
          'experiment_name': 'UCB - Watts-Strogatz, γ = 2, K = 4, P = 0.5',
@@ -788,7 +816,7 @@ experiment_17 = [
         'agent_type': AgentType.ORIGINAL
     },    
     {   
-        'graph': ring_graph(12, 4),
+        'graph': partial(ring_graph, 12, 4),
         'connection_slow': True,
         'gamma_hop': 2,
         'experiment_name': 'UCB - Lattice, γ = 2, K = 4',
@@ -804,6 +832,22 @@ experiments_choice = [experiment_1, experiment_2, experiment_3, experiment_4,
                       experiment_10, experiment_11, experiment_12, experiment_13, experiment_14,
                       experiment_15, experiment_16, experiment_17]
 
+
+def build_experiments(experiments):
+
+    """
+    Builds the graphs of a group of experiments, such as an entry of experiments_choice
+
+    experiments - The list of experiment dicts, whose graphs are functions or adjacency tables
+
+    Return
+    A new list of the experiment dicts with every graph as an adjacency table
+    """
+
+    return [dict(experiment, graph=experiment['graph']() if callable(experiment['graph']) else experiment['graph'])
+            for experiment in experiments]
+
+
 #Hyperparmameters that feed into the experiment pipeline. 
 ucb_marl_hyperparameters = ucb_marl_multiple_parameters[0]
 eb_marl_hyperparameters = eb_marl_multiple_parameters[0]
@@ -811,10 +855,12 @@ evaluation_hyperparameters = evaluation_multiple_parameters[0]
 reward_function = reward_multiple_parameters[0] 
 train_hyperparameters = train_multiple_parameters[0]
 switch_hyperparameters = switch_multiple_parameters[0]
+table_hyperparameters = table_multiple_parameters[0]
+pipeline_hyperparameters = pipeline_multiple_parameters[0]
 
 
 #Legacy code from previous student. Do not worry about it if you're using the experiment pipeline, which you ought to be using. 
-graph_hyperparameters = multiple_graph_parameters[0] #Fully connected
+graph_hyperparameters = build_experiments([multiple_graph_parameters[0]])[0] #Fully connected
 agent_hyperparameters = agent_multiple_parameters[4] #Vanilla Lidard 4 agents
 iql_hyperparameters = iql_multiple_parameters[0]
 dynamic_hyperparameters = dynamic_parameters[0]
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""Contains the learner which steps every MARL agent through an episode together"""
+from time import perf_counter
+
+import numpy as np
+
+from eb_marl_agent import EB_MARL_Comm
+from reward_functions import final_reward
+from utils import state_codec
+
+
+class MultiAgentLearner:
+
+    """
+    Runs the UCB and PB agents through a training episode.  At the edge of each step the environment's dictionaries
+    are turned into arrays over the M agents, in agent order: an (M, observation size) array of observations, an (M,)
+    array of actions and an (M,) array of rewards.  The observations of all the agents are encoded together and the
+    encoded states are kept for the next step, so a state is only encoded once.  The agents keep their own tables, so
+    the policy, communication and update phases each go over the agents one after the other with their rows of the
+    arrays.
+
+    The time spent in each phase is added up in timings.
+    """
+
+    PHASES = ('encode', 'policy', 'environment', 'communicate', 'update', 'update_values')
+
+    def __init__(self, agents):
+
+        """
+        Creates the learner
+
+        agents - The dictionary of agents.  They must all be MARL_Comm or all be EB_MARL_Comm
+        """
+
+        self.agents = agents
+        self._names = list(agents.keys())
+        self._agent_objs = [agents[agent_name] for agent_name in self._names]
+        self._codec = state_codec(len(agents))
+
+        # PB agents also need the real states
+        self._real_states = isinstance(self._agent_objs[0], EB_MARL_Comm)
+
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self.steps = 0
+
+    def _record(self, phase, since):
+
+        """
+        Adds the time since a point to a phase
+
+        phase - The phase
+
+        since - The perf_counter value when the phase started
+
+        Return
+        The perf_counter value now, which is when the next phase starts
+        """
+
+        now = perf_counter()
+        self.timings[phase] += now - since
+        return now
+
+    def encode(self, observations):
+
+        """
+        Encodes the observations of every agent at once
+
+        observations - A dictionary of agent name -> observation, as the environment gives them
+
+        Return
+        The (M, observation size) array of the observations and a list of the M encoded states, in agent order
+        """
+
+        real_states = np.stack([observations[agent_name] for agent_name in self._names])
+        # With a handful of agents looking each observation up is quicker than StateCodec.encode_batch
+        return real_states, [self._codec.encode(real_state) for real_state in real_states]
+
+    def act(self, states, real_states, time_step, oracle=None):
+
+        """
+        Chooses the action of every agent
+
+        states - The encoded states of the agents
+
+        real_states - The (M, observation size) array of the observations of the agents
+
+        time_step - The time step in the episode
+
+        oracle - The Oracle to tell about the state-action pairs, if any
+
+        Return
+        The (M,) int array of the actions, in agent order
+        """
+
+        actions = np.empty(len(self._agent_objs), dtype=int)
+        for i, (agent_obj, state, real_state) in enumerate(zip(self._agent_objs, states, real_states)):
+            if self._real_states:
+                agent_obj.update_real_state_map(state, real_state)
+            action = agent_obj.policy(state, time_step)
+            actions[i] = action
+            if oracle is not None:
+                oracle.update(state, action)
+                oracle.update_real_state_map(state, real_state)
+        return actions
+
+    def learn(self, episode_num, time_step, states, real_states, actions, rewards, new_states, new_real_states):
+
+        """
+        Passes the messages of a step and updates the values of every agent
+
+        episode_num - The episode number
+
+        time_step - The time step in the episode
+
+        states - The encoded states the agents acted in
+
+        real_states - The (M, observation size) array of the observations the agents acted on
+
+        actions - The (M,) array of the actions taken
+
+        rewards - The (M,) array of the rewards given
+
+        new_states - The encoded states the agents moved to
+
+        new_real_states - The (M, observation size) array of the observations the agents moved to
+        """
+
+        tick = perf_counter()
+        # The agents' tables are keyed by Python ints and hold Python floats
+        actions = actions.tolist()
+        rewards = rewards.tolist()
+
+        # Send messages
+        for i, agent_obj in enumerate(self._agent_objs):
+            if self._real_states:
+                agent_obj.update_real_state_map(new_states[i], new_real_states[i])
+                agent_obj.message_passing(episode_num, time_step, states[i], real_states[i], actions[i],
+                                          new_states[i], new_real_states[i], rewards[i], self.agents)
+            else:
+                agent_obj.message_passing(episode_num, time_step, states[i], actions[i], new_states[i],
+                                          rewards[i], self.agents)
+        tick = self._record('communicate', tick)
+
+        # Update u and v
+        for i, agent_obj in enumerate(self._agent_objs):
+            agent_obj.update(episode_num, time_step, states[i], new_states[i], actions[i], rewards[i])
+        tick = self._record('update', tick)
+
+        # Update the values
+        for agent_obj in self._agent_objs:
+            agent_obj.update_values(episode_num, time_step)
+        self._record('update_values', tick)
+
+    def run_episode(self, env, episode_num, oracle=None):
+
+        """
+        Trains the agents for one episode
+
+        env - The parallel environment to be used
+
+        episode_num - The episode number
+
+        oracle - The Oracle which watches the training, if any
+
+        Return
+        The reward for that episode
+        """
+
+        tick = perf_counter()
+        observations = env.reset()
+        tick = self._record('environment', tick)
+        real_states, states = self.encode(observations)
+        tick = self._record('encode', tick)
+
+        t = 0
+        while env.agents:
+            t = t+1
+
+            actions = self.act(states, real_states, t, oracle)
+            tick = self._record('policy', tick)
+
+            observations, rewards, terminations, truncations, infos = env.step(dict(zip(self._names, actions.tolist())))
+            tick = self._record('environment', tick)
+
+            new_real_states, new_states = self.encode(observations)
+            step_rewards = np.array([rewards[agent_name] for agent_name in self._names])
+            tick = self._record('encode', tick)
+
+            self.learn(episode_num, t, states, real_states, actions, step_rewards, new_states, new_real_states)
+            tick = perf_counter()
+
+            states, real_states = new_states, new_real_states
+            self.steps += 1
+
+        return final_reward(rewards)
+
+    def timing_report(self):
+
+        """
+        Returns how long each phase has taken
+
+        Return
+        A string with one line per phase: the total time, the time per step and its share of the total
+        """
+
+        total = sum(self.timings.values()) or 1.0
+        steps = max(self.steps, 1)
+        lines = [f"{'phase':<14}{'total (s)':>11}{'per step (us)':>15}{'share':>8}"]
+        for phase in self.PHASES:
+            seconds = self.timings[phase]
+            lines.append(f"{phase:<14}{seconds:>11.3f}{1e6 * seconds / steps:>15.1f}{100 * seconds / total:>7.1f}%")
+        return '\n'.join(lines)
@@ -1,11 +1,21 @@
-from hyperparameters import experiments_choice
+from hyperparameters import experiments_choice, build_experiments
+import argparse
 import time
 from twelve_experiments import experiment_pipeline
+from run_results import latest_run_dir, find_experiments
 
 ## When you define new experiments and add them to the experiments_choice array, they will automatically show up here. No need to do anything. 
 
-def menu():
-    """The menu which runs the experiment pipeline"""
+def menu(resume=None):
+    """
+    The menu which runs the experiment pipeline
+
+    resume - A run directory to carry on instead of asking for an experiment, or 'latest' for the last run started
+    """
+    if resume is not None:
+        _resume(resume)
+        return
+
     print('Please select which experiment you would like to run by entering the corresponding number (e.g., "1" for experiment 1.).')
     print('There are 17 experiments total, so enter a number between 1 and 17.')
     print('Please ensure that the hyperparameters for both the algorithm and the environment are set to their desired values in hyperparameters.py before running an experiment.')
@@ -28,7 +38,7 @@ def menu():
         print('Time started')
         start_time = time.time()
 
-        experiment_pipeline(experiments_choice[choice-1])
+        experiment_pipeline(build_experiments(experiments_choice[choice-1]))
         print("Experiment successful.")
     else:
         print("Invalid choice. Please select a number between 1 and 17.")
@@ -39,7 +49,36 @@ def menu():
         print('\nHave a good day')
 
 
+def _resume(run_dir):
+    """
+    Carries on a run which was stopped.  Finished trials are kept and the others continue from their last checkpoint
+
+    run_dir - The run directory, or 'latest' for the last run started
+    """
+    if run_dir == 'latest':
+        run_dir = latest_run_dir()
+        if run_dir is None:
+            print('There are no runs to resume.')
+            return
+    experiments = find_experiments(run_dir, (build_experiments(experiments) for experiments in experiments_choice))
+    if experiments is None:
+        print(f'The experiments of {run_dir} are not in experiments_choice any more, so it cannot be resumed.')
+        return
+
+    print(f'Resuming {run_dir}\n')
+    print('Time started')
+    start_time = time.time()
+    experiment_pipeline(experiments, run_dir=run_dir)
+    print("Experiment successful.")
+    print('\nTime finished.')
+    print(f'--- {time.time() - start_time} seconds ---')
+    print('\nHave a good day')
+
 
 # menu()
 if __name__ == '__main__':
-    menu()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Runs the experiment pipeline')
+    parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_DIR',
+                        help='Carry on a stopped run from its checkpoints.  Without RUN_DIR the last run started is used')
+    args = parser.parse_args()
+    menu(args.resume)
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Contains the message bus which carries messages between the MARL agents"""
+import heapq
+from typing import Any, NamedTuple
+
+
+class Transition(NamedTuple):
+
+    """
+    A message: the transition one agent made at one step.  It is made once and the same record is given to every agent
+    it is sent to, so it must not be changed.  The real states of the states go in the shared StateVectorStore.
+    """
+
+    time_step: int
+    episode_num: int
+    sender: str
+    state: Any
+    action: int
+    next_state: Any
+    reward: float
+
+
+class MessageBus:
+
+    """
+    Holds every message in flight between the agents.  A message sent at a step arrives the given number of steps
+    later, the distance between the agents in the power graph.  Each recipient has a timing wheel of arrival step ->
+    messages, so collecting only touches the messages which are due.
+
+    Steps are counted over the whole run, episode_num * H + time_step, as messages may arrive in the next episode.
+    """
+
+    def __init__(self, agent_names, length_of_episode):
+
+        """
+        Creates the bus.  There are no routes until set_route is called
+
+        agent_names - The names of the agents using the bus
+
+        length_of_episode - The length of an episode (H)
+        """
+
+        self.H = length_of_episode
+
+        # sender -> {recipient: distance}
+        self._routes = {agent_name: {} for agent_name in agent_names}
+
+        # recipient -> {arrival step: [messages]}, with a heap of the arrival steps so the earliest is known
+        self._wheels = {agent_name: {} for agent_name in agent_names}
+        self._arrivals = {agent_name: [] for agent_name in agent_names}
+
+        # Counters
+        self.sent = 0
+        self.delivered = 0
+
+    @property
+    def in_flight(self):
+
+        """Return the number of messages which have been sent but not collected"""
+
+        return self.sent - self.delivered
+
+    def _step(self, episode_num, time_step):
+
+        """Return the step number over the whole run"""
+
+        return episode_num * self.H + time_step
+
+    def set_route(self, sender, recipient, distance):
+
+        """
+        Sets how far messages from one agent take to reach another
+
+        sender - The agent sending
+
+        recipient - The agent receiving
+
+        distance - How many steps the message takes.  0 means there is no connection
+        """
+
+        if distance == 0:
+            self._routes[sender].pop(recipient, None)
+        else:
+            self._routes[sender][recipient] = distance
+
+    def send(self, sender, episode_num, time_step, message):
+
+        """
+        Sends a message to every agent the sender is connected to
+
+        sender - The agent sending
+
+        episode_num - The episode the message is sent in
+
+        time_step - The time step the message is sent at
+
+        message - The message.  The same object is given to every recipient
+        """
+
+        now = self._step(episode_num, time_step)
+        for recipient, distance in self._routes[sender].items():
+            arrival = now + distance
+            wheel = self._wheels[recipient]
+            slot = wheel.get(arrival)
+            if slot is None:
+                slot = wheel[arrival] = []
+                heapq.heappush(self._arrivals[recipient], arrival)
+            slot.append(message)
+            self.sent += 1
+
+    def collect(self, recipient, episode_num, time_step):
+
+        """
+        Takes every message which has reached an agent by this step
+
+        recipient - The agent receiving
+
+        episode_num - The current episode
+
+        time_step - The current time step
+
+        Return
+        A list of messages in the order they arrived
+        """
+
+        now = self._step(episode_num, time_step)
+        arrivals = self._arrivals[recipient]
+        messages = []
+        while arrivals and arrivals[0] <= now:
+            messages.extend(self._wheels[recipient].pop(heapq.heappop(arrivals)))
+        self.delivered += len(messages)
+        return messages
@@ -0,0 +1,31 @@
+"""Contains the grids the simple spread observations are snapped to.  Only needs numpy, so the state codec can be
+used without the environment being importable"""
+import numpy as np
+
+# The values observations are snapped to with four agents
+GRID_FOUR = np.array([-2, -1.6, -1.2, -0.8, -0.4,
+                      0.0, 0.4, 0.8, 1.2, 1.6])
+
+# The values observations are snapped to with any other number of agents
+GRID_TWELVE = np.array([-8, -7.6, -7.2, -6.8, -6.4,
+                        -6, -5.6, -5.2, -4.8, -4.4,
+                        -4, -3.6, -3.2, -2.8, -2.4,
+                        -2, -1.6, -1.2, -0.8, -0.4,
+                        0.0, 0.4, 0.8, 1.2, 1.6,
+                        2.0, 2.4, 2.8, 3.2, 3.6,
+                        4.0, 4.4, 4.8, 5.2, 5.6,
+                        6.0, 6.4, 6.8, 7.2, 7.6])
+
+
+def observation_grid(num_of_agents):
+
+    """
+    Returns the grid the observations are snapped to with this many agents
+
+    num_of_agents - The number of agents in the environment
+
+    Return
+    The array of grid values, in increasing order
+    """
+
+    return GRID_FOUR if num_of_agents == 4 else GRID_TWELVE
@@ -1,32 +1,117 @@
 from collections import defaultdict
-from statistics import mean, median, mode, variance
-from scipy.stats import entropy
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import networkx as nx
+from functools import partial
+from statistics import StatisticsError
 import numpy as np
 import math 
 import os
 import uuid
 import warnings
-import seaborn as sns
+
+# matplotlib, seaborn, networkx and scipy are imported by the methods which use them, so training, which only needs
+# update, does not load them
+
+def _n_log_n(count):
+    return count * math.log(count) if count > 0 else 0.0
+
 
 class Oracle: ##The Oracle is the same this as the Observer in the paper. I was just too lazy to change the name. :)
     def __init__(self):
         # Initializes the universal n-table
-        self.universal_nTable = defaultdict(lambda: defaultdict(int))
+        self.universal_nTable = defaultdict(partial(defaultdict, int))
         self.real_state_map = {}  # Mapping from hashed states to real states
         self.episode_stats = [] # List of dictionaries containing statistics for each episode
-    
+        # Running aggregates over the counts of the universal n-table, kept up to date by update so the statistics
+        # never have to walk the table.  Anything which writes to the table directly has to call _recount afterwards.
+        self._recount()
+
+    def _recount(self):
+        """
+        Rebuilds the running aggregates from the universal n-table.
+        """
+        self._num_pairs = 0
+        self._total_count = 0
+        self._sum_squares = 0
+        self._sum_n_log_n = 0.0
+        self._count_histogram = {} # Count -> the number of state-action pairs with that count
+        # Count -> when it came into the histogram, so mode ties go to the count seen first as statistics.mode does.
+        # Rebuilding walks the table in order, so straight after it this is the order the table holds the counts in
+        self._count_order = {}
+        self._next_order = 0
+        for actions in self.universal_nTable.values():
+            for count in actions.values():
+                self._add_count(count, 1)
+
+    def _add_count(self, count, sign):
+        """
+        Adds (sign 1) or takes away (sign -1) a state-action pair with the given count from the running aggregates.
+        """
+        self._num_pairs += sign
+        self._total_count += sign * count
+        self._sum_squares += sign * count * count
+        self._sum_n_log_n += sign * _n_log_n(count)
+        pairs_with_count = self._count_histogram.get(count, 0) + sign
+        if pairs_with_count:
+            if count not in self._count_order:
+                self._count_order[count] = self._next_order
+                self._next_order += 1
+            self._count_histogram[count] = pairs_with_count
+        else:
+            del self._count_histogram[count]
+            del self._count_order[count]
+
+    def merge(self, other):
+        """
+        Adds the counts and real states seen by another Oracle, such as one from another trial.
+        """
+        for state, actions in other.universal_nTable.items():
+            for action, count in actions.items():
+                self.universal_nTable[state][action] += count
+        self.real_state_map.update(other.real_state_map)
+        self.episode_stats.extend(other.episode_stats)
+        self._recount()
+
+    def average(self, num_of_trials):
+        """
+        Divides every count by the number of trials, for an Oracle which has had that many trials merged into it.
+        """
+        for actions in self.universal_nTable.values():
+            for action in actions:
+                actions[action] /= num_of_trials
+        self._recount()
+
+    def to_arrays(self):
+        """
+        Returns the counts and real states as flat arrays, so they can be saved without pickling.
+        """
+        keys = [(state, action, count) for state, actions in self.universal_nTable.items() for action, count in actions.items()]
+        states, actions, counts = zip(*keys) if keys else ((), (), ())
+        real_state_keys = list(self.real_state_map.keys())
+        return {
+            'oracle_states': np.array(states),
+            'oracle_actions': np.array(actions, dtype=np.int64),
+            'oracle_counts': np.array(counts),
+            'oracle_real_state_keys': np.array(real_state_keys),
+            'oracle_real_states': np.array([self.real_state_map[key] for key in real_state_keys], dtype=np.float32),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuilds an Oracle from the arrays made by to_arrays.
+        """
+        oracle = cls()
+        for state, action, count in zip(arrays['oracle_states'].tolist(), arrays['oracle_actions'].tolist(), arrays['oracle_counts'].tolist()):
+            oracle.universal_nTable[state][action] = count
+        for key, real_state in zip(arrays['oracle_real_state_keys'].tolist(), arrays['oracle_real_states']):
+            oracle.real_state_map[key] = real_state
+        oracle._recount()
+        return oracle
+
     def create_universal_nTable(self):
         return self.universal_nTable
 
     def sum_universal_nTable(self):
-        total_count = 0
-        for state in self.universal_nTable:
-            for action in self.universal_nTable[state]:
-                total_count += self.universal_nTable[state][action]
-        return total_count
+        return self._total_count
     
     def sum_top_four_states(self):
         state_action_sums = {}
@@ -63,17 +148,8 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         """
         def modified_sigmoid(x, scale=delta):
             return 1 / (1 + scale * math.exp(-x))
-        
-        all_counts = []
-
-        for state, actions in self.universal_nTable.items():
-            for action, count in actions.items():
-                all_counts.append(count)
 
-        # Calculate entropy
-        total_count = sum(all_counts)
-        probabilities = [count / total_count for count in all_counts]
-        entropy_value = entropy(probabilities)
+        entropy_value = self._entropy()
         normalized_entropy_value = modified_sigmoid(entropy_value)
 
         bes = (alpha * (1-normalized_entropy_value) + beta * (1 - math.exp(mean_reward))) / (alpha + beta)
@@ -82,38 +158,60 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
 
     def update(self, state, action):
         # Updates the n-table with the given state-action pair
-        self.universal_nTable[state][action] += 1
+        actions = self.universal_nTable[state]
+        if action in actions:
+            count = actions[action]
+            self._add_count(count, -1)
+        else:
+            count = 0
+        actions[action] = count + 1
+        self._add_count(count + 1, 1)
 
     def get_visit_count(self, state, action):
-        # Retrieves the visit count for a specific state-action pair
-        return self.universal_nTable[state][action]
-    
+        # Retrieves the visit count for a specific state-action pair.  Does not add unseen pairs to the table
+        return self.universal_nTable.get(state, {}).get(action, 0)
+
+    def _entropy(self):
+        """
+        The entropy of the visit counts normalised to probabilities, from the running sum of n log n:
+        -sum(n/T log(n/T)) = log T - sum(n log n)/T
+        """
+        return math.log(self._total_count) - self._sum_n_log_n / self._total_count
+
+    def _median(self):
+        """
+        The median of the visit counts, found in the sorted histogram rather than by sorting every pair.
+        """
+        counts = sorted(self._count_histogram)
+        # The number of pairs with each count or less, so the pair at a sorted position has the first count whose
+        # running total is past it
+        cumulative = np.cumsum([self._count_histogram[count] for count in counts])
+        low, high = np.searchsorted(cumulative, [(self._num_pairs - 1) // 2, self._num_pairs // 2], side='right')
+        if self._num_pairs % 2:
+            return counts[low]
+        return (counts[low] + counts[high]) / 2
+
     def calculate_statistics(self):
         """
         Calculate mean, median, mode, entropy, variance, number of unique states, 
         and number of unique state-action pairs for the values in the universal n-table.
         """
-        all_counts = []
-        unique_state_action_pairs = 0
-
-        for state, actions in self.universal_nTable.items():
-            for action, count in actions.items():
-                all_counts.append(count)
-                unique_state_action_pairs += 1  # Count each state-action pair
+        if self._num_pairs < 2:
+            raise StatisticsError('the statistics need at least two state-action pairs to have been visited')
 
+        unique_state_action_pairs = self._num_pairs
         unique_states = len(self.universal_nTable)
-
-        # Calculate entropy
-        total_count = sum(all_counts)
-        probabilities = [count / total_count for count in all_counts]
-        entropy_value = entropy(probabilities)
+        total_count = self._total_count
 
         return {
-            "mean": mean(all_counts),
-            "median": median(all_counts),
-            "mode": mode(all_counts),
-            "entropy": entropy_value,
-            "variance": variance(all_counts),
+            "mean": total_count / unique_state_action_pairs,
+            "median": self._median(),
+            # The most common count, ties go to the count seen first
+            "mode": max(self._count_histogram, key=lambda count: (self._count_histogram[count], -self._count_order[count])),
+            "entropy": self._entropy(),
+            # Worked out in one division so integer counts give exactly what statistics.variance does.  Averaged counts
+            # can round a variance of zero to just below it.
+            "variance": max(0, (unique_state_action_pairs * self._sum_squares - total_count * total_count) / (unique_state_action_pairs * (unique_state_action_pairs - 1))),
             "unique_states": unique_states,
             "unique_state_action_pairs": unique_state_action_pairs,
             "USA-to-US-ratio": unique_state_action_pairs / unique_states
@@ -124,6 +222,9 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         self.real_state_map[hash_value] = real_state
             
     def create_bubble_plot(self, num_agents):
+        import matplotlib.pyplot as plt
+        import matplotlib.colors as mcolors
+
         directory = "saved_data/observer_figs"
         if not os.path.exists(directory):
             os.makedirs(directory)
@@ -196,13 +297,15 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         unique_filename = f"{directory}/{object_id_key_name}_bubble_plot_{uuid.uuid4()}.png"
         plt.savefig(unique_filename)
         print(f"Saved figure: {unique_filename}")
-    plt.close()
+        plt.close()
 
    
     def plot_episode_statistics(self):
         """
         Plots and saves the time series data for each statistic over the episodes.
         """
+        import matplotlib.pyplot as plt
+
         directory = "saved_data/observer_figs"
         if not os.path.exists(directory):
             os.makedirs(directory)
@@ -227,6 +330,9 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         """
         Plots and saves a seaborn histogram of the visit counts in the universal nTable.
         """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
         directory = "saved_data/observer_figs"
         if not os.path.exists(directory):
             os.makedirs(directory)
@@ -265,31 +371,57 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         return interaction_strength
 
     def build_state_graph(self, threshold=.5):
+        """
+        Builds the graph of visited states, with an edge between two states when their interaction strength (see
+        calculate_interaction_strength) is at least the threshold.  The strength is at most 1 / (1 + distance), so only
+        states within 1/threshold - 1 of each other can be joined.  Those pairs are found with a KD-tree over the x, y
+        coordinates and their strengths are worked out together, rather than comparing every pair of states.
+        """
+        import networkx as nx
+        from scipy.spatial import cKDTree
+
         G = nx.Graph()
 
-        # Aggregate action counts by state
-        action_counts_by_state = {state_hash: sum(actions.values()) for state_hash, actions in self.universal_nTable.items()}
+        state_hashes = list(self.universal_nTable.keys())
 
         # Add nodes to the graph
-        for state_hash in self.universal_nTable.keys():
-            G.add_node(state_hash)
-
-        for state_hash, actions in self.universal_nTable.items():
-            real_state = np.array(self.real_state_map[state_hash])
-            for other_state_hash, other_actions in self.universal_nTable.items():
-                if other_state_hash != state_hash:
-                    other_real_state = np.array(self.real_state_map[other_state_hash])
-                    interaction_strength = self.calculate_interaction_strength(
-                        real_state, other_real_state, 
-                        action_counts_by_state[state_hash], action_counts_by_state[other_state_hash])
-
-                    # Adding edge based on threshold
-                    if interaction_strength >= threshold:
-                        G.add_edge(state_hash, other_state_hash, weight=1+interaction_strength) 
-                        
+        G.add_nodes_from(state_hashes)
+        if len(state_hashes) < 2:
+            return G
+
+        # Aggregate action counts by state
+        visit_counts = np.array([sum(self.universal_nTable[state_hash].values()) for state_hash in state_hashes], dtype=float)
+        coordinates = np.array([np.asarray(self.real_state_map[state_hash])[-2:] for state_hash in state_hashes])
+
+        if threshold > 0:
+            # Slightly wider than the bound so no pair on it is lost to rounding, the strengths below are exact
+            radius = (1 / threshold - 1) * (1 + 1e-9)
+            if radius < 0:
+                return G
+            pairs = cKDTree(coordinates).query_pairs(radius, output_type='ndarray')
+        else:
+            pairs = np.array(np.triu_indices(len(state_hashes), k=1)).T
+        first, second = pairs[:, 0], pairs[:, 1]
+
+        # The same sums as calculate_interaction_strength, for every candidate pair at once
+        difference = coordinates[first] - coordinates[second]
+        # The distance is taken in the precision of the real states, the rest in double precision
+        euclidean_dist = np.sqrt(np.einsum('ij,ij->i', difference, difference)).astype(float)
+        visitation_diff = np.abs(visit_counts[first] - visit_counts[second]) / np.maximum(np.maximum(visit_counts[first], visit_counts[second]), 1)
+        interaction_strength = 1 / (1 + euclidean_dist + visitation_diff)
+
+        # Adding edges based on threshold
+        keep = interaction_strength >= threshold
+        G.add_weighted_edges_from(
+            (state_hashes[i], state_hashes[j], 1 + strength)
+            for i, j, strength in zip(first[keep].tolist(), second[keep].tolist(), interaction_strength[keep].tolist())
+        )
+
         return G
     
     def calculate_clustering_coefficient(self):
+        import networkx as nx
+
         # Build the state-action graph
         graph = self.build_state_graph()
 
@@ -304,6 +436,9 @@ class Oracle: ##The Oracle is the same this as the Observer in the paper. I was
         """
         Visualize the state-action graph.
         """
+        import matplotlib.pyplot as plt
+        import networkx as nx
+
         # G = self.build_state_action_graph()  # Assuming this method returns a NetworkX graph
 
         plt.figure(figsize=(12, 12))
@@ -1,5 +1,6 @@
 import numpy as np
 import traceback
+from functools import lru_cache
 
 class EntityState:  # physical/external base state of all entities
     def __init__(self):
@@ -87,6 +88,51 @@ class Agent(Entity):  # properties of agent entities
         self.action_callback = None
 
 
+# the force of each discrete action (none, -x, +x, -y, +y), scaled by the acceleration, which is 5 when it is not set.
+# Read only, shared by everything with the same dim_p and accel
+@lru_cache(maxsize=None)
+def action_forces(dim_p, accel=None):
+    forces = np.zeros((dim_p * 2 + 1, dim_p))
+    forces[1, 0] = -1.0
+    forces[2, 0] = +1.0
+    forces[3, 1] = -1.0
+    forces[4, 1] = +1.0
+    forces *= 5.0 if accel is None else accel
+    forces += 0.0
+    forces.flags.writeable = False
+    return forces
+
+
+# the masses, as an (N, 1) array, and the speed limits, as an (N,) array with inf for no limit or None when no
+# entity has one, of a list of entities, for integrate_arrays
+def entity_arrays(entities):
+    mass = np.array([[entity.mass] for entity in entities], dtype=np.float64).reshape(-1, 1)
+    max_speed = [np.inf if entity.max_speed is None else entity.max_speed for entity in entities]
+    if np.isinf(max_speed).all():
+        return mass, None
+    return mass, np.array(max_speed, dtype=np.float64)
+
+
+# integrate the physical state of N entities, or of several copies of them at once.  p_pos and p_vel are (..., N,
+# dim_p) arrays which are changed in place, force is an array of the same shape or None when nothing pushes them,
+# mass and max_speed are from entity_arrays.  Gives the same values as World.integrate_state
+def integrate_arrays(p_pos, p_vel, force, mass, max_speed, damping, dt, bound):
+    p_vel *= 1 - damping
+    if force is not None:
+        p_vel += (force / mass) * dt
+    np.clip(p_vel, -bound, bound, out=p_vel)
+
+    if max_speed is not None:
+        speed = np.sqrt(np.square(p_vel[..., 0]) + np.square(p_vel[..., 1]))
+        too_fast = speed > max_speed
+        if too_fast.any():
+            limit = np.broadcast_to(max_speed, speed.shape)
+            p_vel[too_fast] = p_vel[too_fast] / speed[too_fast, None] * limit[too_fast, None]
+
+    p_pos += p_vel * dt
+    np.clip(p_pos, -bound, bound, out=p_pos)
+
+
 class World:  # multi-agent world
     def __init__(self):
         # list of agents and entities (can change at execution-time!)
@@ -105,6 +151,20 @@ class World:  # multi-agent world
         # contact response parameters
         self.contact_force = 1e2
         self.contact_margin = 1e-3
+        # structure of arrays mode.  The positions and velocities of the movable entities are kept as (N, dim_p)
+        # arrays and stepped with whole array operations.  Each entity's state holds views of its rows, so
+        # bind_state_arrays must be called whenever the states are replaced (after reset_world)
+        self.vectorized = False
+        self.p_pos = None
+        self.p_vel = None
+        # the generator the action and communication noise is drawn from.  The environment replaces it with its own
+        # np_random so seeding the environment seeds the noise too
+        self.np_random = np.random.default_rng()
+
+    # positions and velocities are clipped to [-bound, bound], which is the edge of the grid they are snapped to
+    @property
+    def bound(self):
+        return 2 if len(self.agents) == 4 else 8
 
     # return all entities in the world
     @property
@@ -137,7 +197,10 @@ class World:  # multi-agent world
         # apply environment forces
         #p_force = self.apply_environment_force(p_force)
         # integrate physical state
-        self.integrate_state(p_force)
+        if self.vectorized:
+            self.integrate_state_arrays(p_force)
+        else:
+            self.integrate_state(p_force)
         # update agent state
         for agent in self.agents:
             self.update_agent_state(agent)
@@ -148,7 +211,7 @@ class World:  # multi-agent world
         for i, agent in enumerate(self.agents):
             if agent.movable:
                 noise = (
-                    np.random.randn(*agent.action.u.shape) * agent.u_noise
+                    self.np_random.standard_normal(agent.action.u.shape) * agent.u_noise
                     if agent.u_noise
                     else 0.0
                 )
@@ -183,17 +246,12 @@ class World:  # multi-agent world
             if p_force[i] is not None:
                 entity.state.p_vel += (p_force[i] / entity.mass) * self.dt
             
+            bound = self.bound
             for i, value in enumerate(entity.state.p_vel):
-                if len(self.agents) == 4:
-                    if value > 2:
-                        entity.state.p_vel[i] = 2
-                    elif value < -2:
-                        entity.state.p_vel[i] = -2
-                else:
-                    if value > 8:
-                        entity.state.p_vel[i] = 8
-                    elif value < -8:
-                        entity.state.p_vel[i] = -8
+                if value > bound:
+                    entity.state.p_vel[i] = bound
+                elif value < -bound:
+                    entity.state.p_vel[i] = -bound
 
             if entity.max_speed is not None:
                 speed = np.sqrt(
@@ -210,16 +268,29 @@ class World:  # multi-agent world
                     )
             entity.state.p_pos += entity.state.p_vel * self.dt
             for i, value in enumerate(entity.state.p_pos):
-                if len(self.agents) == 4:
-                    if value > 2:
-                        entity.state.p_pos[i] = 2
-                    elif value < -2:
-                        entity.state.p_pos[i] = -2
-                else:
-                    if value > 8:
-                        entity.state.p_pos[i] = 8
-                    elif value < -8:
-                        entity.state.p_pos[i] = -8
+                if value > bound:
+                    entity.state.p_pos[i] = bound
+                elif value < -bound:
+                    entity.state.p_pos[i] = -bound
+
+    # move the states of the movable entities into the position and velocity arrays
+    def bind_state_arrays(self):
+        self._movable = [i for i, entity in enumerate(self.entities) if entity.movable]
+        movable = [self.entities[i] for i in self._movable]
+        self.p_pos = np.array([entity.state.p_pos for entity in movable], dtype=np.float64).reshape(-1, self.dim_p)
+        self.p_vel = np.array([entity.state.p_vel for entity in movable], dtype=np.float64).reshape(-1, self.dim_p)
+        for k, entity in enumerate(movable):
+            entity.state.p_pos = self.p_pos[k]
+            entity.state.p_vel = self.p_vel[k]
+        self._mass, self._max_speed = entity_arrays(movable)
+
+    # integrate physical state with whole array operations.  Gives the same values as integrate_state
+    def integrate_state_arrays(self, p_force):
+        force = None
+        if any(p_force[i] is not None for i in self._movable):
+            force = np.array([np.zeros(self.dim_p) if p_force[i] is None else p_force[i] for i in self._movable],
+                             dtype=np.float64)
+        integrate_arrays(self.p_pos, self.p_vel, force, self._mass, self._max_speed, self.damping, self.dt, self.bound)
 
     def update_agent_state(self, agent):
         # set communication state (directly for now)
@@ -227,7 +298,7 @@ class World:  # multi-agent world
             agent.state.c = np.zeros(self.dim_c)
         else:
             noise = (
-                np.random.randn(*agent.action.c.shape) * agent.c_noise
+                self.np_random.standard_normal(agent.action.c.shape) * agent.c_noise
                 if agent.c_noise
                 else 0.0
             )
@@ -1,6 +1,18 @@
+import numpy as np
+
+
 class BaseScenario:  # defines scenario upon which the world is built
     def make_world(self):  # create elements of the world
         raise NotImplementedError()
 
     def reset_world(self, world, np_random):  # create initial conditions of the world
         raise NotImplementedError()
+
+    def post_step(self, world):  # called after every step of the world, before the rewards and observations
+        pass
+
+    def rewards(self, world):  # the rewards of every agent, in the order of world.agents
+        return [self.reward(agent, world) for agent in world.agents]
+
+    def observations(self, world):  # the observations of every agent, one row each
+        return np.array([self.observation(agent, world) for agent in world.agents])
@@ -6,8 +6,8 @@ import pygame
 from gymnasium import spaces
 from gymnasium.utils import seeding
 
-from pettingzoo import AECEnv
-from pettingzoo.mpe._mpe_utils.core import Agent
+from pettingzoo import AECEnv, ParallelEnv
+from pettingzoo.mpe._mpe_utils.core import Agent, action_forces
 from pettingzoo.utils import wrappers
 from pettingzoo.utils.agent_selector import agent_selector
 
@@ -29,6 +29,13 @@ def make_env(raw_env):
     return env
 
 
+def make_parallel_env(raw_env):
+    def parallel_env(**kwargs):
+        return SimpleParallelEnv(raw_env(**kwargs))
+
+    return parallel_env
+
+
 class SimpleEnv(AECEnv):
     metadata = {
         "render_modes": ["human", "rgb_array"],
@@ -67,10 +74,13 @@ class SimpleEnv(AECEnv):
         self.max_cycles = max_cycles
         self.scenario = scenario
         self.world = world
+        self.world.np_random = self.np_random
         self.continuous_actions = continuous_actions
         self.local_ratio = local_ratio
 
         self.scenario.reset_world(self.world, self.np_random, test)
+        if self.world.vectorized:
+            self.world.bind_state_arrays()
 
         self.agents = [agent.name for agent in self.world.agents]
         self.possible_agents = self.agents[:]
@@ -148,6 +158,9 @@ class SimpleEnv(AECEnv):
 
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        # the world draws its noise from the same generator
+        if getattr(self, "world", None) is not None:
+            self.world.np_random = self.np_random
 
     def observe(self, agent):
         return self.scenario.observation(
@@ -167,6 +180,8 @@ class SimpleEnv(AECEnv):
         if seed is not None:
             self.seed(seed=seed)
         self.scenario.reset_world(self.world, self.np_random, test=options)
+        if self.world.vectorized:
+            self.world.bind_state_arrays()
 
         self.agents = self.possible_agents[:]
         self.rewards = {name: 0.0 for name in self.agents}
@@ -181,9 +196,17 @@ class SimpleEnv(AECEnv):
         self.current_actions = [None] * self.num_agents
 
     def _execute_world_step(self):
-        # set action for each agent
+        self._set_world_actions(self.current_actions)
+        self.world.step()
+        self.scenario.post_step(self.world)
+
+        for agent, reward in zip(self.world.agents, self._world_rewards()):
+            self.rewards[agent.name] = reward
+
+    # set the action of every agent, in the order of world.agents
+    def _set_world_actions(self, actions):
         for i, agent in enumerate(self.world.agents):
-            action = self.current_actions[i]
+            action = actions[i]
             #print(action)
             #print(agent.movable)
             scenario_action = []
@@ -199,14 +222,16 @@ class SimpleEnv(AECEnv):
                 scenario_action.append(action)
             #print(scenario_action)
             self._set_action(scenario_action, agent, self.action_spaces[agent.name])
-        self.world.step()
 
+    # the reward of every agent, in the order of world.agents
+    def _world_rewards(self):
         global_reward = 0.0
         # if self.local_ratio is not None:
         #     global_reward = float(self.scenario.global_reward(self.world))
 
-        for agent in self.world.agents:
-            agent_reward = float(self.scenario.reward(agent, self.world))
+        rewards = []
+        for agent_reward in self.scenario.rewards(self.world):
+            agent_reward = float(agent_reward)
             if self.local_ratio is not None:
                 reward = (
                     global_reward * (1 - self.local_ratio)
@@ -214,8 +239,8 @@ class SimpleEnv(AECEnv):
                 )
             else:
                 reward = agent_reward
-
-            self.rewards[agent.name] = reward
+            rewards.append(reward)
+        return rewards
 
     # set env action for a particular agent
     def _set_action(self, action, agent, action_space, time=None):
@@ -224,26 +249,19 @@ class SimpleEnv(AECEnv):
 
         if agent.movable:
             # physical action
-            agent.action.u = np.zeros(self.world.dim_p)
            # print(f'self.continuous_actions {self.continuous_actions}')
             if self.continuous_actions:
                 # Process continuous action as in OpenAI MPE
+                agent.action.u = np.zeros(self.world.dim_p)
                 agent.action.u[0] += action[0][1] - action[0][2]
                 agent.action.u[1] += action[0][3] - action[0][4]
+                sensitivity = 5.0
+                if agent.accel is not None:
+                    sensitivity = agent.accel
+                agent.action.u *= sensitivity
             else:
-                # process discrete action
-                if action[0] == 1:
-                    agent.action.u[0] = -1.0
-                if action[0] == 2:
-                    agent.action.u[0] = +1.0
-                if action[0] == 3:
-                    agent.action.u[1] = -1.0
-                if action[0] == 4:
-                    agent.action.u[1] = +1.0
-            sensitivity = 5.0
-            if agent.accel is not None:
-                sensitivity = agent.accel
-            agent.action.u *= sensitivity
+                # process discrete action.  The same table VectorSimpleSpread uses
+                agent.action.u = action_forces(self.world.dim_p, agent.accel)[action[0]].copy()
             action = action[1:]
         if not agent.silent:
             # communication action
@@ -367,3 +385,77 @@ class SimpleEnv(AECEnv):
             pygame.event.pump()
             pygame.display.quit()
             self.renderOn = False
+
+
+class SimpleParallelEnv(ParallelEnv):
+    """Steps a SimpleEnv with the actions of every agent at once.
+
+    Unlike aec_to_parallel_wrapper it does not take the agents through the AEC
+    turn order one by one, so there is no agent selector or reward accumulation
+    on each step.  The observations of all the agents are worked out together
+    into one array, new each step, and each agent is given its row.
+    """
+
+    def __init__(self, aec_env):
+        assert isinstance(aec_env, SimpleEnv), "SimpleParallelEnv needs the raw SimpleEnv, not a wrapped one"
+        self.aec_env = aec_env
+        self.metadata = aec_env.metadata
+        self.render_mode = aec_env.render_mode
+        self.possible_agents = aec_env.possible_agents[:]
+        self.agents = self.possible_agents[:]
+        self.observation_spaces = aec_env.observation_spaces
+        self.action_spaces = aec_env.action_spaces
+        self.state_space = aec_env.state_space
+        self.max_cycles = aec_env.max_cycles
+        self.steps = 0
+
+    def observation_space(self, agent):
+        return self.observation_spaces[agent]
+
+    def action_space(self, agent):
+        return self.action_spaces[agent]
+
+    @property
+    def unwrapped(self):
+        return self.aec_env
+
+    def _observations(self):
+        world = self.aec_env.world
+        observations = self.aec_env.scenario.observations(world).astype(np.float32)
+        return dict(zip(self.agents, observations))
+
+    def reset(self, seed=None, return_info=False, options=None):
+        self.aec_env.reset(seed=seed, options=options)
+        self.agents = self.possible_agents[:]
+        self.steps = 0
+        observations = self._observations()
+        if not return_info:
+            return observations
+        return observations, {agent: {} for agent in self.agents}
+
+    def step(self, actions):
+        env = self.aec_env
+        env._set_world_actions([actions[agent] for agent in self.agents])
+        env.world.step()
+        env.scenario.post_step(env.world)
+        rewards = dict(zip(self.agents, env._world_rewards()))
+
+        self.steps += 1
+        env.steps = self.steps
+        truncated = self.steps >= self.max_cycles
+        observations = self._observations()
+        terminations = {agent: False for agent in self.agents}
+        truncations = {agent: truncated for agent in self.agents}
+        infos = {agent: {} for agent in self.agents}
+        if truncated:
+            self.agents = []
+        return observations, rewards, terminations, truncations, infos
+
+    def render(self):
+        return self.aec_env.render()
+
+    def state(self):
+        return self.aec_env.state()
+
+    def close(self):
+        return self.aec_env.close()
@@ -57,12 +57,12 @@ simple_spread_v2.env(N=3, local_ratio=0.5, max_cycles=25, continuous_actions=Fal
 
 import numpy as np
 from gymnasium.utils import EzPickle
+from observation_grids import observation_grid
 import random
-from pettingzoo.utils.conversions import parallel_wrapper_fn
 
 from .._mpe_utils.core import Agent, Landmark, World
 from .._mpe_utils.scenario import BaseScenario
-from .._mpe_utils.simple_env import SimpleEnv, make_env
+from .._mpe_utils.simple_env import SimpleEnv, make_env, make_parallel_env
 
 
 class raw_env(SimpleEnv, EzPickle):
@@ -73,15 +73,17 @@ class raw_env(SimpleEnv, EzPickle):
         max_cycles=25,
         continuous_actions=False,
         render_mode=None,
+        vectorized=True,
     ):
         EzPickle.__init__(
-            self, N, local_ratio, max_cycles, continuous_actions, render_mode
+            self, N, local_ratio, max_cycles, continuous_actions, render_mode, vectorized
         )
         assert (
             0.0 <= local_ratio <= 1.0
         ), "local_ratio is a proportion. Must be between 0 and 1."
         scenario = Scenario()
         world = scenario.make_world(N)
+        world.vectorized = vectorized
         super().__init__(
             scenario=scenario,
             world=world,
@@ -103,7 +105,54 @@ class raw_env(SimpleEnv, EzPickle):
 
 
 env = make_env(raw_env)
-parallel_env = parallel_wrapper_fn(env)
+parallel_env = make_parallel_env(raw_env)
+
+
+class GridQuantizer:
+    # Snaps values to the nearest value of a sorted grid, taking the lower one on a tie.  Made once per world, it
+    # snaps whole arrays with one searchsorted instead of searching the grid for each value.
+    def __init__(self, grid):
+        self.grid = np.asarray(grid, dtype=np.float64)
+        # position -> (obs_pos, obs_vel) of the landmarks
+        self._landmarks = {}
+
+    def snap(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        # grid[upper - 1] < value <= grid[upper], kept in range so values off the ends go to the end values
+        upper = np.searchsorted(self.grid, values)
+        np.clip(upper, 1, len(self.grid) - 1, out=upper)
+        below = self.grid[upper - 1]
+        above = self.grid[upper]
+        # The distances are worked out the same way as before so ties are decided identically
+        return np.where(abs(below - values) <= abs(above - values), below, above)
+
+    def snap_entity(self, entity):
+        snapped = self.snap(np.concatenate([entity.state.p_pos, entity.state.p_vel]))
+        dim = len(entity.state.p_pos)
+        entity.state.obs_pos = snapped[:dim]
+        entity.state.obs_vel = snapped[dim:]
+
+    def snap_agents(self, world):
+        num_agents = len(world.agents)
+        if world.vectorized:
+            # The agents come first in world.entities, so they are the first rows of the state arrays
+            p_pos = world.p_pos[:num_agents]
+            p_vel = world.p_vel[:num_agents]
+        else:
+            p_pos = np.array([agent.state.p_pos for agent in world.agents], dtype=np.float64)
+            p_vel = np.array([agent.state.p_vel for agent in world.agents], dtype=np.float64)
+        snapped = self.snap(np.concatenate([p_pos, p_vel]))
+        for i, agent in enumerate(world.agents):
+            agent.state.obs_pos = snapped[i]
+            agent.state.obs_vel = snapped[num_agents + i]
+
+    def snap_landmarks(self, world):
+        for landmark in world.landmarks:
+            key = tuple(landmark.state.p_pos) + tuple(landmark.state.p_vel)
+            if key not in self._landmarks:
+                self.snap_entity(landmark)
+                self._landmarks[key] = (landmark.state.obs_pos, landmark.state.obs_vel)
+            landmark.state.obs_pos, landmark.state.obs_vel = self._landmarks[key]
 
 
 class Scenario(BaseScenario):
@@ -115,6 +164,7 @@ class Scenario(BaseScenario):
         num_landmarks = N
         world.collaborative = True
         # add agents
+        world.quantizer = GridQuantizer(observation_grid(N))
         world.agents = [Agent() for i in range(num_agents)]
         for i, agent in enumerate(world.agents):
             agent.name = f"agent_{i}"
@@ -127,6 +177,11 @@ class Scenario(BaseScenario):
             landmark.name = "landmark %d" % i
             landmark.collide = False
             landmark.movable = False
+        # Each agent is rewarded by its distance to the first landmark whose name ends in the same character
+        world.reward_landmarks = [
+            next(j for j, lm in enumerate(world.landmarks) if lm.name[-1] == agent.name[-1])
+            for agent in world.agents
+        ]
         return world
 
     def reset_world(self, world, np_random, test=False):
@@ -165,7 +220,8 @@ class Scenario(BaseScenario):
             landmark.state.obs_pos = np.zeros(world.dim_p)
             landmark.state.obs_vel = np.zeros(world.dim_p)
 
-            self.convert_values(landmark, world)
+        # Landmarks never move, so they are only snapped here
+        world.quantizer.snap_landmarks(world)
 
     # def twelve_agent(self, i, agent, test):
     #     if i == 0:
@@ -583,12 +639,16 @@ class Scenario(BaseScenario):
             # print(lm.state.p_pos)
 
             if lm.name[-1] == agent.name[-1]:
-                self.convert_values(agent, world)
-                self.convert_values(lm, world)
                 # print(lm.state.p_pos)
                 return -np.sqrt(np.sum(np.square(agent.state.obs_pos - lm.state.obs_pos)))
 
 
+    def rewards(self, world):
+        # The same as reward for every agent at once
+        agent_pos = np.array([agent.state.obs_pos for agent in world.agents])
+        landmark_pos = np.array([world.landmarks[j].state.obs_pos for j in world.reward_landmarks])
+        return -np.sqrt(np.sum(np.square(agent_pos - landmark_pos), axis=1))
+
     def observation(self, agent, world):
         # # get positions of all entities in this agent's reference frame
         # entity_pos = []
@@ -607,7 +667,7 @@ class Scenario(BaseScenario):
         #     comm.append(other.state.c)
         #     other_pos.append(other.state.p_pos - agent.state.p_pos)
 
-        self.convert_values(agent,world)
+        # obs_pos and obs_vel were snapped in reset_world or post_step
         # print(np.concatenate(
         #     [agent.state.p_vel] + [agent.state.p_pos]
         # ))
@@ -615,90 +675,16 @@ class Scenario(BaseScenario):
             [agent.state.obs_vel] + [agent.state.obs_pos]
         )
 
-    def convert_values(self, entity, world):
-        # print("HELLO")
-        # correct_values = np.array([-2, -1.56, -1.11, -0.67, -0.22, 
-        #                 0.22, 0.67, 1.11, 1.56, 2])
-
-        # These are the 10 values which we can match to.
-
-        if len(world.agents) == 4:
-            self.convert_values_four(entity)
-        else:
-            self.convert_values_twelve(entity)
-        
-
-    
-    def convert_values_four(self, entity):
-        correct_values = np.array([-2, -1.6, -1.2, -0.8, -0.4, 
-                         0.0, 0.4, 0.8, 1.2, 1.6])
-        
-        # This converts the position value
-        for i, value in enumerate(entity.state.p_pos):
-            smallest_distance = abs(correct_values-value) #Something like this
-            index_of_smallest = np.where(smallest_distance == min(smallest_distance))
-            # print(type(index_of_smallest))
-            # print(value, correct_values)
-            # print(index_of_smallest)
-            # print(index_of_smallest[0])
-            if len(index_of_smallest[0]) > 1:
-                index_of_smallest = index_of_smallest[0][0]
-            # print(index_of_smallest)
-            entity.state.obs_pos[i] = correct_values[index_of_smallest]
-
-        # This converts the velocity value
-        for i, value in enumerate(entity.state.p_vel):
-            smallest_distance = abs(correct_values-value)#Something like this
-            index_of_smallest_p_vel = np.where(smallest_distance == min(smallest_distance))
-            # print(type(index_of_smallest_p_vel))
-            # print(value, correct_values)
-            # print(index_of_smallest_p_vel)
-            # print(index_of_smallest_p_vel[0])
-            if len(index_of_smallest_p_vel[0]) > 1:
-                index_of_smallest_p_vel = index_of_smallest_p_vel[0][0]
-            
+    def observations(self, world):
+        # The same as observation for every agent at once, one row each
+        obs_vel = np.array([agent.state.obs_vel for agent in world.agents])
+        obs_pos = np.array([agent.state.obs_pos for agent in world.agents])
+        return np.concatenate([obs_vel, obs_pos], axis=1)
 
-            entity.state.obs_vel[i] = correct_values[index_of_smallest_p_vel]
-            # print(entity.state.obs_vel[i])
-
-    def convert_values_twelve(self, entity):
-        correct_values = np.array([-8, -7.6, -7.2, -6.8, -6.4, 
-                                   -6, -5.6, -5.2, -4.8, -4.4, 
-                                   -4, -3.6, -3.2, -2.8, -2.4, 
-                                   -2, -1.6, -1.2, -0.8, -0.4,  
-                                    0.0, 0.4, 0.8, 1.2, 1.6,
-                                    2.0, 2.4, 2.8, 3.2, 3.6,
-                                    4.0, 4.4, 4.8, 5.2, 5.6,
-                                    6.0, 6.4, 6.8, 7.2, 7.6,])
-        
-        
-        # #10^4 state space. 
-        # correct_values = np.array([-2, -1.6, -1.2, -0.8, -0.4, 
-        #             0.0, 0.4, 0.8, 1.2, 1.6])
-        
+    def convert_values(self, entity, world):
+        # Snaps the position and velocity of one entity onto the grid
+        world.quantizer.snap_entity(entity)
 
-        # This converts the position value
-        for i, value in enumerate(entity.state.p_pos):
-            smallest_distance = abs(correct_values-value) #Something like this
-            index_of_smallest = np.where(smallest_distance == min(smallest_distance))
-            # print(type(index_of_smallest))
-            # print(value, correct_values)
-            # print(index_of_smallest)
-            # print(index_of_smallest[0])
-            if len(index_of_smallest[0]) > 1:
-                index_of_smallest = index_of_smallest[0][0]
-            # print(index_of_smallest)
-            entity.state.obs_pos[i] = correct_values[index_of_smallest]
-
-        # This converts the velocity value
-        for i, value in enumerate(entity.state.p_vel):
-            smallest_distance = abs(correct_values-value)#Something like this
-            index_of_smallest_p_vel = np.where(smallest_distance == min(smallest_distance))
-            # print(type(index_of_smallest_p_vel))
-            # print(value, correct_values)
-            # print(index_of_smallest_p_vel)
-            # print(index_of_smallest_p_vel[0])
-            if len(index_of_smallest_p_vel[0]) > 1:
-                index_of_smallest_p_vel = index_of_smallest_p_vel[0][0]
-            entity.state.obs_vel[i] = correct_values[index_of_smallest_p_vel]
-            # print(entity.state.obs_vel[i])
\ No newline at end of file
+    def post_step(self, world):
+        # The agents have moved, so snap all of them at once.  The landmarks were snapped in reset_world
+        world.quantizer.snap_agents(world)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from .._mpe_utils.core import action_forces, entity_arrays, integrate_arrays
+from .simple_spread import Scenario
+
+
+class VectorSimpleSpread:
+    """Steps K copies of simple_spread in lock-step.
+
+    The positions and velocities of every agent in every copy are held as
+    (K, N, 2) arrays, so one step moves all the copies at once.  The start
+    layouts, physics, grid snapping and rewards are those of raw_env, and the
+    same actions give the same observations and rewards.
+
+    Every copy has the same length, so all of them finish on the same step.
+    Observations are (K, N, 4) float32 arrays of [vel_x, vel_y, pos_x, pos_y]
+    and rewards are (K, N) arrays, with agents in the order of possible_agents.
+    """
+
+    def __init__(self, num_envs, N=3, max_cycles=25):
+        self.num_envs = num_envs
+        self.max_cycles = max_cycles
+        self.scenario = Scenario()
+        self.world = self.scenario.make_world(N)
+        self.possible_agents = [agent.name for agent in self.world.agents]
+        self.agents = []
+        self.steps = 0
+
+        world = self.world
+        self._mass, self._max_speed = entity_arrays(world.agents)
+
+        # The (N, actions, dim_p) force of each agent's discrete actions, the same as SimpleEnv._set_action gives
+        self._action_forces = np.stack([action_forces(world.dim_p, agent.accel) for agent in world.agents])
+        self._agent_index = np.arange(N)
+        # The (N, 1) motor noise of each agent, added as World.apply_action_force adds it, or None when there is none
+        u_noise = [agent.u_noise or 0.0 for agent in world.agents]
+        self._u_noise = np.array(u_noise, dtype=np.float64).reshape(-1, 1) if any(u_noise) else None
+
+        self.p_pos = np.zeros((num_envs, N, world.dim_p))
+        self.p_vel = np.zeros((num_envs, N, world.dim_p))
+        self._landmark_pos = None
+
+    def _observations(self):
+        obs_pos = self.world.quantizer.snap(self.p_pos)
+        obs_vel = self.world.quantizer.snap(self.p_vel)
+        return obs_pos, np.concatenate([obs_vel, obs_pos], axis=2).astype(np.float32)
+
+    def reset(self, seed=None, options=None):
+        # The start layouts do not depend on the seed, so every copy starts in the same place.  The seed is only
+        # used by the motor noise
+        if seed is not None:
+            self.world.np_random = np.random.default_rng(seed)
+        self.scenario.reset_world(self.world, None, test=options)
+        self.p_pos[:] = [agent.state.p_pos for agent in self.world.agents]
+        self.p_vel[:] = [agent.state.p_vel for agent in self.world.agents]
+        # The landmark each agent is rewarded against, snapped.  Landmarks do not move
+        self._landmark_pos = np.array(
+            [self.world.landmarks[j].state.obs_pos for j in self.world.reward_landmarks]
+        )
+        self.agents = self.possible_agents[:]
+        self.steps = 0
+        return self._observations()[1]
+
+    def step(self, actions):
+        """Steps every copy.
+
+        actions - A (K, N) array of discrete actions
+
+        Returns the (K, N, 4) observations, the (K, N) rewards and whether the
+        episodes have been truncated.
+        """
+        world = self.world
+        force = self._action_forces[self._agent_index, np.asarray(actions)]
+        if self._u_noise is not None:
+            force = force + world.np_random.standard_normal(force.shape) * self._u_noise
+        integrate_arrays(self.p_pos, self.p_vel, force, self._mass, self._max_speed, world.damping, world.dt,
+                         world.bound)
+
+        obs_pos, observations = self._observations()
+        rewards = -np.sqrt(np.sum(np.square(obs_pos - self._landmark_pos), axis=2))
+
+        self.steps += 1
+        truncated = self.steps >= self.max_cycles
+        if truncated:
+            self.agents = []
+        return observations, rewards, truncated
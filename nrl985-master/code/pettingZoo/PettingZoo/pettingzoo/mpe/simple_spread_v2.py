@@ -1 +1,2 @@
 from .simple_spread.simple_spread import env, parallel_env, raw_env  # noqa: F401
+from .simple_spread.vector_simple_spread import VectorSimpleSpread  # noqa: F401
@@ -0,0 +1,306 @@
+"""Contains the on-disk format of trained agents.  Only what is needed to play the policy is kept: the Q, N and V tables,
+the states they are indexed by and the greedy actions, as arrays in a single uncompressed .npz archive.  The arrays are
+memory mapped when the archive is opened, so a policy loads without reading its tables and processes which open the
+same archive share one copy of it."""
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from agent import Agent
+from tables import ALL_ACTIONS_MASK, DenseTables, masked_action
+from utils import spawn_generators
+
+POLICY_FORMAT_VERSION = 1
+POLICY_SUFFIX = '.npz'
+METADATA_NAME = 'metadata'
+
+# The arrays kept for each agent, see DenseTables.to_arrays
+POLICY_ARRAYS = ('states', 'q', 'n', 'v', 'visited', 'greedy')
+
+# The fixed part of a zip local file header, followed by the file name and the extra field
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+class TrainedPolicy(Agent):
+
+    """An agent loaded from a policy archive.  It can play its greedy policy but not carry on training"""
+
+    def __init__(self, agent_name, tables, state_encoding, rng):
+
+        """
+        Creates the agent
+
+        agent_name - The agent name
+
+        tables - The tables of the trained agent
+
+        state_encoding - Which utils.encode_state version the tables are keyed by
+
+        rng - The numpy Generator which breaks ties between actions with the same Q value
+        """
+
+        super().__init__(agent_name)
+        self.H = tables.H
+        self.tables = tables
+        self.state_encoding = state_encoding
+        self.rng = rng
+
+    def policy(self, state, time_step, *args):
+
+        """
+        Returns the action with the largest Q value, ties broken at random
+
+        state - The current state we are in
+
+        time_step - The time step in the episode
+
+        *args - Spare arguments
+
+        Return
+        The action to be taken
+        """
+
+        return self.tables.greedy_action(time_step, state, self.rng)
+
+    def play_normal(self, state, time_step, *args, rng=None):
+
+        """
+        Plays the best action in the Q-table
+
+        state - The current state we are in
+
+        time_step - The time step in the episode
+
+        *args - Spare arguments
+
+        rng - The numpy Generator to break ties with instead of the agent's own
+
+        Return
+        The action to be taken
+        """
+
+        return self.tables.greedy_action(time_step, state, self.rng if rng is None else rng)
+
+
+class FrozenPolicy(Agent):
+
+    """
+    A read only greedy policy.  Holds a mask of the greedy actions for each timestep and state (see tables.greedy_masks),
+    so playing is an array lookup.  Ties are broken the same way as the tables break them, so a FrozenPolicy sharing
+    the Generator of the agent it was made from plays the same actions.
+    """
+
+    def __init__(self, agent_name, states, greedy, state_encoding, rng):
+
+        """
+        Creates the policy
+
+        agent_name - The agent name
+
+        states - The states of the rows of greedy
+
+        greedy - The (H, states) uint8 array of greedy masks.  Can be memory mapped
+
+        state_encoding - Which utils.encode_state version the states are encoded with
+
+        rng - The numpy Generator used for tie-breaking
+        """
+
+        super().__init__(agent_name)
+        self.H = greedy.shape[0]
+        # A plain ndarray view of a memory mapped array is still backed by the file but indexes faster
+        self.greedy = greedy.view(np.ndarray)
+        self.state_encoding = state_encoding
+        self._index = {state: row for row, state in enumerate(states.tolist())}
+        self.rng = rng
+
+    def policy(self, state, time_step, *args):
+
+        """
+        Returns a greedy action, ties broken at random
+
+        state - The current state we are in
+
+        time_step - The time step in the episode
+
+        *args - Spare arguments
+
+        Return
+        The action to be taken
+        """
+
+        row = self._index.get(state)
+        mask = ALL_ACTIONS_MASK if row is None else self.greedy[time_step-1, row]
+        return masked_action(mask, self.rng)
+
+    def play_normal(self, state, time_step, *args, rng=None):
+
+        """
+        Plays a greedy action
+
+        state - The current state we are in
+
+        time_step - The time step in the episode
+
+        *args - Spare arguments
+
+        rng - The numpy Generator to break ties with instead of the policy's own
+
+        Return
+        The action to be taken
+        """
+
+        row = self._index.get(state)
+        mask = ALL_ACTIONS_MASK if row is None else self.greedy[time_step-1, row]
+        return masked_action(mask, self.rng if rng is None else rng)
+
+
+def freeze(agent):
+
+    """
+    Makes the read only greedy policy of a trained agent
+
+    agent - An agent with tables, such as MARL_Comm or EB_MARL_Comm
+
+    Return
+    The FrozenPolicy.  It shares the Generator of the agent
+    """
+
+    arrays = agent.tables.to_arrays()
+    return FrozenPolicy(agent.agent_name(), arrays['states'], arrays['greedy'], agent.state_encoding, agent.rng)
+
+
+def can_archive(agents):
+
+    """Return whether every agent keeps its values in tables which can be written to a policy archive"""
+
+    return all(hasattr(agent, 'tables') for agent in agents.values())
+
+
+def save_policies(path, agents):
+
+    """
+    Writes the policies of trained agents
+
+    path - The path of the archive, ending in POLICY_SUFFIX
+
+    agents - The dictionary of agents, each with tables (see can_archive)
+    """
+
+    metadata = {'version': POLICY_FORMAT_VERSION, 'agents': []}
+    arrays = {}
+    for agent_name, agent in agents.items():
+        metadata['agents'].append({
+            'agent_name': agent_name,
+            'agent_type': type(agent).__name__,
+            'length_of_episode': agent.tables.H,
+            'state_encoding': agent.state_encoding,
+        })
+        for name, array in agent.tables.to_arrays().items():
+            arrays[f'{agent_name}.{name}'] = array
+    arrays[METADATA_NAME] = np.array(json.dumps(metadata))
+
+    # np.savez stores the arrays without compressing them, which is what lets them be memory mapped
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp_path, path)
+
+
+def _memory_map(f, path, info):
+
+    """
+    Memory maps one array of an uncompressed .npz archive
+
+    f - The archive opened for binary reading
+
+    path - The path of the archive
+
+    info - The ZipInfo of the array
+
+    Return
+    The array, read only
+    """
+
+    f.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+    f.seek(info.header_offset + _LOCAL_HEADER.size + header[-2] + header[-1])
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    if dtype.hasobject:
+        raise ValueError(f"{path} holds Python objects, which a policy archive never does")
+    if 0 in shape:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
+
+
+def _read_arrays(path, mmap):
+
+    """
+    Reads every array of a policy archive
+
+    path - The path of the archive
+
+    mmap - Whether to memory map the arrays instead of reading them
+
+    Return
+    A dict from the array name to the array
+    """
+
+    if not mmap:
+        with np.load(path) as archive:
+            return {name: archive[name] for name in archive.files}
+
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed so it cannot be memory mapped")
+            arrays[info.filename[:-len('.npy')]] = _memory_map(f, path, info)
+    return arrays
+
+
+def load_policies(path, mmap=True, frozen=False, seed=None):
+
+    """
+    Opens the policies of trained agents
+
+    path - The path of the archive
+
+    mmap - Whether to memory map the tables, so they are only read from disk as they are used
+
+    frozen - Whether to open only the greedy masks, for agents which will only be played
+
+    seed - The seed each agent's tie-breaking Generator is spawned from.  None seeds them randomly
+
+    Return
+    The dictionary of agents, as FrozenPolicy agents if frozen, otherwise TrainedPolicy agents
+    """
+
+    arrays = _read_arrays(path, mmap)
+    metadata = json.loads(str(arrays[METADATA_NAME]))
+    if metadata['version'] != POLICY_FORMAT_VERSION:
+        raise ValueError(f"{path} is policy format version {metadata['version']}, "
+                         f"expected version {POLICY_FORMAT_VERSION}")
+
+    rngs = spawn_generators(np.random.SeedSequence(seed), len(metadata['agents']))
+    agents = {}
+    for description, rng in zip(metadata['agents'], rngs):
+        agent_name = description['agent_name']
+        if frozen:
+            agents[agent_name] = FrozenPolicy(agent_name, arrays[f'{agent_name}.states'], arrays[f'{agent_name}.greedy'],
+                                              description['state_encoding'], rng)
+            continue
+        tables = DenseTables.from_arrays(
+            description['length_of_episode'],
+            {name: arrays[f'{agent_name}.{name}'] for name in POLICY_ARRAYS if name != 'greedy'},
+        )
+        agents[agent_name] = TrainedPolicy(agent_name, tables, description['state_encoding'], rng)
+    return agents
@@ -0,0 +1,317 @@
+"""Contains the reporting side of the experiment pipeline: merging the trials of an experiment, its statistics and the
+plots.  It is only imported once training is done, so the processes which run trials never load the plotting
+libraries."""
+import random
+
+import matplotlib.pyplot as plt
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from hyperparameters import evaluation_hyperparameters, train_hyperparameters
+from observer import Oracle
+
+EVALUATION_INTERVAL = evaluation_hyperparameters['evaluation_interval']
+NUM_OF_EPISODES = train_hyperparameters['num_of_episodes']
+
+
+def merge_trials(experiment, trial_results):
+
+    """
+    Combines the trials of an experiment and prints its statistics
+
+    experiment - The experiment dict
+
+    trial_results - The results of run_trial for each trial, in trial order
+
+    Return
+    The average evaluation rewards, min rewards, max rewards, 25th and 75th percentile rewards (of the last trial), the
+    episode numbers of the evaluations and the experiment
+    """
+
+    num_of_trials = len(trial_results)
+    reward_array_episode_num = np.arange(EVALUATION_INTERVAL, NUM_OF_EPISODES + 1, EVALUATION_INTERVAL)
+    reward_list_evaluation = sum(result['rewards'] for result in trial_results)
+    bes_scores = sum(result['bes_scores'] for result in trial_results)
+    min_rewards = np.minimum.reduce([result['min_rewards'] for result in trial_results])
+    max_rewards = np.maximum.reduce([result['max_rewards'] for result in trial_results])
+    percentile_25_rewards = trial_results[-1]['percentile_25_rewards']
+    percentile_75_rewards = trial_results[-1]['percentile_75_rewards']
+
+    oracle = Oracle()
+    for result in trial_results:
+        oracle.merge(result['oracle'])
+
+    # Take the average universal N table across the trials. 
+    oracle.average(num_of_trials)
+  
+  # Compute the metrics we want to compute from the Observer's universal N table.
+    stats = oracle.calculate_statistics()         
+    num_of_agents = experiment['num_agents']
+    if num_of_agents == 4 or num_of_agents == 8:
+        oracle.create_bubble_plot(num_of_agents) # Plots with more than 8 agents are cluttered. 
+    print("Statistics: ", stats)
+    last_mean_reward = reward_list_evaluation[-1] / num_of_agents
+    bes = oracle.calculate_bad_exp_score(last_mean_reward)
+    print("Final Bad Exploration Score:", bes)
+    cc, G = oracle.calculate_clustering_coefficient()
+    print("Clustering Coefficient:", cc)
+
+    # Average the rewards across all trials
+    reward_list_evaluation /= num_of_trials
+    
+    average_bes = np.mean(bes_scores)
+    print(f"Average BES: {average_bes}")
+    
+    
+    return reward_list_evaluation, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, reward_array_episode_num, experiment
+
+
+def plot_experiment_rewards(experiment_rewards):
+
+    """
+    Plots the evaluation rewards of the experiments on one figure
+
+    experiment_rewards - The results of merge_trials for each experiment.  None for experiments with nothing to plot
+    """
+
+    # Plot the results
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.set_xlabel('Episode Number')
+    ax.set_ylabel('Mean Reward')
+    ax.grid(True)
+
+    # Define line styles and colors for visual distinction between experiments
+    # line_styles = ['-', '-', '--', '-.', '-.'] # Experiment 1
+    # line_styles = ['-', '-', '--', '--'] # Experiment 2, 2.5, 3
+    # line_styles = ['-', '-', '--', '--', '-.'] # Experiment 3.5
+    line_styles = ['-', '-.'] # Experiment 2, 2.5, 3
+    
+    
+    colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown']
+    
+    
+    
+    # # Min max chart
+    # for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+    
+    # # for i, (average_rewards, min_rewards, max_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+    #     average_rewards = np.array(average_rewards)
+    #     min_rewards = np.array(min_rewards)
+    #     max_rewards = np.array(max_rewards)
+
+    #     rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+
+    #     line_style = line_styles[i % len(line_styles)]
+    #     color = colors[i % len(colors)]
+    #     label = experiment['experiment_name']  # Extract name from the experiment dict
+        
+
+    #     ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+    #     ax.fill_between(episode_nums, min_rewards, max_rewards, color=color, alpha=.2)
+
+
+
+    # ax.legend()
+    # plt.tight_layout()
+    # random_number = random.randint(0, 999999999)
+    # filename = f'saved_data/figs/thesis/test_time_rewards_MINMAX{random_number}.png'
+    # print(f"Figure saved as {filename}")
+    # plt.savefig(filename)
+    # plt.clf()
+
+    # fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
+    # ax.set_xlabel('Episode Number')
+    # ax.set_ylabel('Mean Reward')
+    # ax.grid(True)
+    
+    # for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+    #     average_rewards = np.array(average_rewards)
+    #     quad1_rewards = np.array(percentile_25_rewards)
+    #     quad2_rewards = np.array(percentile_75_rewards)
+
+    #     rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+
+    #     line_style = line_styles[i % len(line_styles)]
+    #     color = colors[i % len(colors)]
+    #     label = experiment['experiment_name']  # Extract name from the experiment dict
+        
+
+    #     ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+    #     ax.fill_between(episode_nums, quad1_rewards, quad2_rewards, color=color, alpha=.2)
+
+
+    # ax.legend()
+    # plt.tight_layout()
+    # random_number = random.randint(0, 999999999)
+    # filename = f'saved_data/figs/thesis/test_time_rewards_PERCENTILE{random_number}.png'
+    # print(f"Figure saved as {filename}")
+    # plt.savefig(filename)
+    # plt.clf()
+
+    # fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
+    # ax.set_xlabel('Episode Number')
+    # ax.set_ylabel('Mean Reward')
+    # ax.grid(True)
+
+
+    # Iterate over both experiment_rewards and experiments to get rewards and names
+    for i, experiment_reward in enumerate(experiment_rewards):
+        # Experiments with a failed trial have nothing to plot
+        if experiment_reward is None:
+            continue
+        average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment = experiment_reward
+        # Ensure rewards is a numpy array for consistency in plotting operations
+        rewards = np.array(average_rewards)
+
+        # Calculate the rolling average for a smooth line
+        rolling_avg_rewards = pd.Series(rewards).rolling(window=50, min_periods=1).mean()
+        rolling_std_dev = pd.Series(rewards).rolling(window=50, min_periods=1).std() #new
+
+        # Setup for plot aesthetics
+        line_style = line_styles[i % len(line_styles)]
+        color = colors[i % len(colors)]
+        label = experiment['experiment_name']  # Extract name from the experiment dict
+
+        # Plot the rolling average line
+        ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+        
+        ax.fill_between(episode_nums, rolling_avg_rewards - rolling_std_dev, rolling_avg_rewards + rolling_std_dev, color=color, alpha=.2) #new
+
+
+    ax.legend()
+    plt.tight_layout()
+    random_number = random.randint(0, 999999999)
+    filename = f'saved_data/figs/thesis/test_time_rewards_STDEV_{label}_{random_number}.png'
+    print(f"Figure saved as {filename}")
+    plt.savefig(filename)
+    plt.clf()
+    
+    
+ 
+
+#     # Plot the results
+#     fig, ax = plt.subplots(figsize=(10, 6))
+#     ax.set_xlabel('Episode Number')
+#     ax.set_ylabel('Mean Reward')
+#     ax.grid(True)
+
+#     # Define line styles and colors for visual distinction between experiments
+#     # line_styles = ['-', '-', '--', '-.', '-.'] # Experiment 1
+#     line_styles = ['-', '-', '--', '--'] # Experiment 2, 2.5, 3
+#     # line_styles = ['-', '-', '--', '--', '-.'] # Experiment 3.5
+    
+#     colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown']
+    
+    
+#     # Min max chart
+#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+    
+#     # for i, (average_rewards, min_rewards, max_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+#         average_rewards = np.array(average_rewards)
+#         min_rewards = np.array(min_rewards)
+#         max_rewards = np.array(max_rewards)
+
+#         rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+
+#         line_style = line_styles[i % len(line_styles)]
+#         color = colors[i % len(colors)]
+#         label = experiment['experiment_name']  # Extract name from the experiment dict
+        
+
+#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+#         ax.fill_between(episode_nums, min_rewards, max_rewards, color=color, alpha=.7)
+
+
+
+#     ax.legend()
+#     plt.tight_layout()
+#     random_number = random.randint(0, 999999999)
+#     filename = f'saved_data/figs/thesis/test_time_rewards_MINMAXDARK{random_number}.png'
+#     print(f"Figure saved as {filename}")
+#     plt.savefig(filename)
+#     plt.clf()
+
+#     fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
+#     ax.set_xlabel('Episode Number')
+#     ax.set_ylabel('Mean Reward')
+#     ax.grid(True)
+    
+#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+#         average_rewards = np.array(average_rewards)
+#         quad1_rewards = np.array(percentile_25_rewards)
+#         quad2_rewards = np.array(percentile_75_rewards)
+
+#         rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+
+#         line_style = line_styles[i % len(line_styles)]
+#         color = colors[i % len(colors)]
+#         label = experiment['experiment_name']  # Extract name from the experiment dict
+        
+
+#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+#         ax.fill_between(episode_nums, quad1_rewards, quad2_rewards, color=color, alpha=.7)
+
+
+#     ax.legend()
+#     plt.tight_layout()
+#     random_number = random.randint(0, 999999999)
+#     filename = f'saved_data/figs/thesis/test_time_rewards_PERCENTILEDARK{random_number}.png'
+#     print(f"Figure saved as {filename}")
+#     plt.savefig(filename)
+#     plt.clf()
+
+#     fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
+#     ax.set_xlabel('Episode Number')
+#     ax.set_ylabel('Mean Reward')
+#     ax.grid(True)
+
+
+#     # Iterate over both experiment_rewards and experiments to get rewards and names
+#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
+#         # Ensure rewards is a numpy array for consistency in plotting operations
+#         rewards = np.array(average_rewards)
+
+#         # Calculate the rolling average for a smooth line
+#         rolling_avg_rewards = pd.Series(rewards).rolling(window=50, min_periods=1).mean()
+#         rolling_std_dev = pd.Series(rewards).rolling(window=50, min_periods=1).std() #new
+
+#         # Setup for plot aesthetics
+#         line_style = line_styles[i % len(line_styles)]
+#         color = colors[i % len(colors)]
+#         label = experiment['experiment_name']  # Extract name from the experiment dict
+
+#         # Plot the rolling average line
+#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
+        
+#         ax.fill_between(episode_nums, rolling_avg_rewards - rolling_std_dev, rolling_avg_rewards + rolling_std_dev, color=color, alpha=.7) #new
+
+
+#     ax.legend()
+#     plt.tight_layout()
+#     random_number = random.randint(0, 999999999)
+#     filename = f'saved_data/figs/thesis/test_time_rewards_STDEVDARK{random_number}.png'
+#     print(f"Figure saved as {filename}")
+#     plt.savefig(filename)
+#     plt.clf()
+
+
+def plot_graph(adj, num_of_agents, fig_name):
+    G = nx.Graph()
+    for i in range(num_of_agents):
+        for j in range(num_of_agents):
+            if adj[i][j] == 1:
+                G.add_edge(i, j)
+
+    #Ensure graph is displayed with nodes in numerical order and in a circle
+    pos = {}
+    for i in range(num_of_agents):
+        pos[i] = [np.cos(2*np.pi*i/num_of_agents), np.sin(2*np.pi*i/num_of_agents)]
+    nx.draw(G, pos, with_labels=True, node_color='lightblue', edge_color='gray')
+    
+    random_number = random.randint(0, 999999999)
+    filename = f'saved_data/watts_strogatz_figs/{fig_name}_{random_number}.png'
+    print(f"Figure saved as {filename}")
+    
+    plt.savefig(filename)
+    plt.clf()  # Clear the current figure after saving it
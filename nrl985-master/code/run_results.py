@@ -0,0 +1,220 @@
+"""Contains the run directory which the experiment pipeline writes the results of each trial into"""
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from observer import Oracle
+
+RUNS_DIR_NAME = 'saved_data/runs'
+MANIFEST_NAME = 'manifest.json'
+# Version 2 gave the environment, each agent and the evaluation their own Generators, which changes the results
+RUN_FORMAT_VERSION = 2
+
+# The arrays run_trial returns for each evaluation
+TRIAL_ARRAYS = ('rewards', 'min_rewards', 'max_rewards', 'percentile_25_rewards', 'percentile_75_rewards', 'bes_scores')
+
+
+def new_run_dir():
+
+    """
+    Returns the path of a new run directory named after the time it was made
+
+    Return
+    The path.  The directory is made by create_run
+    """
+
+    return os.path.join(RUNS_DIR_NAME, time.strftime('run_%Y%m%d-%H%M%S'))
+
+
+def _describe_experiment(experiment):
+
+    """Return the parts of an experiment dict which can be written to JSON"""
+
+    return {
+        'experiment_name': experiment['experiment_name'],
+        'agent_type': str(experiment['agent_type']),
+        'num_agents': experiment['num_agents'],
+        'gamma_hop': experiment['gamma_hop'],
+        'connection_slow': experiment['connection_slow'],
+        'graph': np.asarray(experiment['graph']).tolist(),
+    }
+
+
+def create_run(run_dir, experiments, settings, seed):
+
+    """
+    Starts a run, or picks up one which was started before with the same experiments and settings
+
+    run_dir - The run directory
+
+    experiments - The list of experiment dicts
+
+    settings - A dict of the hyperparameters the results depend on, such as the number of trials and episodes
+
+    seed - The seed the trial seeds are spawned from, or None for a new one.  Ignored when the run already exists
+
+    Return
+    The seed of the run
+    """
+
+    manifest_path = os.path.join(run_dir, MANIFEST_NAME)
+    description = [_describe_experiment(experiment) for experiment in experiments]
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['version'] != RUN_FORMAT_VERSION:
+            raise ValueError(f"{run_dir} was started with run format version {manifest['version']}, so it cannot be "
+                             f"resumed with version {RUN_FORMAT_VERSION}")
+        if manifest['experiments'] != description or manifest['settings'] != settings:
+            raise ValueError(f"{run_dir} was started with different experiments or settings, so it cannot be resumed")
+        return manifest['seed']
+
+    os.makedirs(run_dir, exist_ok=True)
+    manifest = {
+        'version': RUN_FORMAT_VERSION,
+        'seed': np.random.SeedSequence(seed).entropy,
+        'settings': settings,
+        'experiments': description,
+    }
+    _write_atomically(manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+    return manifest['seed']
+
+
+def read_manifest(run_dir):
+
+    """Return the manifest of a run"""
+
+    with open(os.path.join(run_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def latest_run_dir():
+
+    """
+    Returns the run directory which was started last
+
+    Return
+    The path, or None if there are no runs
+    """
+
+    if not os.path.isdir(RUNS_DIR_NAME):
+        return None
+    run_dirs = [os.path.join(RUNS_DIR_NAME, name) for name in os.listdir(RUNS_DIR_NAME)
+                if os.path.exists(os.path.join(RUNS_DIR_NAME, name, MANIFEST_NAME))]
+    return max(run_dirs, key=os.path.getmtime, default=None)
+
+
+def find_experiments(run_dir, experiment_groups):
+
+    """
+    Finds which group of experiments a run was started with
+
+    run_dir - The run directory
+
+    experiment_groups - The lists of experiment dicts to look through, with their graphs built (see
+    hyperparameters.build_experiments)
+
+    Return
+    The list of experiment dicts, or None if none of them match
+    """
+
+    description = read_manifest(run_dir)['experiments']
+    for experiments in experiment_groups:
+        if [_describe_experiment(experiment) for experiment in experiments] == description:
+            return experiments
+    return None
+
+
+def trial_path(run_dir, experiment_index, trials_num):
+
+    """Return the path of the result file of a trial"""
+
+    return os.path.join(run_dir, f'experiment_{experiment_index}_trial_{trials_num}.npz')
+
+
+def trial_checkpoint_path(run_dir, experiment_index, trials_num):
+
+    """Return the path of the checkpoint of a trial which is still running"""
+
+    return os.path.join(run_dir, f'experiment_{experiment_index}_trial_{trials_num}.ckpt')
+
+
+def _write_atomically(path, write):
+
+    """
+    Writes a file so it is either all there or not there at all, even if the process dies part way through
+
+    path - The path of the file
+
+    write - A function which writes the contents to a binary file object
+    """
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+def save_trial(path, result):
+
+    """
+    Writes the result of a trial
+
+    path - The path of the result file, from trial_path
+
+    result - The dict returned by run_trial
+    """
+
+    arrays = {name: result[name] for name in TRIAL_ARRAYS}
+    arrays.update(result['oracle'].to_arrays())
+    _write_atomically(path, lambda f: np.savez_compressed(f, **arrays))
+
+
+def load_trial(path):
+
+    """
+    Reads the result of a trial
+
+    path - The path of the result file
+
+    Return
+    The result in the same form as run_trial returns it
+    """
+
+    with np.load(path) as arrays:
+        result = {name: arrays[name] for name in TRIAL_ARRAYS}
+        result['oracle'] = Oracle.from_arrays(arrays)
+    return result
+
+
+def save_checkpoint(path, checkpoint):
+
+    """
+    Writes the checkpoint of a trial, replacing the last one
+
+    path - The path of the checkpoint, from trial_checkpoint_path
+
+    checkpoint - A dict of everything the trial needs to carry on, see run_trial
+    """
+
+    _write_atomically(path, lambda f: pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load_checkpoint(path):
+
+    """
+    Reads the checkpoint of a trial
+
+    path - The path of the checkpoint
+
+    Return
+    The checkpoint dict, or None if there is no checkpoint
+    """
+
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
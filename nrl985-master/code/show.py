@@ -1,10 +1,10 @@
-from file_management import load
 from env import create_env
-from utils import encode_state
+from utils import encode_state, STATE_ENCODING_MD5
 from reward_functions import final_reward
 from hyperparameters import switch_hyperparameters
 
 from time import sleep
+import numpy as np
 
 def _find_all(string, char):
 
@@ -44,6 +44,9 @@ def play_on_show(filename):
     # local_ratio = float(filename[indexes[3]+1:indexes[4]])
     
 
+    # Only playback needs the saved agents, so the evaluation path does not import file_management and matplotlib
+    from file_management import load
+
     agents = load(filename)
     env = create_env(num_of_agents, num_of_cycles, local_ratio, multiple=True, render_mode='human')
     print(episode_play_normal_marl(env, agents, num_of_cycles, num_of_agents))
@@ -91,7 +94,42 @@ def episode_play_normal_marl(env, agents, max_cycles, num_of_agents, render=True
     return final_reward(rewards)
     
 
-def _policy(agent_name, agents, observations, done, num_of_cycles_done, num_of_cycles_max, render=True):
+def episodes_play_normal_marl(vector_env, agents, max_cycles, rngs=None):
+
+    """
+    This plays one episode in each copy of a vector environment at once, like episode_play_normal_marl without rendering
+
+    vector_env - The VectorSimpleSpread to be used
+
+    agents - A dictionary of agents to be used
+
+    max_cycles - The length of an episode
+
+    rngs - A dictionary from the agent name to the numpy Generator it breaks ties with while playing, or None for the
+    agents' own Generators
+
+    Return
+    A list of the rewards for each episode
+    """
+
+    agent_names = vector_env.possible_agents
+    # This will make sure the agents are set in either the switch position or not
+    observations = vector_env.reset(options=switch_hyperparameters['switch'])
+    actions = np.zeros((vector_env.num_envs, len(agent_names)), dtype=int)
+    t = 0
+    while vector_env.agents:
+        t = t+1
+        for i, agent_name in enumerate(agent_names):
+            for k in range(vector_env.num_envs):
+                actions[k, i] = _policy(agent_name, agents, observations[k, i], False, t, max_cycles, render=False,
+                                        rng=None if rngs is None else rngs[agent_name])
+        observations, rewards, truncated = vector_env.step(actions)
+
+    return [final_reward({agent_name: float(reward) for agent_name, reward in zip(agent_names, episode_rewards)})
+            for episode_rewards in rewards]
+
+
+def _policy(agent_name, agents, observations, done, num_of_cycles_done, num_of_cycles_max, render=True, rng=None):
 
     """
     This will find and play the correct action for the agent
@@ -110,6 +148,8 @@ def _policy(agent_name, agents, observations, done, num_of_cycles_done, num_of_c
 
     render - Whether rendering onto the screen
 
+    rng - The numpy Generator the agent breaks ties with, or None for its own
+
     Return 
     The action to be taken
     """
@@ -119,4 +159,9 @@ def _policy(agent_name, agents, observations, done, num_of_cycles_done, num_of_c
     if done:
         return None
     agent = agents[agent_name]
-    return agent.play_normal(encode_state(observations, len(agents.keys())), num_of_cycles_done, render)
+    # Agents pickled before the integer encoding have no state_encoding and are keyed by md5 digests
+    state_encoding = getattr(agent, 'state_encoding', STATE_ENCODING_MD5)
+    state = encode_state(observations, len(agents.keys()), state_encoding)
+    if rng is None:
+        return agent.play_normal(state, num_of_cycles_done, render)
+    return agent.play_normal(state, num_of_cycles_done, render, rng=rng)
@@ -0,0 +1,118 @@
+"""Contains the store of real state vectors shared by the PB agents"""
+import numpy as np
+
+
+class StateVectorStore:
+
+    """
+    Maps each encoded state to the real state (observation) it came from.  Every row of one float32 matrix holds a
+    state, so the exploration bonus can take distances to many states at once.  One store is shared by all the agents of
+    a run, since an encoded state always has the same real state.
+
+    Can be used like the old real_state_map dictionaries (get, [] and in).
+    """
+
+    def __init__(self, initial_capacity=64):
+
+        """
+        Creates the store
+
+        initial_capacity - The number of states to allocate room for before the matrix has to grow
+        """
+
+        self._rows = {}
+        self._vectors = np.zeros((initial_capacity, 0), dtype=np.float32)
+
+        # Goes up whenever a stored vector changes, either a state already in the store being given a different
+        # vector or the matrix being resized, so anything computed from the old vectors knows it is out of date
+        self.version = 0
+
+    def __len__(self):
+
+        """Return the number of states in the store"""
+
+        return len(self._rows)
+
+    def __contains__(self, state):
+
+        """Return True if the real state of the state has been stored"""
+
+        return state in self._rows
+
+    def __getitem__(self, state):
+
+        """Return the real state of a state"""
+
+        return self._vectors[self._rows[state]]
+
+    def get(self, state, default=None):
+
+        """
+        Returns the real state of a state
+
+        state - The encoded state
+
+        default - Returned if the state is not in the store
+
+        Return
+        The real state as a float32 array, or default
+        """
+
+        row = self._rows.get(state)
+        if row is None:
+            return default
+        return self._vectors[row]
+
+    @property
+    def vectors(self):
+
+        """The matrix of real states, one row per state.  May be replaced when the store grows"""
+
+        return self._vectors
+
+    def row(self, state):
+
+        """
+        Returns the row of a state, adding it if it has not been seen before.  Unknown states sit at the origin
+
+        state - The encoded state
+
+        Return
+        The row in the vector matrix
+        """
+
+        row = self._rows.get(state)
+        if row is None:
+            row = len(self._rows)
+            if row == self._vectors.shape[0]:
+                grown = np.zeros((2 * row, self._vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self._vectors
+                self._vectors = grown
+            self._rows[state] = row
+        return row
+
+    def set(self, state, real_state):
+
+        """
+        Stores the real state of a state
+
+        state - The encoded state
+
+        real_state - The observation the state was encoded from
+        """
+
+        real_state = np.asarray(real_state, dtype=np.float32).ravel()
+        new_state = state not in self._rows
+        row = self.row(state)
+        # The dimension of the observation is only known once the first one is seen
+        if self._vectors.shape[1] != real_state.shape[0]:
+            resized = np.zeros((self._vectors.shape[0], real_state.shape[0]), dtype=np.float32)
+            width = min(self._vectors.shape[1], real_state.shape[0])
+            resized[:, :width] = self._vectors[:, :width]
+            self._vectors = resized
+            self.version += 1
+        elif not new_state:
+            if np.array_equal(self._vectors[row], real_state):
+                return
+            self.version += 1
+        self._vectors[row] = real_state
@@ -0,0 +1,491 @@
+"""Contains the Q, N and V table backends used by the MARL agents"""
+from collections import defaultdict
+from functools import partial
+
+import numpy as np
+
+# The number of actions in simple spread
+NUM_OF_ACTIONS = 5
+
+# A greedy mask has bit a set when action a has the largest Q value.  States which have not been written have every
+# action tied on H.
+ALL_ACTIONS_MASK = (1 << NUM_OF_ACTIONS) - 1
+
+# The actions of every greedy mask, in increasing order as _break_tie expects
+MASK_ACTIONS = tuple(tuple(a for a in range(NUM_OF_ACTIONS) if mask >> a & 1) for mask in range(ALL_ACTIONS_MASK+1))
+
+def _constant(value):
+
+    """Returns value.  Used with partial as a picklable default factory"""
+
+    return value
+
+
+def _break_tie(candidates, rng):
+
+    """
+    Picks one of the best actions uniformly at random
+
+    candidates - The actions which share the largest value
+
+    rng - The numpy Generator used for tie-breaking
+
+    Return
+    The action
+    """
+
+    if len(candidates) == 1:
+        return int(candidates[0])
+    return int(candidates[rng.integers(len(candidates))])
+
+
+def _states_array(index):
+
+    """
+    Returns the states of an index as an array in row order.  States are integers, or md5 digests for agents trained
+    before the integer encoding
+
+    index - A dict from state to row
+
+    Return
+    The array
+    """
+
+    if not index:
+        return np.zeros(0, dtype=np.int64)
+    return np.asarray(list(index))
+
+
+def greedy_masks(q, visited):
+
+    """
+    Works out which actions are greedy for every timestep and state
+
+    q - The (H, states, actions) Q values
+
+    visited - The (H, states) bitmap of which rows hold values.  Extra timesteps, as the V table has, are ignored
+
+    Return
+    An (H, states) uint8 array of greedy masks
+    """
+
+    visited = visited[:q.shape[0]]
+    # There are only a few actions, so going over them one at a time is quicker than reducing along the last axis
+    best = q[..., 0].copy()
+    for action in range(1, q.shape[2]):
+        np.maximum(best, q[..., action], out=best)
+    masks = np.zeros(best.shape, dtype=np.uint8)
+    for action in range(q.shape[2]):
+        masks |= (q[..., action] == best).view(np.uint8) << action
+    masks[~visited] = ALL_ACTIONS_MASK
+    return masks
+
+
+def _empty_arrays(length_of_episode, index):
+
+    """Return the arrays of DenseTables.to_arrays for the states of index with nothing visited"""
+
+    size = len(index)
+    return {
+        'states': _states_array(index),
+        'q': np.zeros((length_of_episode, size, NUM_OF_ACTIONS), dtype=np.float32),
+        'n': np.zeros((length_of_episode, size, NUM_OF_ACTIONS), dtype=np.int32),
+        'v': np.zeros((length_of_episode+1, size), dtype=np.float32),
+        'visited': np.zeros((length_of_episode+1, size), dtype=bool),
+        'greedy': np.full((length_of_episode, size), ALL_ACTIONS_MASK, dtype=np.uint8),
+    }
+
+
+def masked_action(mask, rng):
+
+    """
+    Picks one of the actions of a greedy mask, ties broken the same way as greedy_action
+
+    mask - The greedy mask, see greedy_masks
+
+    rng - The numpy Generator used for tie-breaking
+
+    Return
+    The action
+    """
+
+    return _break_tie(MASK_ACTIONS[mask], rng)
+
+
+class DictTables:
+
+    """
+    The original nested dictionary tables: timestep -> state -> action.  Every lookup of a new state or action adds an
+    entry holding the default value.
+    """
+
+    def __init__(self, length_of_episode):
+
+        """
+        Creates the tables
+
+        length_of_episode - The length of an episode (H).  Unseen Q and V values default to H
+        """
+
+        self.H = length_of_episode
+        default_h = partial(_constant, length_of_episode)
+
+        # The set of H number of Q-Tables.
+        self.qTables = {i+1: defaultdict(partial(defaultdict, default_h)) for i in range(length_of_episode)}
+
+        # This will contain the number of times each state action has been seen for each timestep
+        self.nTables = {i+1: defaultdict(partial(defaultdict, int)) for i in range(length_of_episode)}
+
+        # The v-table values.  Set to H as this corresponds to the q tables currently.
+        self.vTable = {j+1: defaultdict(default_h) for j in range(length_of_episode+1)}
+
+    def q_value(self, time_step, state, action):
+
+        """Return the Q value of a state action pair at a timestep"""
+
+        return self.qTables[time_step][state][action]
+
+    def set_q_value(self, time_step, state, action, value):
+
+        """Sets the Q value of a state action pair at a timestep"""
+
+        self.qTables[time_step][state][action] = value
+
+    def visit(self, time_step, state, action):
+
+        """
+        Adds one to the visit count of a state action pair
+
+        Return
+        The new count
+        """
+
+        count = self.nTables[time_step][state][action] + 1
+        self.nTables[time_step][state][action] = count
+        return count
+
+    def v_value(self, time_step, state):
+
+        """Return the V value of a state at a timestep"""
+
+        return self.vTable[time_step][state]
+
+    def set_v_value(self, time_step, state, value):
+
+        """Sets the V value of a state at a timestep"""
+
+        self.vTable[time_step][state] = value
+
+    def best_value(self, time_step, state):
+
+        """Return the largest Q value over the actions of a state"""
+
+        q_row = self.qTables[time_step][state]
+        return max(q_row[i] for i in range(NUM_OF_ACTIONS))
+
+    def greedy_action(self, time_step, state, rng):
+
+        """
+        Returns the action with the largest Q value, ties broken at random
+
+        time_step - The time step in the episode
+
+        state - The state the agent is in
+
+        rng - The numpy Generator used for tie-breaking
+
+        Return
+        The action
+        """
+
+        q_row = self.qTables[time_step][state]
+        values = [q_row[i] for i in range(NUM_OF_ACTIONS)]
+        max_value = max(values)
+        return _break_tie([i for i, value in enumerate(values) if value == max_value], rng)
+
+    def to_arrays(self):
+
+        """
+        Returns the tables in the form DenseTables keeps them, see DenseTables.to_arrays
+
+        Return
+        A dict of arrays
+        """
+
+        # Every state which has been looked up at some timestep, in the order they were first seen
+        index = {}
+        for tables in (self.qTables, self.nTables, self.vTable):
+            for table in tables.values():
+                for state in table:
+                    index.setdefault(state, len(index))
+
+        arrays = _empty_arrays(self.H, index)
+        for time_step in range(1, self.H+2):
+            seen = set(self.vTable[time_step])
+            if time_step <= self.H:
+                seen.update(self.qTables[time_step], self.nTables[time_step])
+            for state in seen:
+                row = index[state]
+                arrays['visited'][time_step-1, row] = True
+                arrays['v'][time_step-1, row] = self.vTable[time_step].get(state, self.H)
+                if time_step <= self.H:
+                    arrays['q'][time_step-1, row] = self.H
+                    q_row = self.qTables[time_step].get(state, {})
+                    for action, value in q_row.items():
+                        arrays['q'][time_step-1, row, action] = value
+                    # Worked out from the float64 values so ties are the same as greedy_action sees them
+                    values = [q_row.get(i, self.H) for i in range(NUM_OF_ACTIONS)]
+                    max_value = max(values)
+                    arrays['greedy'][time_step-1, row] = sum(1 << i for i, value in enumerate(values) if value == max_value)
+                    for action, count in self.nTables[time_step].get(state, {}).items():
+                        arrays['n'][time_step-1, row, action] = count
+        return arrays
+
+
+class DenseTables:
+
+    """
+    Keeps the tables as arrays of shape (H, states, actions).  States are given a row the first time they are written
+    and the arrays double in size when they fill up.  A row is only filled with the default values when it is first
+    written, which is tracked by a visited bitmap, so reading an unseen state returns H without allocating anything.
+    """
+
+    def __init__(self, length_of_episode, initial_capacity=256):
+
+        """
+        Creates the tables
+
+        length_of_episode - The length of an episode (H).  Unseen Q and V values default to H
+
+        initial_capacity - The number of states to allocate room for before the arrays have to grow
+        """
+
+        self.H = length_of_episode
+
+        # Maps a state to its row
+        self._index = {}
+
+        # Timestep t is stored at index t-1.  The V table has one more timestep than the Q tables.
+        self._q = np.empty((length_of_episode, initial_capacity, NUM_OF_ACTIONS), dtype=np.float32)
+        self._n = np.zeros((length_of_episode, initial_capacity, NUM_OF_ACTIONS), dtype=np.int32)
+        self._v = np.empty((length_of_episode+1, initial_capacity), dtype=np.float32)
+        self._visited = np.zeros((length_of_episode+1, initial_capacity), dtype=bool)
+
+        self._default_q = np.full(NUM_OF_ACTIONS, length_of_episode, dtype=np.float32)
+
+    def __len__(self):
+
+        """Return the number of states which have a row"""
+
+        return len(self._index)
+
+    def _grow(self):
+
+        """Doubles the number of rows in every table"""
+
+        capacity = self._visited.shape[1]
+
+        def grown(array, allocate):
+            new_array = allocate((array.shape[0], 2 * capacity) + array.shape[2:], dtype=array.dtype)
+            new_array[:, :capacity] = array
+            return new_array
+
+        self._q = grown(self._q, np.empty)
+        self._n = grown(self._n, np.zeros)
+        self._v = grown(self._v, np.empty)
+        self._visited = grown(self._visited, np.zeros)
+
+    def _row(self, time_step, state):
+
+        """
+        Returns the row of a state which is about to be written, filling it with the defaults if it is new
+
+        time_step - The time step being written
+
+        state - The state being written
+
+        Return
+        The row index
+        """
+
+        row = self._index.get(state)
+        if row is None:
+            row = len(self._index)
+            if row == self._visited.shape[1]:
+                self._grow()
+            self._index[state] = row
+        if not self._visited[time_step-1, row]:
+            self._visited[time_step-1, row] = True
+            self._v[time_step-1, row] = self.H
+            if time_step <= self.H:
+                self._q[time_step-1, row] = self.H
+        return row
+
+    def _q_row(self, time_step, state):
+
+        """Return the Q values of a state, or the defaults if it has not been written"""
+
+        row = self._index.get(state)
+        if row is None or not self._visited[time_step-1, row]:
+            return self._default_q
+        return self._q[time_step-1, row]
+
+    def q_value(self, time_step, state, action):
+
+        """Return the Q value of a state action pair at a timestep"""
+
+        return float(self._q_row(time_step, state)[action])
+
+    def set_q_value(self, time_step, state, action, value):
+
+        """Sets the Q value of a state action pair at a timestep"""
+
+        # The row is found first as it may grow the arrays
+        row = self._row(time_step, state)
+        self._q[time_step-1, row, action] = value
+
+    def visit(self, time_step, state, action):
+
+        """
+        Adds one to the visit count of a state action pair
+
+        Return
+        The new count
+        """
+
+        row = self._row(time_step, state)
+        self._n[time_step-1, row, action] += 1
+        return int(self._n[time_step-1, row, action])
+
+    def v_value(self, time_step, state):
+
+        """Return the V value of a state at a timestep"""
+
+        row = self._index.get(state)
+        if row is None or not self._visited[time_step-1, row]:
+            return float(self.H)
+        return float(self._v[time_step-1, row])
+
+    def set_v_value(self, time_step, state, value):
+
+        """Sets the V value of a state at a timestep"""
+
+        row = self._row(time_step, state)
+        self._v[time_step-1, row] = value
+
+    def best_value(self, time_step, state):
+
+        """Return the largest Q value over the actions of a state"""
+
+        return float(self._q_row(time_step, state).max())
+
+    def greedy_action(self, time_step, state, rng):
+
+        """
+        Returns the action with the largest Q value, ties broken at random
+
+        time_step - The time step in the episode
+
+        state - The state the agent is in
+
+        rng - The numpy Generator used for tie-breaking
+
+        Return
+        The action
+        """
+
+        q_row = self._q_row(time_step, state)
+        return _break_tie(np.flatnonzero(q_row == q_row.max()), rng)
+
+    def to_arrays(self):
+
+        """
+        Returns the tables as arrays with one row per state, in the order of the states array.  Rows which are not
+        visited at a timestep hold no value and are read as H.
+
+        Return
+        A dict of the states, q, n, v and visited arrays, and the greedy masks (see greedy_masks)
+        """
+
+        size = len(self._index)
+        return {
+            'states': _states_array(self._index),
+            'q': self._q[:, :size].copy(),
+            'n': self._n[:, :size].copy(),
+            'v': self._v[:, :size].copy(),
+            'visited': self._visited[:, :size].copy(),
+            'greedy': greedy_masks(self._q[:, :size], self._visited[:, :size]),
+        }
+
+    @classmethod
+    def from_arrays(cls, length_of_episode, arrays):
+
+        """
+        Makes tables around the arrays from to_arrays.  The arrays are used as they are, so memory mapped arrays are
+        only read from disk as states are looked up
+
+        length_of_episode - The length of an episode (H)
+
+        arrays - A dict of arrays as returned by to_arrays
+
+        Return
+        The tables
+        """
+
+        tables = cls.__new__(cls)
+        tables.H = length_of_episode
+        tables._index = {state: row for row, state in enumerate(arrays['states'].tolist())}
+        tables._q = arrays['q']
+        tables._n = arrays['n']
+        tables._v = arrays['v']
+        tables._visited = arrays['visited']
+        tables._default_q = np.full(NUM_OF_ACTIONS, length_of_episode, dtype=np.float32)
+        return tables
+
+
+TABLE_BACKENDS = {
+    'dict': DictTables,
+    'dense': DenseTables,
+}
+
+
+def create_tables(length_of_episode, backend):
+
+    """
+    Creates the tables for an agent
+
+    length_of_episode - The length of an episode
+
+    backend - The name of the backend, a key of TABLE_BACKENDS
+
+    Return
+    The tables
+    """
+
+    if backend not in TABLE_BACKENDS:
+        raise ValueError(f"Unknown table backend {backend!r}, expected one of {sorted(TABLE_BACKENDS)}")
+    return TABLE_BACKENDS[backend](length_of_episode)
+
+
+def upgrade_legacy_state(state):
+
+    """
+    Agents pickled before the table backends kept qTables, nTables and vTable as attributes.  Moves them into
+    DictTables and gives the agent a Generator so the agent can still play.
+
+    state - The __dict__ of the unpickled agent
+
+    Return
+    The upgraded __dict__
+    """
+
+    if 'qTables' in state:
+        tables = DictTables.__new__(DictTables)
+        tables.H = state['H']
+        tables.qTables = state.pop('qTables')
+        tables.nTables = state.pop('nTables')
+        tables.vTable = state.pop('vTable')
+        state['tables'] = tables
+    if 'rng' not in state:
+        state['rng'] = np.random.default_rng()
+    return state
@@ -0,0 +1,49 @@
+"""Checks that seeded trials repeat and that a trial resumed from a checkpoint ends as if it had never stopped"""
+import numpy as np
+import pytest
+
+pytest.importorskip('pettingzoo')
+
+import twelve_experiments as te
+from hyperparameters import experiments_choice, build_experiments
+
+RESULTS = ('rewards', 'min_rewards', 'max_rewards', 'percentile_25_rewards', 'percentile_75_rewards', 'bes_scores')
+
+
+class _Stop(Exception):
+    pass
+
+
+@pytest.fixture
+def short_trials(monkeypatch):
+    monkeypatch.setattr(te, 'NUM_OF_EPISODES', 8)
+    monkeypatch.setattr(te, 'EVALUATION_INTERVAL', 2)
+    monkeypatch.setattr(te, 'CHECKPOINT_INTERVAL', 4)
+
+
+def _same(a, b):
+    return all(np.array_equal(a[name], b[name]) for name in RESULTS) and \
+        a['oracle'].calculate_statistics() == b['oracle'].calculate_statistics()
+
+
+@pytest.mark.parametrize('index', [0, -1])
+def test_resume(tmp_path, monkeypatch, short_trials, index):
+    # The first and last experiments have different agent types
+    experiment = build_experiments(experiments_choice[0])[index]
+    result = te.run_trial(experiment, 0, np.random.SeedSequence(123))
+    assert _same(result, te.run_trial(experiment, 0, np.random.SeedSequence(123)))
+    assert not _same(result, te.run_trial(experiment, 0, np.random.SeedSequence(124)))
+
+    # Stop the trial straight after its first checkpoint, then run it again from there
+    checkpoint_path = str(tmp_path / 'trial.ckpt')
+    save_checkpoint = te.save_checkpoint
+
+    def save_and_stop(path, checkpoint):
+        save_checkpoint(path, checkpoint)
+        raise _Stop
+
+    monkeypatch.setattr(te, 'save_checkpoint', save_and_stop)
+    with pytest.raises(_Stop):
+        te.run_trial(experiment, 0, np.random.SeedSequence(123), checkpoint_path)
+    monkeypatch.setattr(te, 'save_checkpoint', save_checkpoint)
+    assert _same(result, te.run_trial(experiment, 0, np.random.SeedSequence(123), checkpoint_path))
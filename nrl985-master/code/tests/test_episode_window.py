@@ -0,0 +1,45 @@
+"""Checks the EpisodeWindow against the preallocated u and v set dictionaries it replaced"""
+from collections import defaultdict
+
+import numpy as np
+
+from episode_window import EpisodeWindow
+
+NUM_OF_TIME_STEPS = 5
+
+
+def _as_sets(timesteps):
+
+    """Return the transitions of an episode as plain dictionaries, leaving out empty entries"""
+
+    return {time_step: {state: {action: transitions for action, transitions in actions.items() if transitions}
+                        for state, actions in states.items()}
+            for time_step, states in timesteps.items()}
+
+
+def test_live_episodes_match_dictionaries():
+    rng = np.random.default_rng(0)
+    window = EpisodeWindow(2, NUM_OF_TIME_STEPS)
+    # As the agents built vSet, from before the first episode to past the last
+    baseline = {i: {j+1: defaultdict(lambda: defaultdict(lambda: set())) for j in range(NUM_OF_TIME_STEPS)}
+                for i in range(-NUM_OF_TIME_STEPS-1, 40)}
+    for episode_num in range(-1, 30):
+        # Messages land in the current and the previous episode, as receive_message does
+        for _ in range(20):
+            written = episode_num - int(rng.integers(2))
+            time_step = int(rng.integers(1, NUM_OF_TIME_STEPS + 1))
+            state, action = int(rng.integers(6)), int(rng.integers(5))
+            transition = (float(rng.integers(-3, 1)), int(rng.integers(6)))
+            window[written][time_step][state][action].add(transition)
+            baseline[written][time_step][state][action].add(transition)
+        for live in (episode_num - 1, episode_num):
+            assert _as_sets(window[live]) == _as_sets(baseline[live])
+
+
+def test_old_episodes_are_empty_and_drop_writes():
+    window = EpisodeWindow(1, NUM_OF_TIME_STEPS)
+    window[3][1][0][0].add((1.0, 2))
+    window[4][1][0][0].add((1.0, 2))
+    window[3][1][0][0].add((5.0, 6))
+    assert _as_sets(window[3]) == {i+1: {} for i in range(NUM_OF_TIME_STEPS)}
+    assert window[4][1][0][0] == {(1.0, 2)}
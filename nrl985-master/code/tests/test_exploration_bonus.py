@@ -0,0 +1,130 @@
+"""Checks the PEBBonusEngine against the per-pair loop EB_MARL_Comm.update_values used to run"""
+import math
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from exploration_bonus import PEBBonusEngine
+from state_store import StateVectorStore
+
+
+def _loop_bonus(n_table, real_state_map, state_hash, size_of_state):
+
+    """
+    The bonus sum as it was written in EB_MARL_Comm.update_values
+
+    n_table - nTables[time_step]
+
+    real_state_map - Map from state hash to real state
+
+    state_hash - The state the bonus is for
+
+    size_of_state - The length of the default state of an unknown hash
+
+    Return
+    The distance weighted visit count
+    """
+
+    default_value = [0 for i in range(size_of_state)]
+    b = 0
+    real_state = real_state_map.get(state_hash, default_value)
+    for other_state_hash in n_table.keys():
+        other_real_state = real_state_map.get(other_state_hash, default_value)
+        distance = math.sqrt(sum([(s - o)**2 for s, o in zip(real_state, other_real_state)]))
+        for other_action in n_table[other_state_hash].keys():
+            b += n_table[other_state_hash][other_action] * distance
+    return b
+
+
+def _visit(rng, num_of_states, length_of_episode, size_of_state, incremental=False):
+
+    """
+    Makes random visits and records them in both an engine and a set of nTables
+
+    Return
+    The engine, the nTables and the real state map
+    """
+
+    engine = PEBBonusEngine(length_of_episode, incremental=incremental, initial_capacity=4)
+    n_tables = {i+1: defaultdict(lambda: defaultdict(lambda: 0)) for i in range(length_of_episode)}
+    real_state_map = {}
+    for state_hash in range(num_of_states):
+        # Some states are visited without a real state ever being stored
+        if state_hash % 7 != 0:
+            real_state = rng.uniform(-2, 2, size_of_state).astype(np.float32)
+            real_state_map[state_hash] = real_state
+            engine.set_state_vector(state_hash, real_state)
+        for _ in range(rng.integers(1, 4)):
+            time_step = int(rng.integers(1, length_of_episode + 1))
+            action = int(rng.integers(5))
+            n_tables[time_step][state_hash][action] += 1
+            engine.record_visit(time_step, state_hash)
+    return engine, n_tables, real_state_map
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('num_of_states', [1, 10, 200])
+def test_matches_per_pair_loop(num_of_states, incremental):
+    rng = np.random.default_rng(num_of_states)
+    engine, n_tables, real_state_map = _visit(rng, num_of_states, 3, 6, incremental)
+    for time_step, n_table in n_tables.items():
+        for state_hash in range(num_of_states + 1):
+            expected = _loop_bonus(n_table, real_state_map, state_hash, 6)
+            assert engine.distance_weighted_visits(time_step, state_hash) == pytest.approx(expected, rel=1e-12)
+
+
+def test_no_visits_gives_zero():
+    engine = PEBBonusEngine(2)
+    engine.set_state_vector(0, np.ones(3, dtype=np.float32))
+    assert engine.distance_weighted_visits(1, 0) == 0.0
+
+
+def test_incremental_follows_a_stream_of_updates():
+    # One visit then its bonus, as update_values does, with the odd real state changing under the cache
+    rng = np.random.default_rng(0)
+    engine = PEBBonusEngine(1, incremental=True, initial_capacity=4)
+    n_table = defaultdict(lambda: defaultdict(lambda: 0))
+    real_state_map = {}
+    for step in range(500):
+        state_hash = int(rng.integers(40))
+        if state_hash not in real_state_map or step % 50 == 0:
+            real_state = rng.uniform(-2, 2, 4).astype(np.float32)
+            real_state_map[state_hash] = real_state
+            engine.set_state_vector(state_hash, real_state)
+        n_table[state_hash][int(rng.integers(5))] += 1
+        engine.record_visit(1, state_hash)
+        expected = _loop_bonus(n_table, real_state_map, state_hash, 4)
+        assert engine.distance_weighted_visits(1, state_hash) == pytest.approx(expected, rel=1e-9)
+
+
+def test_engines_share_a_store():
+    rng = np.random.default_rng(2)
+    store = StateVectorStore()
+    engines = [PEBBonusEngine(1, state_store=store, incremental=True) for _ in range(2)]
+    n_tables = [defaultdict(lambda: defaultdict(lambda: 0)) for _ in range(2)]
+    real_state_map = {}
+    for step in range(300):
+        state_hash = int(rng.integers(30))
+        real_state = rng.uniform(-2, 2, 4).astype(np.float32)
+        real_state_map[state_hash] = real_state
+        store.set(state_hash, real_state)
+        agent = step % 2
+        n_tables[agent][state_hash][0] += 1
+        engines[agent].record_visit(1, state_hash)
+        for engine, n_table in zip(engines, n_tables):
+            expected = _loop_bonus(n_table, real_state_map, state_hash, 4)
+            assert engine.distance_weighted_visits(1, state_hash) == pytest.approx(expected, rel=1e-9)
+
+
+def test_cache_follows_the_first_real_state():
+    # Visits before any real state is known are all at the origin, so the first real state moves them apart
+    store = StateVectorStore()
+    engine = PEBBonusEngine(1, state_store=store, incremental=True)
+    engine.record_visit(1, 0)
+    engine.record_visit(1, 1)
+    assert engine.distance_weighted_visits(1, 0) == 0.0
+    version = store.version
+    store.set(1, np.array([3.0, 4.0], dtype=np.float32))
+    assert store.version > version
+    assert engine.distance_weighted_visits(1, 0) == pytest.approx(5.0)
@@ -0,0 +1,73 @@
+"""Checks the MessageBus delivers messages at the steps the old next_add countdown did"""
+import numpy as np
+
+from message_bus import MessageBus
+
+H = 5
+AGENT_NAMES = [f'agent_{i}' for i in range(4)]
+
+
+class _CountdownAgent:
+
+    """Receives messages as MARL_Comm did: each update delivers the messages at distance 0 and counts the rest down"""
+
+    def __init__(self):
+        self.next_add = []
+
+    def receive_message(self, message, dis):
+        self.next_add.append((message, dis))
+
+    def update(self):
+        delivered = [message for message, dis in self.next_add if dis == 0]
+        self.next_add = [(message, dis - 1) for message, dis in self.next_add if dis != 0]
+        return delivered
+
+
+def test_delivery_matches_countdown():
+    rng = np.random.default_rng(0)
+    bus = MessageBus(AGENT_NAMES, H)
+    baseline = {agent_name: _CountdownAgent() for agent_name in AGENT_NAMES}
+    distances = {}
+
+    def set_route(sender, recipient, distance):
+        distances[sender, recipient] = distance
+        bus.set_route(sender, recipient, distance)
+
+    for sender in AGENT_NAMES:
+        for recipient in AGENT_NAMES:
+            if sender != recipient:
+                set_route(sender, recipient, int(rng.integers(0, 4)))
+
+    for episode_num in range(6):
+        for time_step in range(1, H + 1):
+            # The graph changes now and then, as the dynamic graph does
+            if rng.random() < 0.2:
+                sender, recipient = rng.choice(AGENT_NAMES, 2, replace=False)
+                set_route(sender, recipient, int(rng.integers(0, 4)))
+
+            # Every agent sends, then every agent updates
+            for sender in AGENT_NAMES:
+                message = (time_step, episode_num, sender)
+                bus.send(sender, episode_num, time_step, message)
+                for recipient in AGENT_NAMES:
+                    if distances.get((sender, recipient), 0) != 0:
+                        baseline[recipient].receive_message(message, distances[sender, recipient])
+            for recipient in AGENT_NAMES:
+                delivered = bus.collect(recipient, episode_num, time_step)
+                assert sorted(delivered) == sorted(baseline[recipient].update())
+
+    assert bus.in_flight == sum(len(agent.next_add) for agent in baseline.values())
+    assert bus.delivered + bus.in_flight == bus.sent
+
+
+def test_arrives_in_send_order():
+    bus = MessageBus(['a', 'b'], H)
+    bus.set_route('a', 'b', 2)
+    bus.send('a', 0, 1, 'first')
+    bus.set_route('a', 'b', 1)
+    bus.send('a', 0, 2, 'second')
+    assert bus.collect('b', 0, 2) == []
+    assert bus.collect('b', 0, 3) == ['first', 'second']
+    # Across the episode boundary
+    bus.send('a', 0, H, 'third')
+    assert bus.collect('b', 1, 1) == ['third']
@@ -0,0 +1,82 @@
+"""Checks the Oracle's running statistics against the statistics module walking the whole universal n-table"""
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from observer import Oracle
+
+
+def _baseline_statistics(oracle):
+
+    """The statistics as calculate_statistics worked them out before the running aggregates"""
+
+    visit_counts = [count for actions in oracle.universal_nTable.values() for count in actions.values()]
+    total = sum(visit_counts)
+    return {
+        'mean': statistics.mean(visit_counts),
+        'median': statistics.median(visit_counts),
+        'mode': statistics.mode(visit_counts),
+        'entropy': -sum(count / total * math.log(count / total) for count in visit_counts),
+        'variance': statistics.variance(visit_counts),
+        'unique_states': len(oracle.universal_nTable),
+        'unique_state_action_pairs': len(visit_counts),
+    }
+
+
+def _random_oracle(seed, num_of_updates):
+    rng = np.random.default_rng(seed)
+    oracle = Oracle()
+    for _ in range(num_of_updates):
+        # Skewed so some pairs are visited far more than others
+        oracle.update(int(rng.zipf(1.5)) % 50, int(rng.integers(5)))
+    return oracle
+
+
+def _check(oracle, exact_mode=True):
+    stats = oracle.calculate_statistics()
+    baseline = _baseline_statistics(oracle)
+    for name in ('median', 'unique_states', 'unique_state_action_pairs'):
+        assert stats[name] == baseline[name]
+    for name in ('mean', 'entropy', 'variance'):
+        assert stats[name] == pytest.approx(baseline[name], rel=1e-12, abs=1e-12)
+    if exact_mode:
+        assert stats['mode'] == baseline['mode']
+    else:
+        # Which of the most common counts is picked can drift from the table order between rebuilds
+        counts = [count for actions in oracle.universal_nTable.values() for count in actions.values()]
+        assert counts.count(stats['mode']) == max(counts.count(count) for count in counts)
+
+
+@pytest.mark.parametrize('num_of_updates', [2, 3, 10, 101, 2000])
+def test_running_statistics(num_of_updates):
+    oracle = _random_oracle(num_of_updates, num_of_updates)
+    _check(oracle, exact_mode=False)
+    # A rebuilt Oracle holds the counts in table order, so the mode tie-break is exact
+    _check(Oracle.from_arrays(oracle.to_arrays()))
+
+
+def test_mode_ties_go_to_the_first_count_in_the_table():
+    oracle = Oracle()
+    for state, count in [(1, 3), (2, 1), (3, 1), (4, 3), (5, 2)]:
+        oracle.universal_nTable[state][0] = count
+    oracle._recount()
+    assert oracle.calculate_statistics()['mode'] == 3 == statistics.mode([3, 1, 1, 3, 2])
+
+
+def test_merged_and_averaged():
+    oracles = [_random_oracle(seed, 500) for seed in range(3)]
+    merged = Oracle()
+    for oracle in oracles:
+        merged.merge(oracle)
+    _check(merged)
+    merged.average(len(oracles))
+    _check(merged)
+
+
+def test_reading_a_count_does_not_add_it():
+    oracle = _random_oracle(0, 50)
+    pairs = oracle.calculate_statistics()['unique_state_action_pairs']
+    assert oracle.get_visit_count('unseen', 0) == 0
+    assert oracle.calculate_statistics()['unique_state_action_pairs'] == pairs
@@ -0,0 +1,122 @@
+"""Checks that policy archives give back the tables they were written from and that frozen policies play like them"""
+import json
+
+import numpy as np
+import pytest
+
+from policy_archive import METADATA_NAME, freeze, load_policies, save_policies
+from tables import ALL_ACTIONS_MASK, DictTables, DenseTables, NUM_OF_ACTIONS, greedy_masks
+from utils import spawn_generators
+
+H = 3
+STATES = [0, 11, 22, 33, 44]
+
+
+class _TrainedAgent:
+
+    """The parts of MARL_Comm which the archive reads"""
+
+    def __init__(self, name, tables, seed):
+        self._name = name
+        self.tables = tables
+        self.state_encoding = 2
+        self.rng = np.random.default_rng(seed)
+
+    def agent_name(self):
+        return self._name
+
+
+def _trained_agents(backend):
+
+    """Two agents whose tables hold ties, unwritten actions and unvisited states"""
+
+    rng = np.random.default_rng(1)
+    agents = {}
+    for i in range(2):
+        tables = backend(H)
+        # The last state is never written
+        for _ in range(40):
+            time_step = int(rng.integers(1, H + 1))
+            state = STATES[int(rng.integers(len(STATES) - 1))]
+            action = int(rng.integers(NUM_OF_ACTIONS))
+            tables.visit(time_step, state, action)
+            tables.set_q_value(time_step, state, action, float(rng.integers(-4, 4)) / 2)
+            tables.set_v_value(time_step + 1, state, float(rng.integers(-4, 4)) / 2)
+        agents[f'agent_{i}'] = _TrainedAgent(f'agent_{i}', tables, seed=i)
+    return agents
+
+
+def test_greedy_masks_match_the_largest_q_values():
+    rng = np.random.default_rng(0)
+    q = rng.integers(0, 3, size=(H, 6, NUM_OF_ACTIONS)).astype(np.float32)
+    visited = rng.random((H + 1, 6)) < 0.7
+    masks = greedy_masks(q, visited)
+    for time_step in range(H):
+        for row in range(6):
+            values = q[time_step, row]
+            expected = sum(1 << a for a in range(NUM_OF_ACTIONS) if values[a] == values.max())
+            assert masks[time_step, row] == (expected if visited[time_step, row] else ALL_ACTIONS_MASK)
+
+
+@pytest.mark.parametrize('backend', [DictTables, DenseTables])
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(tmp_path, backend, mmap):
+    agents = _trained_agents(backend)
+    path = str(tmp_path / 'agents.npz')
+    save_policies(path, agents)
+    loaded = load_policies(path, mmap=mmap)
+    assert list(loaded) == list(agents)
+    for agent_name, agent in agents.items():
+        tables = loaded[agent_name].tables
+        assert loaded[agent_name].state_encoding == agent.state_encoding
+        for time_step in range(1, H + 1):
+            for state in STATES:
+                for action in range(NUM_OF_ACTIONS):
+                    assert tables.q_value(time_step, state, action) == agent.tables.q_value(time_step, state, action)
+                assert tables.v_value(time_step + 1, state) == agent.tables.v_value(time_step + 1, state)
+
+
+@pytest.mark.parametrize('backend', [DictTables, DenseTables])
+def test_frozen_policies_play_like_the_tables(tmp_path, backend):
+    agents = _trained_agents(backend)
+    path = str(tmp_path / 'agents.npz')
+    save_policies(path, agents)
+    # The Generators load_policies gives the agents, in agent order
+    loaded = load_policies(path, frozen=True, seed=7)
+    rngs = spawn_generators(np.random.SeedSequence(7), len(agents))
+    for (agent_name, agent), rng in zip(agents.items(), rngs):
+        frozen = freeze(_TrainedAgent(agent_name, agent.tables, seed=5))
+        frozen_rng = np.random.default_rng(5)
+        for _ in range(10):
+            for time_step in range(1, H + 1):
+                for state in STATES:
+                    action = agent.tables.greedy_action(time_step, state, rng)
+                    assert loaded[agent_name].play_normal(state, time_step) == action
+                    assert frozen.play_normal(state, time_step) == agent.tables.greedy_action(time_step, state, frozen_rng)
+
+
+def test_the_seed_picks_the_ties(tmp_path):
+    path = str(tmp_path / 'agents.npz')
+    save_policies(path, _trained_agents(DenseTables))
+
+    def play(seed, frozen):
+        agents = load_policies(path, frozen=frozen, seed=seed)
+        return [agent.play_normal(state, time_step) for agent in agents.values() for time_step in range(1, H + 1)
+                for state in STATES for _ in range(5)]
+
+    for frozen in (True, False):
+        assert play(3, frozen) == play(3, frozen)
+        assert play(3, frozen) != play(4, frozen)
+
+
+def test_other_versions_are_refused(tmp_path):
+    path = str(tmp_path / 'agents.npz')
+    save_policies(path, _trained_agents(DenseTables))
+    with np.load(path) as archive:
+        arrays = dict(archive)
+    metadata = json.loads(str(arrays[METADATA_NAME]))
+    metadata['version'] += 1
+    arrays[METADATA_NAME] = np.array(json.dumps(metadata))
+    np.savez(path, **arrays)
+    with pytest.raises(ValueError):
+        load_policies(path)
@@ -0,0 +1,74 @@
+"""Checks the integer state codec against the md5 encoding it replaced"""
+import hashlib
+
+import numpy as np
+import pytest
+
+from observation_grids import observation_grid
+from utils import StateCodec, state_codec, encode_state, decode_state, STATE_ENCODING_MD5
+
+
+def _md5_state(observation):
+
+    """
+    The encoding as it was written in utils.encode_state before the codec
+
+    observation - What the agent can see
+
+    Return
+    The md5 hex digest of the observation
+    """
+
+    return hashlib.md5(str(observation).encode('utf-8')).hexdigest()
+
+
+def _snapped_observations(rng, num_of_agents, count):
+
+    """
+    Makes float32 observations on the grid, as the environment gives them
+
+    Return
+    An array of shape (count, 4)
+    """
+
+    grid = observation_grid(num_of_agents)
+    return grid[rng.integers(len(grid), size=(count, 4))].astype(np.float32)
+
+
+@pytest.mark.parametrize('num_of_agents', [4, 12])
+def test_round_trip(num_of_agents):
+    observations = _snapped_observations(np.random.default_rng(num_of_agents), num_of_agents, 500)
+    codec = state_codec(num_of_agents)
+    for observation in observations:
+        state = encode_state(observation, num_of_agents)
+        assert 0 <= state < codec.size
+        np.testing.assert_array_equal(decode_state(state, num_of_agents), observation)
+
+
+@pytest.mark.parametrize('num_of_agents', [4, 12])
+def test_same_states_as_md5(num_of_agents):
+    # Two observations share an integer exactly when they shared a digest
+    observations = _snapped_observations(np.random.default_rng(0), num_of_agents, 2000)
+    by_index = {}
+    for observation in observations:
+        by_index.setdefault(encode_state(observation, num_of_agents), set()).add(_md5_state(observation))
+    assert all(len(digests) == 1 for digests in by_index.values())
+    assert len({digest for digests in by_index.values() for digest in digests}) == len(by_index)
+    assert encode_state(observations[0], num_of_agents, STATE_ENCODING_MD5) == _md5_state(observations[0])
+
+
+def test_batch_matches_single_and_snaps_to_nearest():
+    grid = observation_grid(4)
+    codec = StateCodec([grid] * 4)
+    rng = np.random.default_rng(1)
+    observations = rng.uniform(-2.5, 2.5, size=(300, 4)).astype(np.float32)
+    indexes = codec.encode_batch(observations)
+    for observation, index in zip(observations, indexes):
+        nearest = grid[np.abs(grid[None, :] - observation[:, None]).argmin(axis=1)].astype(np.float32)
+        assert codec.encode(observation) == index == codec.encode(nearest)
+
+
+def test_dense():
+    codec = StateCodec([[0.0, 1.0], [0.0, 1.0, 2.0]])
+    assert codec.size == 6
+    assert sorted(codec.encode(codec.decode(index)) for index in range(6)) == list(range(6))
@@ -0,0 +1,91 @@
+"""Checks the table backends against the nested dictionaries the agents used to keep"""
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from tables import DictTables, DenseTables, NUM_OF_ACTIONS, create_tables
+
+H = 4
+
+
+class _BaselineTables:
+
+    """The qTables, nTables and vTable as MARL_Comm built them before the backends"""
+
+    def __init__(self, length_of_episode):
+        self.H = length_of_episode
+        self.qTables = {i+1: defaultdict(lambda: defaultdict(lambda: length_of_episode)) for i in range(length_of_episode)}
+        self.nTables = {i+1: defaultdict(lambda: defaultdict(lambda: 0)) for i in range(length_of_episode)}
+        self.vTable = {j+1: defaultdict(lambda: self.H) for j in range(length_of_episode+1)}
+
+    def best_value(self, time_step, state):
+        return max(self.qTables[time_step][state][i] for i in range(NUM_OF_ACTIONS))
+
+
+def _random_operations(rng, count, num_of_states):
+
+    """
+    Makes a stream of (operation, time step, state, action, value) for the tables.  Values are multiples of 0.25 so
+    float32 holds them exactly
+    """
+
+    for _ in range(count):
+        operation = rng.choice(['q', 'v', 'visit'])
+        time_step = int(rng.integers(1, H + 1))
+        # Sparse, large state numbers like the codec gives
+        state = int(rng.integers(num_of_states)) * 7919
+        action = int(rng.integers(NUM_OF_ACTIONS))
+        value = float(rng.integers(-40, 40)) / 4
+        yield operation, time_step, state, action, value
+
+
+@pytest.mark.parametrize('backend', [DictTables, DenseTables])
+def test_matches_nested_dictionaries(backend):
+    rng = np.random.default_rng(0)
+    # A small capacity so the dense arrays have to grow
+    tables = backend(H) if backend is DictTables else backend(H, initial_capacity=2)
+    baseline = _BaselineTables(H)
+    for operation, time_step, state, action, value in _random_operations(rng, 3000, 60):
+        if operation == 'q':
+            tables.set_q_value(time_step, state, action, value)
+            baseline.qTables[time_step][state][action] = value
+        elif operation == 'v':
+            # The V table has one more timestep than the Q tables
+            tables.set_v_value(time_step + 1, state, value)
+            baseline.vTable[time_step + 1][state] = value
+        else:
+            baseline.nTables[time_step][state][action] += 1
+            assert tables.visit(time_step, state, action) == baseline.nTables[time_step][state][action]
+
+    # Every state, including ones never written, at every timestep
+    for time_step in range(1, H + 1):
+        for state in range(0, 70 * 7919, 7919):
+            for action in range(NUM_OF_ACTIONS):
+                assert tables.q_value(time_step, state, action) == baseline.qTables[time_step][state][action]
+            assert tables.best_value(time_step, state) == baseline.best_value(time_step, state)
+            assert tables.v_value(time_step, state) == baseline.vTable[time_step][state]
+            assert tables.v_value(time_step + 1, state) == baseline.vTable[time_step + 1][state]
+
+
+def test_greedy_action_picks_among_ties_alike():
+    dict_tables, dense_tables = DictTables(H), DenseTables(H)
+    for tables in (dict_tables, dense_tables):
+        tables.set_q_value(1, 5, 1, 9.0)
+        tables.set_q_value(1, 5, 3, 9.0)
+        tables.set_q_value(1, 6, 2, 9.0)
+    dict_rng, dense_rng = np.random.default_rng(3), np.random.default_rng(3)
+    chosen = set()
+    for _ in range(50):
+        action = dict_tables.greedy_action(1, 5, dict_rng)
+        assert action == dense_tables.greedy_action(1, 5, dense_rng)
+        chosen.add(action)
+        assert dense_tables.greedy_action(1, 6, dense_rng) == dict_tables.greedy_action(1, 6, dict_rng) == 2
+    assert chosen == {1, 3}
+    # An unseen state is all H, so any action can be picked
+    assert dense_tables.greedy_action(2, 5, dense_rng) in range(NUM_OF_ACTIONS)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_tables(H, 'sparse')
@@ -4,8 +4,10 @@ from env import create_env
 from create_agents import create_agents
 from utils import encode_state
 from reward_functions import final_reward
+from learner import MultiAgentLearner
 from hyperparameters import train_hyperparameters, agent_hyperparameters, dynamic_hyperparameters, AgentType
 import math
+from functools import partial
 
 # Hyperparameters which can be changed to change what and how the agent learns
 NUM_OF_CYCLES = train_hyperparameters['num_of_cycles']
@@ -14,13 +16,15 @@ NUM_OF_EPISODES = train_hyperparameters['num_of_episodes']
 LOCAL_RATIO = train_hyperparameters['local_ratio']
 
 
-def _set_up(choice):
+def _set_up(choice, seed_sequence=None):
 
     """
     Sets up the environments and agents
 
     choice - The type of Agent to use
 
+    seed_sequence - The numpy SeedSequence the environment and agents are seeded from.  None seeds them randomly
+
     Return
     The agent_type
     The environment set up
@@ -40,22 +44,29 @@ def _set_up(choice):
         if dynamic_hyperparameters['dynamic']:
             train_choice = _episode_dynamic_graph
         else:
-            train_choice = _episode_original_multiple
+            train_choice = _episode_marl
         agent_type = AgentType.ORIGINAL
         multiple=True
     elif choice == AgentType.EB_Lidard:
         if dynamic_hyperparameters['dynamic']:
             train_choice = _episode_dynamic_graph
         else:
-            train_choice = _episode_EB_Lidard
+            train_choice = _episode_marl
         agent_type = AgentType.EB_Lidard
         multiple=True
     else:
         print("Not a choice")
         return
     
+    env_seed, agents_seed = seed_sequence.spawn(2) if seed_sequence is not None else (None, None)
     env = create_env(NUM_OF_AGENTS, NUM_OF_CYCLES, LOCAL_RATIO, multiple)
-    agents = create_agents(NUM_OF_AGENTS, agent_type, num_of_episodes=NUM_OF_EPISODES, length_of_episode=NUM_OF_CYCLES)
+    if env_seed is not None:
+        env.reset(seed=int(env_seed.generate_state(1)[0]))
+    agents = create_agents(NUM_OF_AGENTS, agent_type, num_of_episodes=NUM_OF_EPISODES, length_of_episode=NUM_OF_CYCLES,
+                           seed_sequence=agents_seed)
+    if train_choice is _episode_marl:
+        # One learner for the agents, so its phase timings add up over every episode
+        train_choice = partial(_episode_marl, learner=MultiAgentLearner(agents))
 
     return agent_type, env, agents, train_choice
 
@@ -103,133 +114,29 @@ def _set_up(choice):
 
 
 
-def _episode_original_multiple(env, agents, episode_num, oracle=None):
+# UCB/Lidard and PB Algorithm training episode.
+def _episode_marl(env, agents, episode_num, oracle=None, *, learner):
 
     """
-    This trains the UCB/Lidard algorithm for MARL agents for one episode
+    This trains the UCB/Lidard or PB algorithm for MARL agents for one episode
 
     env - The parallel environment to be used
 
-    agents - A dict containing the agents to be used
+    agents - A dict containing the agents to be used.  Only there so every training function is called the same way,
+    the learner already holds them
 
     episode_num - The episode number
 
-    Return 
-    The reward for that episode
-    """
-    
-    agent_old_state = {agent: -1 for agent in agents.keys()}
-    observations = env.reset()    
-
-    t = 0
-    while env.agents:
-        t = t+1
-        actions = {}
-        for agent_name in agents.keys():        # Take action
-            real_state = observations[agent_name]
-            agent_old_state[agent_name] = encode_state(observations[agent_name], NUM_OF_AGENTS)
-            action = _policy(agent_name, agents, observations[agent_name], False, t, episode_num)
-            actions[agent_name] = action
-            if oracle is not None: 
-                oracle.update(agent_old_state[agent_name], action) #Update the oracle with the state-action pair
-                oracle.update_real_state_map(agent_old_state[agent_name], real_state) # Update the oracle with the real state
-            
-            
-        observations, rewards, terminations, truncations, infos = env.step(actions)
-  
-        for agent_name in agents.keys():        # Send messages
-            agent_obj = agents[agent_name]
-            agent_obj.message_passing(episode_num, t, agent_old_state[agent_name], actions[agent_name], 
-                encode_state(observations[agent_name], NUM_OF_AGENTS), rewards[agent_name], agents)
-
-        for agent_name in agents.keys():        # Update u and v
-            agent_obj = agents[agent_name]
-            agent_obj.update(episode_num, t, agent_old_state[agent_name], encode_state(observations[agent_name], NUM_OF_AGENTS),
-                actions[agent_name], rewards[agent_name])
-            
-        for agent_name in agents.keys():       # Update the values
-            agent_obj = agents[agent_name]
-            agent_obj.update_values(episode_num, t)
-    
-    return final_reward(rewards)
-
+    oracle - The Oracle which watches the training, if any
 
-#  PB Algorithm training episode. 
-def _episode_EB_Lidard(env, agents, episode_num, oracle=None):
-    
-    """
-    This trains the PB algorithm for MARL agents for one episode
-
-    env - The parallel environment to be used
-
-    agents - A dict containing the agents to be used
-
-    episode_num - The episode number
+    learner - The MultiAgentLearner of the agents, which adds up the phase timings over the episodes
 
     Return 
     The reward for that episode
     """
-    
-    agent_old_state = {agent: -1 for agent in agents.keys()}
-    observations = env.reset()    
 
-    t = 0
-    while env.agents:
-        t = t+1
-        actions = {}
-        for agent_name in agents.keys():        
-            # Take action
-            real_state = observations[agent_name]
-            encoded_state = encode_state(real_state, NUM_OF_AGENTS)
-            agent_old_state[agent_name] = encoded_state
-
-            # Update the real state map in the EB Lidard agent
-            agents[agent_name].update_real_state_map(encoded_state, real_state)
+    return learner.run_episode(env, episode_num, oracle)
 
-            action = _policy(agent_name, agents, real_state, False, t, episode_num)
-            actions[agent_name] = action
-            
-            if oracle is not None: 
-                oracle.update(encoded_state, action) # Update the oracle with the state-action pair
-                oracle.update_real_state_map(encoded_state, real_state) # Update the oracle with the real state
-            
-
-        observations, rewards, terminations, truncations, infos = env.step(actions)
-  
-        for agent_name in agents.keys():
-            # Send messages
-            agent_obj = agents[agent_name]
-            new_real_state = observations[agent_name]
-            new_encoded_state = encode_state(new_real_state, NUM_OF_AGENTS)
-
-            # Fetch the old real state from the agent's real_state_map
-            old_real_state = agents[agent_name].real_state_map.get(agent_old_state[agent_name], [0] * len(agent_old_state[agent_name]))
-
-            # Update the real state map with the new state
-            agents[agent_name].update_real_state_map(new_encoded_state, new_real_state)
-
-            # Updated message passing with real states
-            agent_obj.message_passing(episode_num, t, agent_old_state[agent_name], old_real_state, actions[agent_name],
-                                    new_encoded_state, new_real_state, rewards[agent_name], agents)
-
-        for agent_name in agents.keys():
-            # Update u and v
-            agent_obj = agents[agent_name]
-            new_real_state = observations[agent_name]
-            new_encoded_state = encode_state(new_real_state, NUM_OF_AGENTS)
-
-            # Update the real state map with the new state
-            agents[agent_name].update_real_state_map(new_encoded_state, new_real_state)
-
-            agent_obj.update(episode_num, t, agent_old_state[agent_name], new_encoded_state,
-                             actions[agent_name], rewards[agent_name])
-            
-        for agent_name in agents.keys():
-            # Update the values
-            agent_obj = agents[agent_name]
-            agent_obj.update_values(episode_num, t)
-    
-    return final_reward(rewards)
 
 def _update_graph(agents, observations):
 
@@ -1,21 +1,21 @@
 import numpy as np
 from hyperparameters import evaluation_hyperparameters
 from train import _set_up
-from show import episode_play_normal_marl
-import matplotlib.pyplot as plt
-from hyperparameters import train_hyperparameters, dynamic_hyperparameters, AgentType
-from env import create_env
-from utils import encode_state
-from reward_functions import final_reward
+from show import episodes_play_normal_marl
+from hyperparameters import train_hyperparameters, dynamic_hyperparameters, pipeline_hyperparameters, AgentType
+from env import create_env, create_vector_env
+from utils import encode_state, spawn_generators
 from adjacency import convert_adj_to_power_graph
 from ucb_marl_agent import MARL_Comm
 from eb_marl_agent import EB_MARL_Comm
+from message_bus import MessageBus
+from state_store import StateVectorStore
 from observer import Oracle
-import multiprocessing
-import matplotlib.pyplot as plt
-import random
-import pandas as pd
-import networkx as nx
+from learner import MultiAgentLearner
+from run_results import new_run_dir, create_run, trial_path, save_trial, load_trial, trial_checkpoint_path, save_checkpoint, load_checkpoint
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 NUMBER_OF_TRIALS = evaluation_hyperparameters['num_of_trials']
 NUM_EVALUATION_EPISODES = evaluation_hyperparameters['num_evaluation_episodes']
@@ -23,159 +23,37 @@ EVALUATION_INTERVAL = evaluation_hyperparameters['evaluation_interval']
 NUM_OF_EPISODES = train_hyperparameters['num_of_episodes']
 LOCAL_RATIO = train_hyperparameters['local_ratio']
 NUM_OF_CYCLES = train_hyperparameters['num_of_cycles']
+CHECKPOINT_INTERVAL = pipeline_hyperparameters['checkpoint_interval']
 
 
-def _episode_original_multiple_ucb(env, agents, episode_num, oracle=None):
-    NUM_OF_AGENTS = len(agents)
-    
-
-    """
-    This trains the original Lidard algorithm for MARL agents for one episode
-
-    env - The parallel environment to be used
-
-    agents - A dict containing the agents to be used
-
-    episode_num - The episode number
-
-    Return 
-    The reward for that episode
-    
-    """
-    
-    
-    
-    agent_old_state = {agent: -1 for agent in agents.keys()}
-    observations = env.reset()    
-
-    t = 0
-    while env.agents:
-        t = t+1
-        actions = {}
-        for agent_name in agents.keys():        # Take action
-            real_state = observations[agent_name]
-            agent_old_state[agent_name] = encode_state(observations[agent_name], NUM_OF_AGENTS)
-            action = _policy(agent_name, agents, observations[agent_name], False, t, episode_num)
-            actions[agent_name] = action
-            if oracle is not None: 
-                oracle.update(agent_old_state[agent_name], action) #Update the oracle with the state-action pair
-                oracle.update_real_state_map(agent_old_state[agent_name], real_state) # Update the oracle with the real state
-            
-            
-        observations, rewards, terminations, truncations, infos = env.step(actions)
-  
-        for agent_name in agents.keys():        # Send messages
-            agent_obj = agents[agent_name]
-            agent_obj.message_passing(episode_num, t, agent_old_state[agent_name], actions[agent_name], 
-                encode_state(observations[agent_name], NUM_OF_AGENTS), rewards[agent_name], agents)
-
-        for agent_name in agents.keys():        # Update u and v
-            agent_obj = agents[agent_name]
-            agent_obj.update(episode_num, t, agent_old_state[agent_name], encode_state(observations[agent_name], NUM_OF_AGENTS),
-                actions[agent_name], rewards[agent_name])
-            
-        for agent_name in agents.keys():       # Update the values
-            agent_obj = agents[agent_name]
-            agent_obj.update_values(episode_num, t)
-    
-    return final_reward(rewards)
-
-
-## THIS VERSION IS FOR THE EB LIDARD AKA PB AGENTS ONLY!!!!!
-def _episode_original_multiple_peb(env, agents, episode_num, oracle=None):
-    NUM_OF_AGENTS = len(agents)
-    
-    agent_old_state = {agent: -1 for agent in agents.keys()}
-    observations = env.reset()    
-
-    t = 0
-    while env.agents:
-        t = t+1
-        actions = {}
-        for agent_name in agents.keys():        
-            # Take action
-            real_state = observations[agent_name]
-            encoded_state = encode_state(real_state, NUM_OF_AGENTS)
-            agent_old_state[agent_name] = encoded_state
-
-            # Update the real state map in the EB Lidard agent
-            agents[agent_name].update_real_state_map(encoded_state, real_state)
-
-            action = _policy(agent_name, agents, real_state, False, t, episode_num)
-            actions[agent_name] = action
-            
-            if oracle is not None: 
-                oracle.update(encoded_state, action) # Update the oracle with the state-action pair
-                oracle.update_real_state_map(encoded_state, real_state) # Update the oracle with the real state
-            
-
-        observations, rewards, terminations, truncations, infos = env.step(actions)
-  
-        for agent_name in agents.keys():
-            # Send messages
-            agent_obj = agents[agent_name]
-            new_real_state = observations[agent_name]
-            new_encoded_state = encode_state(new_real_state, NUM_OF_AGENTS)
-
-            # Fetch the old real state from the agent's real_state_map
-            old_real_state = agents[agent_name].real_state_map.get(agent_old_state[agent_name], [0] * len(agent_old_state[agent_name]))
-
-            # Update the real state map with the new state
-            agents[agent_name].update_real_state_map(new_encoded_state, new_real_state)
-
-            # Updated message passing with real states
-            agent_obj.message_passing(episode_num, t, agent_old_state[agent_name], old_real_state, actions[agent_name],
-                                    new_encoded_state, new_real_state, rewards[agent_name], agents)
-
-        for agent_name in agents.keys():
-            # Update u and v
-            agent_obj = agents[agent_name]
-            new_real_state = observations[agent_name]
-            new_encoded_state = encode_state(new_real_state, NUM_OF_AGENTS)
-
-            # Update the real state map with the new state
-            agents[agent_name].update_real_state_map(new_encoded_state, new_real_state)
-
-            agent_obj.update(episode_num, t, agent_old_state[agent_name], new_encoded_state,
-                             actions[agent_name], rewards[agent_name])
-            
-        for agent_name in agents.keys():
-            # Update the values
-            agent_obj = agents[agent_name]
-            agent_obj.update_values(episode_num, t)
-    
-    return final_reward(rewards)
-
-def _set_up(experiment):
+def _set_up(experiment, seed_sequence=None):
 
     """
     Sets up the environments and agents
 
-    
+    experiment - The experiment dict
+
+    seed_sequence - The numpy SeedSequence the environment and the agents are seeded from.  None seeds them randomly
     """
 
     agent_type = experiment['agent_type'] 
     
-    if agent_type == AgentType.EB_Lidard:
-        train_choice = _episode_original_multiple_peb
-    else:
-        train_choice = _episode_original_multiple_ucb
-    
-
-    
     multiple=True
     adj_table =  experiment['graph']
     NUM_OF_AGENTS = experiment['num_agents']
     
         
     
+    env_seed, agents_seed = seed_sequence.spawn(2) if seed_sequence is not None else (None, None)
     env = create_env(NUM_OF_AGENTS, NUM_OF_CYCLES, LOCAL_RATIO, multiple)
+    if env_seed is not None:
+        env.reset(seed=int(env_seed.generate_state(1)[0]))
     agents = create_exp_marl_agents(NUM_OF_AGENTS, NUM_OF_EPISODES, NUM_OF_CYCLES, 
-        experiment['gamma_hop'], adj_table, experiment['connection_slow'], agent_type)
-    return agent_type, env, agents, train_choice
+        experiment['gamma_hop'], adj_table, experiment['connection_slow'], agent_type, agents_seed)
+    return agent_type, env, agents
 
 
-def create_exp_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow, agent_type):
+def create_exp_marl_agents(num_of_agents, num_of_episodes, length_of_episode, gamma_hop, adjacency_table, connection_slow, agent_type, seed_sequence=None):
 
     """
     Creates the MARL agents
@@ -192,15 +70,27 @@ def create_exp_marl_agents(num_of_agents, num_of_episodes, length_of_episode, ga
 
     connection_slow - Whether we want the connections to be instantaneous or whether a time delay should be incurred
 
+    agent_type - The AgentType of the agents
+
+    seed_sequence - The numpy SeedSequence each agent's Generator is spawned from.  None seeds them randomly
+
     """ 
+    rngs = spawn_generators(seed_sequence, num_of_agents)
     if agent_type == AgentType.ORIGINAL:
         # print(f"Using {num_of_agents} UCB agents.")
-        agents = {f'agent_{i}': MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop) for i in range(num_of_agents)}
+        agents = {f'agent_{i}': MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop, rngs[i]) for i in range(num_of_agents)}
     else:
         # print(f"Using {num_of_agents} PEB agents.")
-        agents = {f'agent_{i}': EB_MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop) for i in range(num_of_agents)}
+        # The real states are the same for every agent so one store is shared
+        state_store = StateVectorStore()
+        agents = {f'agent_{i}': EB_MARL_Comm(f'agent_{i}', num_of_agents, num_of_episodes, length_of_episode, gamma_hop, state_store, rngs[i]) for i in range(num_of_agents)}
 
     
+    # The agents share one bus which holds their messages until they arrive.  update_neighbour sets its routes
+    message_bus = MessageBus(agents.keys(), length_of_episode)
+    for agent_obj in agents.values():
+        agent_obj.message_bus = message_bus
+
     power_graph = convert_adj_to_power_graph(adjacency_table, gamma_hop, connection_slow)
     if dynamic_hyperparameters['dynamic']:
         return agents
@@ -216,365 +106,227 @@ def create_exp_marl_agents(num_of_agents, num_of_episodes, length_of_episode, ga
 
 
 
-def twelve_experiments(experiment, choice=None):
-    NUM_OF_EPISODES = train_hyperparameters['num_of_episodes']
-    EVALUATION_INTERVAL = evaluation_hyperparameters['evaluation_interval']
-    NUM_EVALUATION_EPISODES = evaluation_hyperparameters['num_evaluation_episodes']
-    
-    # Initialize arrays to track shit
-    reward_list_evaluation = np.zeros(NUM_OF_EPISODES // EVALUATION_INTERVAL)
-    bes_scores = np.zeros(NUM_OF_EPISODES // EVALUATION_INTERVAL)
-    reward_array_episode_num = np.arange(EVALUATION_INTERVAL, NUM_OF_EPISODES + 1, EVALUATION_INTERVAL)
-    
-    min_rewards = np.full(NUM_OF_EPISODES // EVALUATION_INTERVAL, np.inf)  # Initialize with infinities for minimums
-    max_rewards = np.full(NUM_OF_EPISODES // EVALUATION_INTERVAL, -np.inf)  # Initialize with -infinities for maximums
-    
-    percentile_25_rewards = np.full(NUM_OF_EPISODES // EVALUATION_INTERVAL, np.inf)
-    percentile_75_rewards = np.full(NUM_OF_EPISODES // EVALUATION_INTERVAL, -np.inf)
-    
-    oracle = Oracle() #Always create the oracle!
-    print("The Observer is created.")
-    
-    
-    print(f"TOPOLOGY EXPERIMENTS: EXPERIMENT {experiment['experiment_name']} training over {NUM_OF_EPISODES} episodes with trials {NUMBER_OF_TRIALS} with {experiment['num_agents']} agents of the type {experiment['agent_type']}\n")
-    for trials_num in range(NUMBER_OF_TRIALS):
-        agent_type, env, agents, train_choice = _set_up(experiment)
-        for episode_num in range(1, NUM_OF_EPISODES + 1):
-            # Training phase
-            train_choice(env, agents, episode_num - 1, oracle)  
-            # Evaluation phase at specified intervals
-            if episode_num % EVALUATION_INTERVAL == 0:
-                episode_rewards = []  # List to collect rewards for this evaluation
-                
-                for eval_episode in range(NUM_EVALUATION_EPISODES): #Evaluation/Test time!
-                    reward = episode_play_normal_marl(env, agents, NUM_OF_CYCLES, len(agents), render=False)
-                    episode_rewards.append(reward)  #  total reward per episode
-                
-                # Calculate and update average, min, and max rewards for this evaluation point
-                average_evaluation_reward = np.mean(episode_rewards)
-                reward_list_evaluation[(episode_num // EVALUATION_INTERVAL) - 1] += average_evaluation_reward
-                min_rewards[(episode_num // EVALUATION_INTERVAL) - 1] = min(min(episode_rewards), min_rewards[(episode_num // EVALUATION_INTERVAL) - 1])
-                max_rewards[(episode_num // EVALUATION_INTERVAL) - 1] = max(max(episode_rewards), max_rewards[(episode_num // EVALUATION_INTERVAL) - 1])
-                # After calculating and updating average, min, and max rewards, calculate percentiles
-                percentile_25 = np.percentile(episode_rewards, 25)
-                percentile_75 = np.percentile(episode_rewards, 75)
-                
-                # Update the percentile arrays
-                index = (episode_num // EVALUATION_INTERVAL) - 1  # Calculate the index for the current evaluation interval
-                percentile_25_rewards[index] = percentile_25
-                percentile_75_rewards[index] = percentile_75
-                
-                # Compute the bad exploration score after every training episode so we can take the average later. 
-                bes = oracle.calculate_bad_exp_score(average_evaluation_reward)
-                bes_scores[(episode_num // EVALUATION_INTERVAL) - 1] += bes
-                
-            if episode_num % 100 == 0:
-                print(f"Trial {trials_num}, Episode {episode_num}")
-      
-
-    # Take the average universal N table across 5 trials. 
-    for outer_key, inner_dict in oracle.universal_nTable.items():
-        for inner_key in inner_dict:
-            oracle.universal_nTable[outer_key][inner_key] /= NUMBER_OF_TRIALS
-  
-  # Compute the metrics we want to compute from the Observer's universal N table.
-    stats = oracle.calculate_statistics()         
-    if len(agents) == 4 or len(agents) == 8:
-        oracle.create_bubble_plot(len(agents)) # Plots with more than 8 agents are cluttered. 
-    print("Statistics: ", stats)
-    last_mean_reward = reward_list_evaluation[-1] / len(agents)
-    bes = oracle.calculate_bad_exp_score(last_mean_reward)
-    print("Final Bad Exploration Score:", bes)
-    cc, G = oracle.calculate_clustering_coefficient()
-    print("Clustering Coefficient:", cc)
-
-    # Average the rewards across all trials
-    reward_list_evaluation /= NUMBER_OF_TRIALS
-    
-    average_bes = np.mean(bes_scores)
-    print(f"Average BES: {average_bes}")
-    
-    
-    return reward_list_evaluation, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, reward_array_episode_num, experiment
-
-
-
-
-
-def run_experiment(experiment, choice, index, experiment_rewards):
-    try:
-        print(f"Starting experiment {experiment['experiment_name']}")
-        experiment_reward = twelve_experiments(experiment)
-        experiment_rewards[index] = experiment_reward
-        print(f"Completed experiment {experiment['experiment_name']}")
-    except Exception as e:
-        print(f"Error in experiment {experiment['experiment_name']}: {e}")
-
-
-def experiment_pipeline(experiments, choice=None):
-    manager = multiprocessing.Manager()
-    experiment_rewards = manager.list([None] * len(experiments))
-    processes = []
-
-    # Create and start processes for each experiment
-    for i, experiment in enumerate(experiments):
-        process = multiprocessing.Process(target=run_experiment, args=(experiment, choice, i, experiment_rewards))
-        processes.append(process)
-        process.start()
-
-    # Wait for all processes to finish
-    for process in processes:
-        process.join()
-
-    # Convert managed list back to a regular list for plotting
-    experiment_rewards = list(experiment_rewards)
-    for i, reward in enumerate(experiment_rewards): 
-        if reward is None:
-            print(f"Warning: No results for experiment at index {i}")
-            continue  # or handle the missing data appropriately
-
+def run_trial(experiment, trials_num, seed_sequence, checkpoint_path=None):
 
-    # Plot the results
-    fig, ax = plt.subplots(figsize=(10, 6))
-    ax.set_xlabel('Episode Number')
-    ax.set_ylabel('Mean Reward')
-    ax.grid(True)
-
-    # Define line styles and colors for visual distinction between experiments
-    # line_styles = ['-', '-', '--', '-.', '-.'] # Experiment 1
-    # line_styles = ['-', '-', '--', '--'] # Experiment 2, 2.5, 3
-    # line_styles = ['-', '-', '--', '--', '-.'] # Experiment 3.5
-    line_styles = ['-', '-.'] # Experiment 2, 2.5, 3
-    
-    
-    colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown']
-    
-    
-    
-    # # Min max chart
-    # for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-    
-    # # for i, (average_rewards, min_rewards, max_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-    #     average_rewards = np.array(average_rewards)
-    #     min_rewards = np.array(min_rewards)
-    #     max_rewards = np.array(max_rewards)
-
-    #     rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
-
-    #     line_style = line_styles[i % len(line_styles)]
-    #     color = colors[i % len(colors)]
-    #     label = experiment['experiment_name']  # Extract name from the experiment dict
-        
-
-    #     ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-    #     ax.fill_between(episode_nums, min_rewards, max_rewards, color=color, alpha=.2)
-
-
-
-    # ax.legend()
-    # plt.tight_layout()
-    # random_number = random.randint(0, 999999999)
-    # filename = f'saved_data/figs/thesis/test_time_rewards_MINMAX{random_number}.png'
-    # print(f"Figure saved as {filename}")
-    # plt.savefig(filename)
-    # plt.clf()
-
-    # fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
-    # ax.set_xlabel('Episode Number')
-    # ax.set_ylabel('Mean Reward')
-    # ax.grid(True)
-    
-    # for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-    #     average_rewards = np.array(average_rewards)
-    #     quad1_rewards = np.array(percentile_25_rewards)
-    #     quad2_rewards = np.array(percentile_75_rewards)
-
-    #     rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
-
-    #     line_style = line_styles[i % len(line_styles)]
-    #     color = colors[i % len(colors)]
-    #     label = experiment['experiment_name']  # Extract name from the experiment dict
-        
-
-    #     ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-    #     ax.fill_between(episode_nums, quad1_rewards, quad2_rewards, color=color, alpha=.2)
-
-
-    # ax.legend()
-    # plt.tight_layout()
-    # random_number = random.randint(0, 999999999)
-    # filename = f'saved_data/figs/thesis/test_time_rewards_PERCENTILE{random_number}.png'
-    # print(f"Figure saved as {filename}")
-    # plt.savefig(filename)
-    # plt.clf()
-
-    # fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
-    # ax.set_xlabel('Episode Number')
-    # ax.set_ylabel('Mean Reward')
-    # ax.grid(True)
+    """
+    Trains and evaluates one trial of an experiment.  Trials do not share anything, so they can be run in any order
+    and in different processes
 
+    experiment - The experiment dict
 
-    # Iterate over both experiment_rewards and experiments to get rewards and names
-    for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-        # Ensure rewards is a numpy array for consistency in plotting operations
-        rewards = np.array(average_rewards)
+    trials_num - The number of the trial
 
-        # Calculate the rolling average for a smooth line
-        rolling_avg_rewards = pd.Series(rewards).rolling(window=50, min_periods=1).mean()
-        rolling_std_dev = pd.Series(rewards).rolling(window=50, min_periods=1).std() #new
+    seed_sequence - The numpy SeedSequence the trial is seeded from.  The environment, each agent and the evaluation
+    get their own Generator spawned from it, so the trial gives the same results in any process and in any order
 
-        # Setup for plot aesthetics
-        line_style = line_styles[i % len(line_styles)]
-        color = colors[i % len(colors)]
-        label = experiment['experiment_name']  # Extract name from the experiment dict
-
-        # Plot the rolling average line
-        ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-        
-        ax.fill_between(episode_nums, rolling_avg_rewards - rolling_std_dev, rolling_avg_rewards + rolling_std_dev, color=color, alpha=.2) #new
+    checkpoint_path - Where to write a checkpoint every checkpoint_interval episodes.  If there is already one there the
+    trial carries on from it, and gives the same results as if it had never stopped.  None means no checkpoints
 
+    Return
+    A dict of the evaluation rewards, their min, max and percentiles and the bad exploration scores at each evaluation,
+    the Oracle which watched the training and the timing report of the learner
+    """
 
-    ax.legend()
-    plt.tight_layout()
-    random_number = random.randint(0, 999999999)
-    filename = f'saved_data/figs/thesis/test_time_rewards_STDEV_{label}_{random_number}.png'
-    print(f"Figure saved as {filename}")
-    plt.savefig(filename)
-    plt.clf()
-    
-    
- 
-
-#     # Plot the results
-#     fig, ax = plt.subplots(figsize=(10, 6))
-#     ax.set_xlabel('Episode Number')
-#     ax.set_ylabel('Mean Reward')
-#     ax.grid(True)
-
-#     # Define line styles and colors for visual distinction between experiments
-#     # line_styles = ['-', '-', '--', '-.', '-.'] # Experiment 1
-#     line_styles = ['-', '-', '--', '--'] # Experiment 2, 2.5, 3
-#     # line_styles = ['-', '-', '--', '--', '-.'] # Experiment 3.5
-    
-#     colors = ['blue', 'green', 'red', 'orange', 'purple', 'brown']
-    
-    
-#     # Min max chart
-#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-    
-#     # for i, (average_rewards, min_rewards, max_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-#         average_rewards = np.array(average_rewards)
-#         min_rewards = np.array(min_rewards)
-#         max_rewards = np.array(max_rewards)
+    # Nothing the trial draws from is global.  The evaluation breaks ties with its own Generators so evaluating does not
+    # change what the agents draw while training
+    set_up_seed, evaluation_seed = seed_sequence.spawn(2)
+    agent_type, env, agents = _set_up(experiment, set_up_seed)
+    evaluation_rngs = dict(zip(agents, spawn_generators(evaluation_seed, len(agents))))
+    # The evaluation episodes are played together
+    evaluation_env = create_vector_env(len(agents), NUM_OF_CYCLES, NUM_EVALUATION_EPISODES)
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint is None:
+        num_of_evaluations = NUM_OF_EPISODES // EVALUATION_INTERVAL
+        evaluation = {
+            'rewards': np.zeros(num_of_evaluations),
+            'min_rewards': np.full(num_of_evaluations, np.inf),  # Initialize with infinities for minimums
+            'max_rewards': np.full(num_of_evaluations, -np.inf),  # Initialize with -infinities for maximums
+            'percentile_25_rewards': np.full(num_of_evaluations, np.inf),
+            'percentile_75_rewards': np.full(num_of_evaluations, -np.inf),
+            'bes_scores': np.zeros(num_of_evaluations),
+        }
+        oracle = Oracle() # Each trial has its own, they are merged afterwards
+        first_episode = 1
+    else:
+        # The environments keep nothing between episodes, so only the agents (with their Generators), Oracle, results
+        # and the other Generators are restored
+        agents = checkpoint['agents']
+        oracle = checkpoint['oracle']
+        evaluation = checkpoint['evaluation']
+        evaluation_rngs = checkpoint['evaluation_rngs']
+        env.unwrapped.np_random.bit_generator.state = checkpoint['env_rng_state']
+        first_episode = checkpoint['episode_num'] + 1
+        print(f"Trial {trials_num} resumed from episode {checkpoint['episode_num']}")
+
+    # One learner for the whole trial, so its phase timings add up over every episode.  PB agents also get their real
+    # states from it.  It is made after a restore so it drives the restored agents
+    learner = MultiAgentLearner(agents)
+    for episode_num in range(first_episode, NUM_OF_EPISODES + 1):
+        # Training phase
+        learner.run_episode(env, episode_num - 1, oracle)
+        # Evaluation phase at specified intervals
+        if episode_num % EVALUATION_INTERVAL == 0:
+            # Evaluation/Test time!  The total reward of each episode
+            episode_rewards = episodes_play_normal_marl(evaluation_env, agents, NUM_OF_CYCLES, evaluation_rngs)
+            index = (episode_num // EVALUATION_INTERVAL) - 1  # Calculate the index for the current evaluation interval
+
+            # Calculate average, min, max and percentile rewards for this evaluation point
+            average_evaluation_reward = np.mean(episode_rewards)
+            evaluation['rewards'][index] = average_evaluation_reward
+            evaluation['min_rewards'][index] = min(episode_rewards)
+            evaluation['max_rewards'][index] = max(episode_rewards)
+            evaluation['percentile_25_rewards'][index] = np.percentile(episode_rewards, 25)
+            evaluation['percentile_75_rewards'][index] = np.percentile(episode_rewards, 75)
+
+            # Compute the bad exploration score after every training episode so we can take the average later. 
+            evaluation['bes_scores'][index] = oracle.calculate_bad_exp_score(average_evaluation_reward)
+
+        if episode_num % 100 == 0:
+            print(f"Trial {trials_num}, Episode {episode_num}")
+
+        if checkpoint_path is not None and CHECKPOINT_INTERVAL and episode_num % CHECKPOINT_INTERVAL == 0 and episode_num < NUM_OF_EPISODES:
+            save_checkpoint(checkpoint_path, {
+                'episode_num': episode_num,
+                'agents': agents,
+                'oracle': oracle,
+                'evaluation': evaluation,
+                'evaluation_rngs': evaluation_rngs,
+                'env_rng_state': env.unwrapped.np_random.bit_generator.state,
+            })
+
+    # Where the training time of the trial went.  Printed by the caller, as trials may run in parallel processes
+    return dict(evaluation, oracle=oracle, timing_report=learner.timing_report())
+
+
+def twelve_experiments(experiment, choice=None, seed=None):
 
-#         rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+    """
+    Runs every trial of an experiment one after the other
 
-#         line_style = line_styles[i % len(line_styles)]
-#         color = colors[i % len(colors)]
-#         label = experiment['experiment_name']  # Extract name from the experiment dict
-        
+    experiment - The experiment dict
 
-#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-#         ax.fill_between(episode_nums, min_rewards, max_rewards, color=color, alpha=.7)
+    seed - The seed the trial seeds are spawned from.  None picks a new one
 
+    Return
+    The merged results, see reporting.merge_trials
+    """
 
+    print(f"TOPOLOGY EXPERIMENTS: EXPERIMENT {experiment['experiment_name']} training over {NUM_OF_EPISODES} episodes with trials {NUMBER_OF_TRIALS} with {experiment['num_agents']} agents of the type {experiment['agent_type']}\n")
+    seed_sequences = np.random.SeedSequence(seed).spawn(NUMBER_OF_TRIALS)
+    trial_results = [run_trial(experiment, trials_num, seed_sequences[trials_num]) for trials_num in range(NUMBER_OF_TRIALS)]
+    for trials_num, result in enumerate(trial_results):
+        print(f"Trial {trials_num} timings\n{result['timing_report']}")
+    # The reporting libraries are only loaded once the training is done
+    from reporting import merge_trials
+    return merge_trials(experiment, trial_results)
 
-#     ax.legend()
-#     plt.tight_layout()
-#     random_number = random.randint(0, 999999999)
-#     filename = f'saved_data/figs/thesis/test_time_rewards_MINMAXDARK{random_number}.png'
-#     print(f"Figure saved as {filename}")
-#     plt.savefig(filename)
-#     plt.clf()
 
-#     fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
-#     ax.set_xlabel('Episode Number')
-#     ax.set_ylabel('Mean Reward')
-#     ax.grid(True)
-    
-#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-#         average_rewards = np.array(average_rewards)
-#         quad1_rewards = np.array(percentile_25_rewards)
-#         quad2_rewards = np.array(percentile_75_rewards)
+def _run_and_save_trial(experiment, trials_num, seed_sequence, path, checkpoint_path):
 
-#         rolling_avg_rewards = pd.Series(average_rewards).rolling(window=50, min_periods=1).mean()
+    """
+    Runs a trial in a worker and writes its result to a file, so only its timing report goes back to the parent.  The
+    checkpoint is removed once the result is written
 
-#         line_style = line_styles[i % len(line_styles)]
-#         color = colors[i % len(colors)]
-#         label = experiment['experiment_name']  # Extract name from the experiment dict
-        
+    experiment - The experiment dict
 
-#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-#         ax.fill_between(episode_nums, quad1_rewards, quad2_rewards, color=color, alpha=.7)
+    trials_num - The number of the trial
 
+    seed_sequence - The numpy SeedSequence the trial is seeded from
 
-#     ax.legend()
-#     plt.tight_layout()
-#     random_number = random.randint(0, 999999999)
-#     filename = f'saved_data/figs/thesis/test_time_rewards_PERCENTILEDARK{random_number}.png'
-#     print(f"Figure saved as {filename}")
-#     plt.savefig(filename)
-#     plt.clf()
+    path - Where to write the result
 
-#     fig, ax = plt.subplots(figsize=(10, 6))  # Create a new figure and axes
-#     ax.set_xlabel('Episode Number')
-#     ax.set_ylabel('Mean Reward')
-#     ax.grid(True)
+    checkpoint_path - Where to write the checkpoints of the trial
 
+    Return
+    The timing report of the trial, for the parent to print
+    """
 
-#     # Iterate over both experiment_rewards and experiments to get rewards and names
-#     for i, (average_rewards, min_rewards, max_rewards, percentile_25_rewards, percentile_75_rewards, episode_nums, experiment) in enumerate(experiment_rewards):
-#         # Ensure rewards is a numpy array for consistency in plotting operations
-#         rewards = np.array(average_rewards)
+    result = run_trial(experiment, trials_num, seed_sequence, checkpoint_path)
+    save_trial(path, result)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return result['timing_report']
 
-#         # Calculate the rolling average for a smooth line
-#         rolling_avg_rewards = pd.Series(rewards).rolling(window=50, min_periods=1).mean()
-#         rolling_std_dev = pd.Series(rewards).rolling(window=50, min_periods=1).std() #new
 
-#         # Setup for plot aesthetics
-#         line_style = line_styles[i % len(line_styles)]
-#         color = colors[i % len(colors)]
-#         label = experiment['experiment_name']  # Extract name from the experiment dict
+def experiment_pipeline(experiments, choice=None, run_dir=None):
 
-#         # Plot the rolling average line
-#         ax.plot(episode_nums, rolling_avg_rewards, line_style, label=label, color=color, lw=2)
-        
-#         ax.fill_between(episode_nums, rolling_avg_rewards - rolling_std_dev, rolling_avg_rewards + rolling_std_dev, color=color, alpha=.7) #new
+    """
+    Runs the experiments and plots their evaluation rewards.  Every trial of every experiment is a separate piece of
+    work, run on a pool with one process per core.  Each trial writes its result into the run directory, and trials
+    already there are not run again, so a sweep which was stopped part way can be resumed
 
+    experiments - The list of experiment dicts
 
-#     ax.legend()
-#     plt.tight_layout()
-#     random_number = random.randint(0, 999999999)
-#     filename = f'saved_data/figs/thesis/test_time_rewards_STDEVDARK{random_number}.png'
-#     print(f"Figure saved as {filename}")
-#     plt.savefig(filename)
-#     plt.clf()
-    
+    run_dir - The run directory to write to or resume.  Defaults to pipeline_hyperparameters['run_dir'], or a new one
+    """
 
+    run_dir = run_dir or pipeline_hyperparameters['run_dir'] or new_run_dir()
+    settings = {
+        'num_of_trials': NUMBER_OF_TRIALS,
+        'num_of_episodes': NUM_OF_EPISODES,
+        'num_of_cycles': NUM_OF_CYCLES,
+        'local_ratio': LOCAL_RATIO,
+        'evaluation_interval': EVALUATION_INTERVAL,
+        'num_evaluation_episodes': NUM_EVALUATION_EPISODES,
+    }
+    seed = create_run(run_dir, experiments, settings, pipeline_hyperparameters['seed'])
+    print(f"Run directory: {run_dir}, seed: {seed}")
+    root_seed = np.random.SeedSequence(seed)
+    # experiment -> trial -> SeedSequence
+    seed_sequences = [experiment_seed.spawn(NUMBER_OF_TRIALS) for experiment_seed in root_seed.spawn(len(experiments))]
+
+    # The trials which have not been run yet
+    to_run = [(i, trials_num) for i in range(len(experiments)) for trials_num in range(NUMBER_OF_TRIALS)
+              if not os.path.exists(trial_path(run_dir, i, trials_num))]
+    print(f"{len(experiments) * NUMBER_OF_TRIALS - len(to_run)} trials already done, {len(to_run)} to run.  Trials with a checkpoint carry on from it")
+
+    failed = {}
+    if to_run:
+        max_workers = pipeline_hyperparameters['max_workers'] or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(to_run))) as pool:
+            futures = {}
+            for i, trials_num in to_run:
+                path = trial_path(run_dir, i, trials_num)
+                future = pool.submit(_run_and_save_trial, experiments[i], trials_num, seed_sequences[i][trials_num], path,
+                                     trial_checkpoint_path(run_dir, i, trials_num))
+                futures[future] = (i, trials_num)
+
+            for future in as_completed(futures):
+                i, trials_num = futures[future]
+                error = future.exception()
+                if error is not None:
+                    failed[i, trials_num] = error
+                    print(f"Error in experiment {experiments[i]['experiment_name']} trial {trials_num}:")
+                    traceback.print_exception(type(error), error, error.__traceback__)
+                else:
+                    print(f"Experiment {experiments[i]['experiment_name']} trial {trials_num} timings\n{future.result()}")
+
+    # The reporting libraries are only loaded in this process, once the trials are done
+    from reporting import merge_trials, plot_experiment_rewards
+
+    experiment_rewards = []
+    for i, experiment in enumerate(experiments):
+        if any((i, trials_num) in failed for trials_num in range(NUMBER_OF_TRIALS)):
+            experiment_rewards.append(None)
+            continue
+        trial_results = [load_trial(trial_path(run_dir, i, trials_num)) for trials_num in range(NUMBER_OF_TRIALS)]
+        experiment_rewards.append(merge_trials(experiment, trial_results))
+        print(f"Completed experiment {experiment['experiment_name']}")
 
+    if failed:
+        print(f"{len(failed)} trials failed.  Run again with run_dir={run_dir!r} to retry only those trials")
 
+    for i, reward in enumerate(experiment_rewards): 
+        if reward is None:
+            print(f"Warning: No results for experiment at index {i}")
+            continue  # or handle the missing data appropriately
+    if all(reward is None for reward in experiment_rewards):
+        return
 
+    plot_experiment_rewards(experiment_rewards)
 
-def plot_graph(adj, num_of_agents, fig_name):
-    G = nx.Graph()
-    for i in range(num_of_agents):
-        for j in range(num_of_agents):
-            if adj[i][j] == 1:
-                G.add_edge(i, j)
 
-    #Ensure graph is displayed with nodes in numerical order and in a circle
-    pos = {}
-    for i in range(num_of_agents):
-        pos[i] = [np.cos(2*np.pi*i/num_of_agents), np.sin(2*np.pi*i/num_of_agents)]
-    nx.draw(G, pos, with_labels=True, node_color='lightblue', edge_color='gray')
-    
-    random_number = random.randint(0, 999999999)
-    filename = f'saved_data/watts_strogatz_figs/{fig_name}_{random_number}.png'
-    print(f"Figure saved as {filename}")
-    
-    plt.savefig(filename)
-    plt.clf()  # Clear the current figure after saving it
-    
 def _policy(agent_name, agents, observation, done, time_step, episode_num=0):
 
     """
@@ -1,10 +1,14 @@
-from collections import defaultdict
 import math
 import random
 from copy import deepcopy
 
+import numpy as np
+
 from agent import Agent
-from hyperparameters import ucb_marl_hyperparameters, agent_hyperparameters
+from hyperparameters import ucb_marl_hyperparameters, agent_hyperparameters, table_hyperparameters
+from tables import create_tables, upgrade_legacy_state
+from episode_window import EpisodeWindow, empty_transitions
+from message_bus import Transition
 
 from time import sleep 
 
@@ -12,7 +16,7 @@ class MARL_Comm(Agent):
 
     """The original algorithm with communication"""
 
-    def __init__(self, agent_name, num_of_agents, num_of_episodes, length_of_episode, gamma_hop):
+    def __init__(self, agent_name, num_of_agents, num_of_episodes, length_of_episode, gamma_hop, rng=None):
 
 
         """
@@ -27,23 +31,25 @@ class MARL_Comm(Agent):
         length_of_episode - The length of one episode
 
         gamma_hop - The gamma_hop distance for the agent
+
+        rng - The numpy Generator which breaks ties between actions.  One is seeded from random if it is None
         """
         self.exploration_bonuses = []
         self.exploration_bonuses_detailed = []
 
-        # The set of H number of Q-Tables.
-        self.qTables = {i+1: defaultdict(lambda: defaultdict(lambda: length_of_episode)) for i in range(length_of_episode)}
-
-        # This will contain the number of times each state action has been seen for each timestep
-        self.nTables = {i+1: defaultdict(lambda: defaultdict(lambda: 0)) for i in range(length_of_episode)}
+        # The u set (episode number is indexed from 0 whilst the timestep is indexed from 1).  Only the current episode
+        # is ever used.
+        self.uSet = EpisodeWindow(1, length_of_episode+gamma_hop+1)
 
-        # The u set (episode number is indexed from 0 whilst the timestep is indexed from 1)
-        self.uSet = {i: {i+1: defaultdict(lambda: defaultdict(lambda: set())) for i in range(length_of_episode +gamma_hop+1)} for i in range(num_of_episodes)} 
+        # The v set (episode number is indexed from 0 whilst the timestep is indexed from 1).  update_values only goes
+        # over the previous and current episode so only those are kept.
+        self.vSet = EpisodeWindow(2, length_of_episode+gamma_hop+1)
 
-        # The v set (episode number is indexed from 0 whilst the timestep is indexed from 1)
-        self.vSet = {i: {i+1: defaultdict(lambda: defaultdict(lambda: set())) for i in range(length_of_episode+gamma_hop+1)} for i in range(-length_of_episode-1, num_of_episodes+round(gamma_hop%length_of_episode)+1)}
+        # The (episode, timestep) buckets of the vSet which have had transitions added since update_values last ran
+        self._dirty = set()
 
-        self.next_add = set()
+        # The bus carrying messages between the agents.  Shared by all the agents and set when they are created
+        self.message_bus = None
 
         # Of form agent_name, distance = 0 if no connection
         self._neighbours = {f'agent_{i}': 0 for i in range(num_of_agents)}   
@@ -72,8 +78,22 @@ class MARL_Comm(Agent):
         # This is a value used to control the bm,t value.  Actually small iota in paper
         self.l = math.log((num_of_states * num_of_actions * T * num_of_agents)/small_prob)  
         
-        # The v-table values.  Set to H as this corresponds to the q tables currently.
-        self.vTable = {j+1: defaultdict(lambda: self.H) for j in range(length_of_episode+1)}
+        # The Q, N and V tables.  Unseen Q and V values default to H.
+        self.tables = create_tables(length_of_episode, table_hyperparameters['backend'])
+
+        # Breaks ties between actions with the same Q value
+        self.rng = rng if rng is not None else np.random.default_rng(random.getrandbits(64))
+
+
+    def __setstate__(self, state):
+
+        """
+        Restores a pickled agent.  Agents pickled before the table backends are moved onto DictTables
+
+        state - The pickled __dict__
+        """
+
+        self.__dict__.update(upgrade_legacy_state(state))
 
 
     def get_exploration_bonuses_for_episode(self, episode_num, timesteps):
@@ -100,6 +120,8 @@ class MARL_Comm(Agent):
             self._num_neighbours -= 1
 
         self._neighbours[agent_to_update] = connection_quality
+        if self.message_bus is not None:
+            self.message_bus.set_route(self.agent_name(), agent_to_update, connection_quality)
 
     def policy(self, state, time_step):
 
@@ -114,20 +136,11 @@ class MARL_Comm(Agent):
         The action to be taken
         """
 
-        # Choose the largest value
-        max_value = float('-inf')
-        move = -1
-        q_table = self.qTables[time_step]
-        values = [0,1,2,3,4]
-        random.shuffle(values) # Shuffled to get randomness at start
-        for i in values:        
-            if q_table[state][i] > max_value:
-                max_value = q_table[state][i]
-                move = i 
-        return move
+        # Choose the largest value, ties broken at random
+        return self.tables.greedy_action(time_step, state, self.rng)
 
     
-    def play_normal(self, state, time_step, *args):
+    def play_normal(self, state, time_step, *args, rng=None):
 
         """
         Plays the episode for showing.  Plays the best action in the q-table
@@ -138,20 +151,14 @@ class MARL_Comm(Agent):
 
         *args - Spare arguments.
 
+        rng - The numpy Generator to break ties with instead of the agent's own, so playing does not use up the
+        agent's draws
+
         Return 
         The action to be taken
         """
 
-        q_table = self.qTables[time_step]
-        max_value = float('-inf')
-        move = -1
-        values = [0,1,2,3,4]
-        random.shuffle(values)
-        for i in values:        
-            if q_table[state][i] > max_value:
-                max_value = q_table[state][i]
-                move = i 
-        return move
+        return self.tables.greedy_action(time_step, state, self.rng if rng is None else rng)
 
 
     def choose_smallest_value(self, state, time_step):
@@ -167,13 +174,8 @@ class MARL_Comm(Agent):
         The smaller value
         """
 
-        max_value = float('-inf')
-        values = [0,1,2,3,4]
-        random.shuffle(values)
-        for i in values:
-            if self.qTables[time_step][state][i] > max_value:
-                max_value = self.qTables[time_step][state][i]
-        return min(self.H, max_value)
+        return min(self.H, self.tables.best_value(time_step, state))
+
 
     def message_passing(self, episode_num, time_step, old_state, action, current_state, reward, agents_dict):
 
@@ -192,13 +194,11 @@ class MARL_Comm(Agent):
 
         reward - The reward for the agents move
         
-        agents_dict - The agents dictionary
+        agents_dict - The agents dictionary.  Not needed as the message bus knows who the agent can communicate to
         """
 
-        for agent in self._neighbours.keys():
-            if self._neighbours[agent] != 0:
-                agent_obj = agents_dict[agent]
-                self.send_message(episode_num, time_step, old_state, action, current_state, reward, agent_obj, self._neighbours[agent])
+        message = Transition(time_step, episode_num, self.agent_name(), old_state, action, current_state, reward)
+        self.message_bus.send(self.agent_name(), episode_num, time_step, message)
 
         
     def update(self, episode_num, time_step, old_state, current_state, action, reward):
@@ -224,108 +224,75 @@ class MARL_Comm(Agent):
         old_set.add((reward, current_state))
         self.uSet[episode_num][time_step][old_state][action] = old_set
 
-        new_set = set()
-        
-        # Add the new data from other agents into vSet.  Only added in the vSet when it 'reaches' the agent (dis == 0).  Added into the vset at the episode and timestep of when the message was sent
-        for message_data in self.next_add:
-            time_step_other, episode_num_other, agent_name_other, current_state_other, action_other, next_state_other, reward_other, dis = message_data
-            
-            if dis == 0:
-
-                old_set = self.vSet[episode_num_other][time_step_other][current_state_other][action_other]
-                old_set.add((reward_other, next_state_other))
-                self.vSet[episode_num_other][time_step_other][current_state_other][action_other] = old_set
-            else:
-                dis -= 1
-                new_set.add(tuple([time_step_other, episode_num_other, agent_name_other, current_state_other, action_other, next_state_other, reward_other, dis]))
-
-        self.next_add = new_set
+        # Add the new data from other agents into vSet.  Only added in the vSet when it 'reaches' the agent.  Added into the vset at the episode and timestep of when the message was sent
+        for message in self.message_bus.collect(self.agent_name(), episode_num, time_step):
+            self._add_transition(message.episode_num, message.time_step, message.state, message.action, message.reward, message.next_state)
         
         # Add everything into the vSet for the current episode and timestep
         for state in self.uSet[episode_num][time_step]:
             for act in self.uSet[episode_num][time_step][state]:
                 for element in self.uSet[episode_num][time_step][state][act]:
                         reward_new, next_state = element
-                        self.vSet[episode_num][time_step][state][action].add((reward_new, next_state))
+                        self._add_transition(episode_num, time_step, state, action, reward_new, next_state)
 
         
-    def update_values(self, episode_num_max, time_step_max):
-
-        """
-        This updates the q_table and the vTable
-
-        episode_num_max - The episode the agent is on
+    def _add_transition(self, episode_num, time_step, state, action, reward, next_state):
 
-        time_step_max - The time step the agent is on.  Not currently needed
         """
+        Adds a transition to the vSet and marks its bucket so update_values goes through it
 
+        episode_num - The episode the transition was made in
 
-        # This will go over the previous and current episode number in the vSet.  This is because the message should reach the agent within one episode
-        for episode_num in range(episode_num_max-1, episode_num_max+1):
-            # Go over every timestep
-            for time_step in range(1,self.H+1):
-                # Go through the vSet
-                for state in self.vSet[episode_num][time_step].keys():
-                    for action in self.vSet[episode_num][time_step][state].keys():
-                        # Updates as specified in the paper
-                        for reward, next_state in self.vSet[episode_num][time_step][state][action]:
-                            
-                            self.nTables[time_step][state][action] = self.nTables[time_step][state][action] + 1
+        time_step - The time step the transition was made at
 
-                            t = self.nTables[time_step][state][action]
-                        
-                            clique_size = self._num_neighbours
-                            b = self.c * math.sqrt(((self.H**3) * self.l) / (clique_size*t))
-                            
-                            
-                            self.exploration_bonuses.append(b)
-                            alpha = (self.H+1)/(self.H+t) 
-                            initial =(1-alpha) * self.qTables[time_step][state][action]
-                            expected_future = alpha * (reward + self.vTable[time_step+1][next_state] + b)                            
-                            new_score = initial + expected_future
-                            self.qTables[time_step][state][action] = new_score
-
-                            self.vTable[time_step][state] = self.choose_smallest_value(state, time_step)
-                # Assume we have gone through all the data in the vSet at this episode and time step.  Means we can add new data (from other agents) but not reuse old data
-                self.vSet[episode_num][time_step] = defaultdict(lambda: defaultdict(lambda: set()))
-
-    def receive_message(self, message, dis):
+        state - The state the transition was made from
 
-        """
-        This is how the agent should receive a message
+        action - The action taken
 
-        message - The tuple containing the message
+        reward - The reward gained
 
-        dis - How far away the agent sending the message is
+        next_state - The state the transition went to
         """
 
-        # message is [time_step, episode_num, self.agent_name, current_state, action, next_state, reward]
-        message_list = list(message)
-        message_list.append(dis)
-        self.next_add.add(tuple(message_list))
+        self.vSet[episode_num][time_step][state][action].add((reward, next_state))
+        self._dirty.add((episode_num, time_step))
 
-    def send_message(self, episode_num, time_step, current_state, action, next_state, reward, agent_obj, distance):
+    def update_values(self, episode_num_max, time_step_max):
 
         """
-        How an agent sends a message
-        
-        episode_num - The episode number
-
-        time_step - The time step
-
-        current_state - The old state the agent was on
-
-        action - The action taken
-
-        next_state - The state to be seen after the action is taken
-
-        reward - The reward given
-
-        agent_obj - The agent to send the message to
+        This updates the q_table and the vTable
 
-        distance - How far away the agent it
+        episode_num_max - The episode the agent is on
 
+        time_step_max - The time step the agent is on.  Not currently needed
         """
 
-        message_tuple = tuple([time_step, episode_num, self.agent_name(), current_state, action, next_state, reward])
-        agent_obj.receive_message(message_tuple, distance)
+
+        # This will go over the buckets of the previous and current episode in the vSet which have had data added since
+        # the last call, in order.  This is because the message should reach the agent within one episode
+        for episode_num, time_step in sorted(self._dirty):
+            if episode_num < episode_num_max-1 or time_step > self.H:
+                continue
+            # Go through the vSet
+            for state in self.vSet[episode_num][time_step].keys():
+                for action in self.vSet[episode_num][time_step][state].keys():
+                    # Updates as specified in the paper
+                    for reward, next_state in self.vSet[episode_num][time_step][state][action]:
+                        
+                        t = self.tables.visit(time_step, state, action)
+                    
+                        clique_size = self._num_neighbours
+                        b = self.c * math.sqrt(((self.H**3) * self.l) / (clique_size*t))
+                        
+                        
+                        self.exploration_bonuses.append(b)
+                        alpha = (self.H+1)/(self.H+t) 
+                        initial =(1-alpha) * self.tables.q_value(time_step, state, action)
+                        expected_future = alpha * (reward + self.tables.v_value(time_step+1, next_state) + b)                            
+                        new_score = initial + expected_future
+                        self.tables.set_q_value(time_step, state, action, new_score)
+
+                        self.tables.set_v_value(time_step, state, self.choose_smallest_value(state, time_step))
+            # Assume we have gone through all the data in the vSet at this episode and time step.  Means we can add new data (from other agents) but not reuse old data
+            self.vSet[episode_num][time_step] = empty_transitions()
+        self._dirty.clear()
@@ -1,22 +1,197 @@
 import hashlib
 import numpy as np
+from observation_grids import observation_grid
 
-def encode_state(observation, num_of_agents):
+# How states are turned into table keys.  Agents remember the version they were trained with so old pickles,
+# which are keyed by md5 hex digests, can still be played.
+STATE_ENCODING_MD5 = 1
+STATE_ENCODING_INDEX = 2
+STATE_ENCODING_VERSION = STATE_ENCODING_INDEX
+
+# The observation is [vel_x, vel_y, pos_x, pos_y]
+OBSERVATION_SIZE = 4
+
+
+class StateCodec:
+
+    """
+    Maps an observation which has been snapped onto the grid to a dense integer and back.  Each component is a digit
+    whose base is the number of values its grid has (mixed radix), so the integers run from 0 to the size of the
+    state space.
+    """
+
+    def __init__(self, grids):
+
+        """
+        Creates the codec
+
+        grids - One array of grid values per observation component, in increasing order
+        """
+
+        self._grids = [np.asarray(grid, dtype=np.float32) for grid in grids]
+        self._radices = np.array([len(grid) for grid in self._grids], dtype=np.int64)
+
+        # The first component is the most significant digit
+        self._place_values = np.ones(len(self._radices), dtype=np.int64)
+        for i in range(len(self._radices)-2, -1, -1):
+            self._place_values[i] = self._place_values[i+1] * self._radices[i+1]
+        self.size = int(self._place_values[0] * self._radices[0])
+
+        # Snapped observations sit exactly on the grid, so single observations are looked up digit by digit
+        self._lookups = [{float(value): digit * int(place_value) for digit, value in enumerate(grid)}
+                         for grid, place_value in zip(self._grids, self._place_values)]
+
+    def _digits(self, values, component):
+
+        """
+        Finds the index of the nearest grid value for a column of values
+
+        values - The values of one component
+
+        component - Which component they are
+
+        Return
+        An array of digits
+        """
+
+        grid = self._grids[component]
+        upper = np.clip(np.searchsorted(grid, values), 1, len(grid)-1)
+        lower = upper - 1
+        return np.where(np.abs(grid[upper] - values) < np.abs(values - grid[lower]), upper, lower)
+
+    def encode(self, observation):
+
+        """
+        Encodes one observation
+
+        observation - The snapped observation
+
+        Return
+        The integer for the observation
+        """
+
+        try:
+            return sum(lookup[value] for lookup, value in zip(self._lookups, observation.tolist()))
+        except (KeyError, AttributeError):
+            # Not exactly on the grid (or not an array), so find the nearest grid values
+            return int(self.encode_batch(np.asarray(observation).reshape(1, -1))[0])
+
+    def encode_batch(self, observations):
+
+        """
+        Encodes many observations at once
+
+        observations - An array of shape (number of observations, observation size)
+
+        Return
+        An int64 array of the integers for the observations
+        """
+
+        observations = np.asarray(observations, dtype=np.float32)
+        indexes = np.zeros(observations.shape[0], dtype=np.int64)
+        for component in range(observations.shape[1]):
+            indexes += self._digits(observations[:, component], component) * self._place_values[component]
+        return indexes
+
+    def decode(self, index):
+
+        """
+        Decodes an integer back into its observation
+
+        index - The integer made by encode
+
+        Return
+        The float32 observation
+        """
+
+        digits = (int(index) // self._place_values) % self._radices
+        return np.array([grid[digit] for grid, digit in zip(self._grids, digits)], dtype=np.float32)
+
+
+_codecs = {}
+
+
+def state_codec(num_of_agents):
+
+    """
+    Returns the codec for the grid the environment snaps observations to with this many agents
+
+    num_of_agents - The number of agents in the environment
+
+    Return
+    The StateCodec
+    """
+
+    grid = observation_grid(num_of_agents)
+    if id(grid) not in _codecs:
+        _codecs[id(grid)] = StateCodec([grid] * OBSERVATION_SIZE)
+    return _codecs[id(grid)]
+
+
+def encode_state(observation, num_of_agents, version=STATE_ENCODING_VERSION):
 
     """
     Encodes a state which can be saved over Python instances.  The hash function changes after every Python instance
-    Taken from *Gertjan Verhoeven* Notebook found on PettingZoo website (Which has been subsequently deleted).  
-    
+
     observation - What the agent can see
 
-    num_of_agents - The number of agents overall. Unneeded variable but was used in testing
+    num_of_agents - The number of agents overall.  Picks the grid the observation was snapped to
+
+    version - STATE_ENCODING_INDEX for the integer index, STATE_ENCODING_MD5 for the hex digest older agents were
+    trained with
 
     returns - an encoded state"""
 
-    # encode observation as bytes           
+    if version == STATE_ENCODING_MD5:
+        return _md5_encode_state(observation)
+    return state_codec(num_of_agents).encode(observation)
+
+
+def decode_state(state, num_of_agents):
+
+    """
+    Turns an integer encoded state back into the observation
+
+    state - The state made by encode_state
+
+    num_of_agents - The number of agents overall
+
+    returns - The observation as a float32 array"""
+
+    return state_codec(num_of_agents).decode(state)
+
+
+def _md5_encode_state(observation):
+
+    """
+    The original encoding.
+    Taken from *Gertjan Verhoeven* Notebook found on PettingZoo website (Which has been subsequently deleted).
+
+    observation - What the agent can see
+
+    returns - The md5 hex digest of the observation"""
+
+    # encode observation as bytes
     obs_bytes = str(observation).encode('utf-8')
     # create md5 hash
     m = hashlib.md5(obs_bytes)
     # return hash as hex digest
     state = m.hexdigest()
-    return(state)
\ No newline at end of file
+    return(state)
+
+
+def spawn_generators(seed_sequence, count):
+
+    """
+    Makes independent numpy Generators, one for each thing which draws random numbers, so what one of them draws does
+    not change what the others do
+
+    seed_sequence - The numpy SeedSequence to spawn them from, or None
+
+    count - The number of Generators
+
+    returns - A list of count Generators, or of count Nones if seed_sequence is None so each thing seeds itself"""
+
+    if seed_sequence is None:
+        return [None] * count
+    return [np.random.default_rng(child) for child in seed_sequence.spawn(count)]